@@ -1,17 +1,34 @@
-from flask import Flask, render_template, request, jsonify, send_from_directory, redirect, url_for, flash
+from flask import Flask, render_template, request, jsonify, send_from_directory, redirect, url_for, flash, Response, send_file
 import os
+import math
 import time
 import subprocess
 import random
 import ipaddress
 import json
+import tempfile
 from datetime import datetime, timedelta
 from werkzeug.utils import secure_filename
 from flask_cors import CORS
 
 # Import utils
 from utils.dns_resolver import resolve_domain, get_record_types, run_nslookup
-from utils.packet_analyzer import analyze_pcap, get_packet_details
+from utils.dns_cache import cache_stats
+from utils.dns_engine import nameserver_stats
+from utils.packet_analyzer import (analyze_pcap, get_packet_details, get_packets_details, stream_packet_summaries,
+                                   follow_packet_summaries, matching_packet_indices)
+from utils.packet_filter import validate_filters, FilterError
+from utils.packet_sampling import parse_sample
+from utils.flow_analyzer import get_flows
+from utils.capture_stats import get_capture_stats
+from utils.dns_transactions import get_dns_latency, DEFAULT_QUERY_TIMEOUT
+from utils.tcp_reassembly import get_stream
+from utils.http_transactions import get_http_transactions
+from utils.payload_search import compile_search, search_payloads
+from utils.pcap_export import export_packets
+from utils.compressed_capture import resolve_capture, strip_compression_suffix
+from utils.capture_ingest import save_capture_stream, queue_capture_indexing, indexing_status
+from utils.packet_wire import MSGPACK_MIMETYPE, pack_packet_columns, compress_body
 from utils.traceroute import run_traceroute
 
 # Scapy imports for ARP
@@ -26,6 +43,9 @@ UPLOAD_FOLDER = 'static/packet/pcap_files'
 ALLOWED_EXTENSIONS = {'pcap', 'pcapng'}
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024
+# Only the streaming upload route accepts bodies this large
+MAX_UPLOAD_SIZE = int(os.getenv('PACKET_MAX_UPLOAD_SIZE', 4 * 1024 * 1024 * 1024))
+MAX_BATCH_DETAILS = int(os.getenv('PACKET_MAX_BATCH_DETAILS', 1000))
 os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
 
 # --- ARP Project Globals ---
@@ -271,8 +291,74 @@ def calculate_expiry_time(lease_time):
 
 # Packet Analyzer Helpers
 def allowed_file(filename):
+    filename = strip_compression_suffix(filename)
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
+def packet_file_path(filename):
+    """Return the readable path of an uploaded capture, or None if it does not exist"""
+    file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
+    if not os.path.exists(file_path):
+        return None
+    # Compressed captures are read through a decompressed copy
+    return resolve_capture(file_path)
+
+def parse_packet_indices(indices=None, start=None, stop=None):
+    """
+    Collect packet indices from a list and/or a half-open range start..stop-1
+
+    Raises:
+        ValueError: If an index is not an integer or too many are requested
+    """
+    if isinstance(indices, str):
+        indices = [part for part in indices.split(',') if part.strip()]
+    try:
+        selected = {int(i) for i in indices or []}
+    except (TypeError, ValueError):
+        raise ValueError('Packet indices must be integers')
+    if start is not None or stop is not None:
+        if start is None or stop is None:
+            raise ValueError('A range needs both start and stop')
+        if stop - start > MAX_BATCH_DETAILS:
+            raise ValueError(f'At most {MAX_BATCH_DETAILS} packets can be requested at once')
+        selected.update(range(max(start, 0), stop))
+    if not selected:
+        raise ValueError('No packet indices given')
+    if len(selected) > MAX_BATCH_DETAILS:
+        raise ValueError(f'At most {MAX_BATCH_DETAILS} packets can be requested at once')
+    return selected
+
+def packet_event_stream(batches):
+    """Encode batches of new packets as Server-Sent Events"""
+    try:
+        yield 'retry: 2000\n\n'
+        for batch in batches:
+            if batch:
+                yield f'event: packets\ndata: {json.dumps(batch)}\n\n'
+            else:
+                # Comment lines keep proxies from closing an idle connection
+                yield ': keepalive\n\n'
+    finally:
+        # Runs when the browser closes the connection
+        batches.close()
+
+def packet_ndjson(summaries, batch_size=200):
+    """Encode packet summaries as newline-delimited JSON, a batch of lines at a time"""
+    try:
+        lines = []
+        first = True
+        for packet_info in summaries:
+            lines.append(json.dumps(packet_info) + '\n')
+            # Send the first row straight away so the page can start rendering
+            if first or len(lines) >= batch_size:
+                yield ''.join(lines)
+                lines = []
+                first = False
+        if lines:
+            yield ''.join(lines)
+    finally:
+        # Runs when the client disconnects too, so dissection stops
+        summaries.close()
+
 # --- Routes ---
 
 @app.route('/')
@@ -684,6 +770,10 @@ def dns_api_nslookup():
 
     return jsonify(run_nslookup(domain, record_type, query_mode))
 
+@app.route('/dns/api/cache')
+def dns_api_cache():
+    return jsonify(dict(cache_stats(), nameservers=nameserver_stats()))
+
 # --- OSI Routes ---
 @app.route('/osi/')
 def osi_index():
@@ -1157,12 +1247,33 @@ def packet_upload_file():
         return redirect(url_for('packet_index'))
     if file and allowed_file(file.filename):
         filename = secure_filename(file.filename)
-        file.save(os.path.join(app.config['UPLOAD_FOLDER'], filename))
+        file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
+        content_hash, _ = save_capture_stream(file.stream, file_path)
+        queue_capture_indexing(file_path, content_hash)
         flash(f'File {filename} uploaded successfully')
         return redirect(url_for('packet_index'))
     flash('Invalid file type. Only PCAP files are allowed.')
     return redirect(url_for('packet_index'))
 
+@app.route('/packet/api/upload/<filename>', methods=['PUT'])
+def packet_stream_upload(filename):
+    # The body is the capture itself, copied to disk without form parsing
+    filename = secure_filename(filename)
+    if not filename or not allowed_file(filename):
+        return jsonify({'error': 'Invalid file type. Only PCAP files are allowed.'}), 400
+    file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
+    request.max_content_length = MAX_UPLOAD_SIZE
+    content_hash, size = save_capture_stream(request.stream, file_path)
+    queue_capture_indexing(file_path, content_hash)
+    return jsonify({'filename': filename, 'size': size, 'sha256': content_hash, 'indexing': 'pending'}), 201
+
+@app.route('/packet/api/upload/<filename>/status')
+def packet_upload_status(filename):
+    file_path = os.path.join(app.config['UPLOAD_FOLDER'], secure_filename(filename))
+    if not os.path.exists(file_path):
+        return jsonify({'error': 'File not found'}), 404
+    return jsonify({'filename': filename, 'indexing': indexing_status(file_path)})
+
 @app.route('/packet/analyze/<filename>')
 def packet_analyze(filename):
     file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
@@ -1173,23 +1284,202 @@ def packet_analyze(filename):
 
 @app.route('/packet/api/packets/<filename>')
 def packet_get_packets(filename):
-    file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-    if not os.path.exists(file_path):
+    file_path = packet_file_path(filename)
+    if file_path is None:
         return jsonify({'error': 'File not found'}), 404
     protocol_filter = request.args.get('protocol', None)
     ip_filter = request.args.get('ip', None)
     port_filter = request.args.get('port', None)
-    packets = analyze_pcap(file_path, protocol_filter, ip_filter, port_filter)
+    display_filter = request.args.get('filter', None)
+    offset = max(request.args.get('offset', 0, type=int), 0)
+    limit = request.args.get('limit', None, type=int)
+    if limit is not None:
+        limit = max(limit, 0)
+    sample = request.args.get('sample', None)
+    sample_seed = request.args.get('seed', 0, type=int)
+    try:
+        validate_filters(ip_filter, port_filter, display_filter)
+    except FilterError as e:
+        return jsonify({'error': f'Invalid filter: {e}'}), 400
+    if sample:
+        try:
+            parse_sample(sample)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+    if request.args.get('format') == 'ndjson' or request.accept_mimetypes.best == 'application/x-ndjson':
+        summaries = stream_packet_summaries(file_path, protocol_filter, ip_filter, port_filter, offset, limit,
+                                            display_filter, sample=sample, sample_seed=sample_seed)
+        return Response(packet_ndjson(summaries), mimetype='application/x-ndjson')
+    packets = analyze_pcap(file_path, protocol_filter, ip_filter, port_filter, offset, limit, display_filter,
+                           sample, sample_seed)
+    if request.args.get('format') == 'msgpack' or \
+            request.accept_mimetypes.best_match(['application/json', MSGPACK_MIMETYPE]) == MSGPACK_MIMETYPE:
+        body, encoding = compress_body(pack_packet_columns(packets), request.accept_encodings)
+        response = Response(body, mimetype=MSGPACK_MIMETYPE)
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+        response.vary.update(('Accept', 'Accept-Encoding'))
+        return response
     return jsonify(packets)
 
+@app.route('/packet/api/flows/<filename>')
+def packet_get_flows(filename):
+    file_path = packet_file_path(filename)
+    if file_path is None:
+        return jsonify({'error': 'File not found'}), 404
+    sort = request.args.get('sort', 'flow_id')
+    descending = request.args.get('order', 'asc') == 'desc'
+    offset = max(request.args.get('offset', 0, type=int), 0)
+    limit = request.args.get('limit', None, type=int)
+    if limit is not None:
+        limit = max(limit, 0)
+    flows = get_flows(file_path, sort, descending, offset, limit)
+    if 'error' in flows:
+        return jsonify(flows), 500
+    return jsonify(flows)
+
+@app.route('/packet/api/stats/<filename>')
+def packet_get_stats(filename):
+    file_path = packet_file_path(filename)
+    if file_path is None:
+        return jsonify({'error': 'File not found'}), 404
+    interval = request.args.get('interval', None, type=float)
+    if interval is not None and not (math.isfinite(interval) and interval > 0):
+        return jsonify({'error': 'interval must be a positive number of seconds'}), 400
+    stats = get_capture_stats(file_path, interval)
+    if 'error' in stats:
+        return jsonify(stats), 500
+    return jsonify(stats)
+
+@app.route('/packet/api/dns_latency/<filename>')
+def packet_get_dns_latency(filename):
+    file_path = packet_file_path(filename)
+    if file_path is None:
+        return jsonify({'error': 'File not found'}), 404
+    timeout = request.args.get('timeout', DEFAULT_QUERY_TIMEOUT, type=float)
+    if timeout <= 0:
+        timeout = DEFAULT_QUERY_TIMEOUT
+    report = get_dns_latency(file_path, timeout)
+    if 'error' in report:
+        return jsonify(report), 500
+    return jsonify(report)
+
+@app.route('/packet/api/stream/<filename>/<int:flow_id>')
+def packet_get_stream(filename, flow_id):
+    file_path = packet_file_path(filename)
+    if file_path is None:
+        return jsonify({'error': 'File not found'}), 404
+    offset = max(request.args.get('offset', 0, type=int), 0)
+    limit = min(max(request.args.get('limit', 65536, type=int), 1), 1024 * 1024)
+    encoding = request.args.get('encoding', 'text')
+    if encoding not in ('text', 'hex', 'base64'):
+        return jsonify({'error': 'encoding must be text, hex or base64'}), 400
+    stream = get_stream(file_path, flow_id, offset, limit, encoding)
+    if 'error' in stream:
+        return jsonify(stream), 404 if stream['error'] == 'No TCP flow with this id' else 500
+    return jsonify(stream)
+
+@app.route('/packet/api/http/<filename>')
+def packet_get_http(filename):
+    file_path = packet_file_path(filename)
+    if file_path is None:
+        return jsonify({'error': 'File not found'}), 404
+    offset = max(request.args.get('offset', 0, type=int), 0)
+    limit = request.args.get('limit', None, type=int)
+    if limit is not None:
+        limit = max(limit, 0)
+    transactions = get_http_transactions(file_path, offset, limit, request.args.get('method'),
+                                         request.args.get('host'), request.args.get('status', None, type=int))
+    if 'error' in transactions:
+        return jsonify(transactions), 500
+    return jsonify(transactions)
+
+@app.route('/packet/api/follow/<filename>')
+def packet_follow(filename):
+    file_path = packet_file_path(filename)
+    if file_path is None:
+        return jsonify({'error': 'File not found'}), 404
+    start = request.args.get('start', None, type=int)
+    if start is not None:
+        start = max(start, 0)
+    interval = min(max(request.args.get('interval', 1.0, type=float), 0.2), 60.0)
+    try:
+        validate_filters(request.args.get('ip'), request.args.get('port'))
+    except FilterError as e:
+        return jsonify({'error': f'Invalid filter: {e}'}), 400
+    batches = follow_packet_summaries(file_path, start, request.args.get('protocol'), request.args.get('ip'),
+                                      request.args.get('port'), interval)
+    response = Response(packet_event_stream(batches), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+@app.route('/packet/api/search/<filename>')
+def packet_search(filename):
+    file_path = packet_file_path(filename)
+    if file_path is None:
+        return jsonify({'error': 'File not found'}), 404
+    try:
+        pattern = compile_search(request.args.get('text'), request.args.get('hex'), request.args.get('regex'),
+                                 request.args.get('ignore_case') == 'true')
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    start = max(request.args.get('start', 0, type=int), 0)
+    max_hits = max(request.args.get('max_hits', 1000, type=int), 0)
+    hits = search_payloads(file_path, pattern, start, max_hits)
+    return Response(packet_ndjson(hits), mimetype='application/x-ndjson')
+
+@app.route('/packet/api/export/<filename>')
+def packet_export(filename):
+    file_path = packet_file_path(filename)
+    if file_path is None:
+        return jsonify({'error': 'File not found'}), 404
+    display_filter = request.args.get('filter', None)
+    try:
+        validate_filters(request.args.get('ip'), request.args.get('port'), display_filter)
+    except FilterError as e:
+        return jsonify({'error': f'Invalid filter: {e}'}), 400
+    stem, extension = os.path.splitext(strip_compression_suffix(filename))
+    # An anonymous temporary file disappears once the response closes it
+    export_file = tempfile.TemporaryFile()
+    try:
+        indices = matching_packet_indices(file_path, request.args.get('protocol'), request.args.get('ip'),
+                                          request.args.get('port'), display_filter)
+        export_packets(file_path, indices, export_file)
+    except Exception as e:
+        export_file.close()
+        return jsonify({'error': f'Export failed: {e}'}), 500
+    export_file.seek(0)
+    return send_file(export_file, as_attachment=True, download_name=f'{stem}-filtered{extension}',
+                     mimetype='application/vnd.tcpdump.pcap')
+
 @app.route('/packet/api/packet_details/<filename>/<int:packet_index>')
 def packet_details(filename, packet_index):
-    file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-    if not os.path.exists(file_path):
+    file_path = packet_file_path(filename)
+    if file_path is None:
         return jsonify({'error': 'File not found'}), 404
     details = get_packet_details(file_path, packet_index)
     return jsonify(details)
 
+@app.route('/packet/api/packet_details/<filename>', methods=['GET', 'POST'])
+def packet_details_batch(filename):
+    file_path = packet_file_path(filename)
+    if file_path is None:
+        return jsonify({'error': 'File not found'}), 404
+    body = request.get_json(silent=True) or {}
+    if isinstance(body, list):
+        body = {'indices': body}
+    try:
+        indices = parse_packet_indices(body.get('indices', request.args.get('indices')),
+                                       body.get('start', request.args.get('start', None, type=int)),
+                                       body.get('stop', request.args.get('stop', None, type=int)))
+    except (TypeError, ValueError) as e:
+        return jsonify({'error': str(e)}), 400
+    details = get_packets_details(file_path, indices)
+    if 'error' in details:
+        return jsonify(details), 500
+    return jsonify({str(packet_index): packet for packet_index, packet in details.items()})
+
 @app.route('/packet/download_sample/<filename>')
 def packet_download_sample(filename):
     return send_from_directory(app.config['UPLOAD_FOLDER'], filename, as_attachment=True)
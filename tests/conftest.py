@@ -0,0 +1,15 @@
+import struct
+
+import pytest
+
+def _write_pcap(path, frames):
+    """Write Ethernet frames to a classic pcap file, one second apart"""
+    with open(path, 'wb') as f:
+        f.write(struct.pack('<IHHiIII', 0xa1b2c3d4, 2, 4, 0, 0, 65535, 1))
+        for i, frame in enumerate(frames):
+            f.write(struct.pack('<IIII', i + 1, 0, len(frame), len(frame)))
+            f.write(frame)
+
+@pytest.fixture(scope='session')
+def write_pcap():
+    return _write_pcap
@@ -0,0 +1,25 @@
+from scapy.all import Ether, IP, IPv6, TCP, UDP, ICMP, DNS
+from scapy.layers.inet6 import ICMPv6DestUnreach
+
+from utils.capture_stats import protocol_path
+
+def path_of(packet):
+    data = bytes(packet)
+    return protocol_path({'data': data, 'linktype': 1, 'time': 0.0, 'caplen': len(data), 'wirelen': len(data)})
+
+def test_icmp_errors_stop_at_the_quoted_packet():
+    quoted = IP(src='10.0.0.2', dst='10.0.0.1') / UDP(sport=1000, dport=53) / DNS()
+    assert path_of(Ether() / IP() / ICMP(type=3) / quoted) == ['Ethernet', 'IPv4', 'ICMP']
+    assert path_of(Ether() / IPv6() / ICMPv6DestUnreach() / IPv6() / UDP()) == ['Ethernet', 'IPv6', 'ICMPv6']
+
+def test_http_is_recognised_by_content():
+    request = Ether() / IP() / TCP(sport=1234, dport=80) / b'GET / HTTP/1.1\r\nHost: a\r\n\r\n'
+    body = Ether() / IP() / TCP(sport=80, dport=1234) / b'rest of a response body'
+    assert path_of(request) == ['Ethernet', 'IPv4', 'TCP', 'HTTP']
+    assert path_of(body) == ['Ethernet', 'IPv4', 'TCP', 'Data']
+
+def test_scapy_path_uses_the_same_names():
+    # DNS over TCP and port 53 traffic go through scapy
+    assert path_of(Ether() / IP() / TCP(sport=1234, dport=53) / DNS()) == ['Ethernet', 'IPv4', 'TCP', 'DNS']
+    response = Ether() / IP() / TCP(sport=80, dport=53) / b'HTTP/1.1 200 OK\r\n\r\n'
+    assert path_of(response) == ['Ethernet', 'IPv4', 'TCP', 'HTTP']
@@ -0,0 +1,93 @@
+import dns.rrset
+import pytest
+
+from utils import dns_cache
+from utils.dns_cache import (cache_answer, cache_delegation, cache_stats, clear_cache, get_cached_answer,
+                             get_cached_delegation)
+
+SERVERS = [{'name': 'ns1.example.com.', 'ip': '192.0.2.53'}]
+
+@pytest.fixture(autouse=True)
+def empty_cache():
+    clear_cache()
+    yield
+    clear_cache()
+
+def positive(name, address='192.0.2.1', ttl=300):
+    return {'status': 'NOERROR', 'records': [dns.rrset.from_text(name, ttl, 'IN', 'A', address)],
+            'cnames': [], 'soa': None}
+
+def negative(status, zone='example.com.', ttl=3600, minimum=60):
+    soa = dns.rrset.from_text(zone, ttl, 'IN', 'SOA', f'ns1.{zone} admin.{zone} 1 7200 900 1209600 {minimum}')
+    return {'status': status, 'records': [], 'cnames': [], 'soa': soa}
+
+def test_positive_answer_is_cached_for_its_ttl():
+    assert cache_answer('www.example.com', 'A', positive('www.example.com.', ttl=300))
+    lookup = get_cached_answer('WWW.example.com.', 'a')
+    assert lookup['status'] == 'NOERROR'
+    assert [rdata.to_text() for rdata in lookup['records'][0]] == ['192.0.2.1']
+    assert 299 <= lookup['ttl'] <= 300
+    assert get_cached_answer('www.example.com', 'AAAA') is None
+
+def test_zero_ttl_answers_are_not_cached():
+    assert not cache_answer('www.example.com', 'A', positive('www.example.com.', ttl=0))
+    assert get_cached_answer('www.example.com', 'A') is None
+
+def test_negative_answer_uses_soa_minimum():
+    assert cache_answer('www.example.com', 'AAAA', negative('NODATA', minimum=60))
+    lookup = get_cached_answer('www.example.com', 'AAAA')
+    assert lookup['status'] == 'NODATA'
+    assert 59 <= lookup['ttl'] <= 60
+    # NODATA only covers the type that was asked for
+    assert get_cached_answer('www.example.com', 'A') is None
+    stats = cache_stats()
+    assert stats['negative_inserts'] == 1
+    assert stats['negative_hits'] == 1
+
+def test_negative_answer_without_soa_is_not_cached():
+    lookup = negative('NXDOMAIN')
+    lookup['soa'] = None
+    assert not cache_answer('missing.example.com', 'A', lookup)
+
+def test_nxdomain_answers_every_type():
+    assert cache_answer('missing.example.com', 'A', negative('NXDOMAIN'))
+    for rdtype in ('A', 'AAAA', 'MX', 'TXT'):
+        assert get_cached_answer('missing.example.com', rdtype)['status'] == 'NXDOMAIN'
+    assert get_cached_answer('other.example.com', 'A') is None
+
+def test_nxdomain_after_a_cname_only_answers_its_type():
+    lookup = negative('NXDOMAIN')
+    lookup['cnames'] = [dns.rrset.from_text('alias.example.com.', 300, 'IN', 'CNAME', 'missing.example.net.')]
+    assert cache_answer('alias.example.com', 'A', lookup)
+    assert get_cached_answer('alias.example.com', 'A')['status'] == 'NXDOMAIN'
+    assert get_cached_answer('alias.example.com', 'MX') is None
+
+def test_eviction_spans_answers_and_delegations(monkeypatch):
+    monkeypatch.setattr(dns_cache, 'DNS_CACHE_SIZE', 3)
+    cache_answer('a.example.com', 'A', positive('a.example.com.'))
+    cache_delegation('example.org', SERVERS, 3600)
+    cache_answer('b.example.com', 'A', positive('b.example.com.'))
+
+    # Using the first answer makes the referral the least recently used entry
+    assert get_cached_answer('a.example.com', 'A') is not None
+    cache_answer('c.example.com', 'A', positive('c.example.com.'))
+    assert get_cached_delegation('www.example.org') is None
+    assert cache_stats()['delegations']['evictions'] == 1
+
+    # Now the oldest entry is an answer
+    cache_delegation('example.net', SERVERS, 3600)
+    assert get_cached_answer('b.example.com', 'A') is None
+    assert get_cached_answer('a.example.com', 'A') is not None
+    assert get_cached_answer('c.example.com', 'A') is not None
+    assert get_cached_delegation('www.example.net')[0] == 'example.net.'
+    assert cache_stats()['evictions'] == 1
+
+def test_deepest_delegation_is_returned():
+    cache_delegation('com', SERVERS, 3600)
+    cache_delegation('example.com', SERVERS, 600)
+    zone, servers, ttl = get_cached_delegation('www.example.com')
+    assert zone == 'example.com.'
+    assert servers == SERVERS
+    assert 599 <= ttl <= 600
+    assert get_cached_delegation('www.other.com')[0] == 'com.'
+    assert get_cached_delegation('www.example.org') is None
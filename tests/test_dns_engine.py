@@ -0,0 +1,36 @@
+import time
+from collections import OrderedDict
+
+import dns.message
+
+from utils import dns_engine
+
+FAST, SLOW = '192.0.2.1', '192.0.2.2'
+
+def test_losing_a_race_does_not_lower_a_timeout_penalty(monkeypatch):
+    monkeypatch.setattr(dns_engine, '_srtt', OrderedDict())
+    monkeypatch.setattr(dns_engine, 'DNS_HEDGE_DELAY', 0.01)
+    dns_engine.record_rtt(FAST, 0.001)
+    dns_engine.record_timeout(SLOW, 2.0)
+
+    def send(name, rdtype, ip, port, timeout):
+        # FAST is queried first but is slow this time, so SLOW is raced
+        # against it and is still waiting when FAST answers
+        time.sleep(0.1 if ip == FAST else 0.3)
+        return dns.message.make_response(dns.message.make_query(name, rdtype)), 0.1
+    monkeypatch.setattr(dns_engine, '_send', send)
+
+    context = {'deadline': time.perf_counter() + 5, 'timeout': 2.0, 'port': 53}
+    servers = [{'name': 'a.example.', 'ip': FAST}, {'name': 'b.example.', 'ip': SLOW}]
+    _, server, _, queried = dns_engine._query_zone('example.com.', 'A', servers, context)
+
+    assert server['ip'] == FAST
+    assert [s['ip'] for s in queried] == [FAST, SLOW]
+    # Only decayed for being passed over, not pulled down to the ~0.09 s waited
+    assert dns_engine.nameserver_stats()[SLOW] >= 1900
+
+def test_elapsed_time_only_raises_the_estimate(monkeypatch):
+    monkeypatch.setattr(dns_engine, '_srtt', OrderedDict())
+    dns_engine.record_elapsed(FAST, 0.05)
+    dns_engine.record_elapsed(FAST, 0.01)
+    assert dns_engine.nameserver_stats()[FAST] == 50.0
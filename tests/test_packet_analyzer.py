@@ -0,0 +1,40 @@
+from scapy.all import Ether, IP, TCP, UDP, DNS, DNSQR
+
+from utils.packet_analyzer import (analyze_pcap, dissect_record, get_packet_details, get_summary_index,
+                                   iter_timed_summaries)
+
+def test_truncated_frame_is_dissected_as_raw():
+    record = {'data': b'\x00' * 10, 'linktype': 1, 'time': 1.0, 'wirelen': 10, 'caplen': 10}
+    packet = dissect_record(record)
+    assert bytes(packet) == record['data']
+
+def test_truncated_frame_does_not_hide_the_capture(tmp_path, write_pcap):
+    path = str(tmp_path / 'truncated.pcap')
+    valid = bytes(Ether() / IP(src='10.0.0.1', dst='10.0.0.2') / UDP(sport=1000, dport=2000))
+    write_pcap(path, [valid, b'\x00' * 10, valid])
+
+    packets = analyze_pcap(path)
+    assert [packet['index'] for packet in packets] == [0, 1, 2]
+    assert packets[1]['protocol'] == 'Unknown'
+    assert 'error' not in get_packet_details(path, 1)
+
+def test_zero_length_records_are_indexed(tmp_path, write_pcap):
+    path = str(tmp_path / 'empty-records.pcap')
+    valid = bytes(Ether() / IP(src='10.0.0.1', dst='10.0.0.2') / UDP(sport=1000, dport=2000))
+    write_pcap(path, [valid, b'', b''])
+
+    packets = analyze_pcap(path)
+    assert [packet['index'] for packet in packets] == [0, 1, 2]
+    assert get_summary_index(path)['count'] == 3
+
+def test_parallel_summaries_match_serial(tmp_path, write_pcap):
+    path = str(tmp_path / 'mixed.pcap')
+    # DNS over TCP needs scapy; the other frames take the fast path
+    dns = bytes(Ether() / IP(src='10.0.0.1', dst='10.0.0.2') / TCP(sport=1234, dport=53) /
+                DNS(qd=DNSQR(qname='example.com')))
+    data = bytes(Ether() / IP(src='10.0.0.1', dst='10.0.0.2') / UDP(sport=1000, dport=2000) / b'data')
+    write_pcap(path, [dns if i % 3 == 0 else data for i in range(60)])
+
+    serial = list(iter_timed_summaries(path, workers=1))
+    assert list(iter_timed_summaries(path, workers=2, min_chunk=4)) == serial
+    assert [packet_info['index'] for _, packet_info in serial] == list(range(60))
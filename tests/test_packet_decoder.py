@@ -0,0 +1,18 @@
+import os
+
+from utils.pcap_index import iter_records
+from utils.packet_decoder import summarize_record
+from utils.packet_analyzer import summarize_packet, dissect_record
+
+SAMPLE_CAPTURE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                              'static', 'packet', 'pcap_files', 'temp.pcap')
+
+def test_fast_path_matches_scapy_summaries():
+    decoded = 0
+    for i, record in iter_records(SAMPLE_CAPTURE):
+        fast = summarize_record(record['data'], record['linktype'], i, record['time'])
+        if fast is None:
+            continue
+        assert fast == summarize_packet(dissect_record(record), i), f'packet {i}'
+        decoded += 1
+    assert decoded > 0
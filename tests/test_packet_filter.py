@@ -0,0 +1,78 @@
+import numpy as np
+import pytest
+from scapy.all import Ether, IP, TCP, UDP, ICMP, ARP, DNS, DNSQR
+
+from utils.packet_analyzer import get_summary_index
+from utils.packet_filter import FilterError, compile_filter, filter_mask
+
+FRAMES = [
+    # 0: DNS over UDP
+    Ether() / IP(src='10.0.0.1', dst='8.8.8.8') / UDP(sport=5000, dport=53) / DNS(qd=DNSQR(qname='example.com')),
+    # 1: DNS over TCP
+    Ether() / IP(src='10.0.0.1', dst='8.8.8.8') / TCP(sport=5001, dport=53) / DNS(qd=DNSQR(qname='example.com')),
+    # 2: HTTP request
+    Ether() / IP(src='10.0.0.2', dst='192.168.1.10') / TCP(sport=5002, dport=80) / b'GET / HTTP/1.1\r\n\r\n',
+    # 3: plain TCP
+    Ether() / IP(src='192.168.1.10', dst='10.0.0.2') / TCP(sport=22, dport=5003),
+    # 4: ICMP
+    Ether() / IP(src='10.0.0.3', dst='10.0.0.1') / ICMP(),
+    # 5: ARP
+    Ether() / ARP(psrc='10.0.0.1', pdst='10.0.0.9'),
+]
+
+@pytest.fixture(scope='module')
+def summary(tmp_path_factory, write_pcap):
+    path = str(tmp_path_factory.mktemp('filter') / 'mixed.pcap')
+    write_pcap(path, [bytes(frame) for frame in FRAMES])
+    return get_summary_index(path)
+
+def matching(summary, expression):
+    return list(np.flatnonzero(compile_filter(expression)(summary)))
+
+def test_transport_keywords_cover_application_protocols(summary):
+    assert matching(summary, 'tcp') == [1, 2, 3]
+    assert matching(summary, 'udp') == [0]
+    assert matching(summary, 'dns') == [0, 1]
+
+def test_port_fields_match_on_the_transport(summary):
+    assert matching(summary, 'tcp.port == 53') == [1]
+    assert matching(summary, 'udp.port == 53') == [0]
+    assert matching(summary, 'port == 53') == [0, 1]
+    assert matching(summary, 'tcp.dstport in 50..100') == [1, 2]
+    assert matching(summary, 'tcp.srcport != 22') == [1, 2]
+
+def test_keywords_are_case_insensitive(summary):
+    assert matching(summary, 'TCP AND NOT DNS') == [2, 3]
+    assert matching(summary, 'icmp Or arp') == [4, 5]
+    assert matching(summary, 'Tcp.Port IN 80..80') == [2]
+
+def test_precedence_and_parentheses(summary):
+    assert matching(summary, 'arp or tcp and dns') == [1, 5]
+    assert matching(summary, '(arp or tcp) and dns') == [1]
+    assert matching(summary, '!(ip) || icmp') == [4, 5]
+
+def test_address_fields(summary):
+    assert matching(summary, 'ip.src in 10.0.0.0/24 and not icmp') == [0, 1, 2]
+    assert matching(summary, 'ip.addr == 192.168.1.10') == [2, 3]
+    # Packets without an IP layer match neither == nor !=
+    assert matching(summary, 'ip.dst != 8.8.8.8') == [2, 3, 4]
+
+def test_legacy_filters(summary):
+    mask = filter_mask(summary, protocol_filter='dns', ip_filter='8.8.8.8', port_filter='53')
+    assert list(np.flatnonzero(mask)) == [0, 1]
+
+@pytest.mark.parametrize('expression', [
+    'tcp.port ==',
+    '(tcp or udp',
+    'tcp.port == http',
+    'tcp.port in 80',
+    'ip.src < 10.0.0.1',
+    'ip.src == 2001:db8::1',
+    'smtp',
+    'frame.size > 10',
+    'tcp udp',
+    'tcp $ udp',
+])
+def test_invalid_filters_are_rejected(expression):
+    with pytest.raises(FilterError):
+        compile_filter(expression)
@@ -0,0 +1,58 @@
+import numpy as np
+import pytest
+from scapy.all import Ether, IP, UDP
+
+from utils.packet_analyzer import get_summary_index, sampled_packet_summaries
+from utils.packet_sampling import parse_sample, sample_indices, sample_records
+
+PACKETS = 50
+
+@pytest.fixture(scope='module')
+def capture(tmp_path_factory, write_pcap):
+    # One packet per second, starting at t=1
+    path = str(tmp_path_factory.mktemp('sampling') / 'udp.pcap')
+    frame = bytes(Ether() / IP(src='10.0.0.1', dst='10.0.0.2') / UDP(sport=1000, dport=2000))
+    write_pcap(path, [frame] * PACKETS)
+    return path
+
+def all_packets(capture):
+    summary = get_summary_index(capture)
+    indices = np.arange(summary['count'])
+    return indices, summary['time'][indices]
+
+def test_parse_sample():
+    assert parse_sample('every:10') == ('every', 10)
+    assert parse_sample('Reservoir:5') == ('reservoir', 5)
+    assert parse_sample('time:250ms') == ('time', 0.25)
+    assert parse_sample('time:2m') == ('time', 120.0)
+    for spec in ('every:0', 'every:x', 'reservoir:', 'time:0s', 'time:1d', 'random:5'):
+        with pytest.raises(ValueError):
+            parse_sample(spec)
+
+def test_every(capture):
+    assert list(sample_records(capture, 'every', 7)) == list(range(0, PACKETS, 7))
+    assert list(sample_indices(*all_packets(capture), 'every', 7)) == list(range(0, PACKETS, 7))
+
+def test_reservoir(capture):
+    picked = sample_records(capture, 'reservoir', 10, seed=3)
+    assert len(picked) == 10
+    assert picked == sorted(set(picked))
+    assert all(0 <= i < PACKETS for i in picked)
+    assert sample_records(capture, 'reservoir', 10, seed=3) == picked
+    assert sample_records(capture, 'reservoir', 10, seed=4) != picked
+    # Asking for more than there is returns everything
+    assert sample_records(capture, 'reservoir', PACKETS * 2) == list(range(PACKETS))
+
+def test_time(capture):
+    # Timestamps 1..50 s in 5 s buckets: the first packet of each is at t=1, 5, 10, ...
+    expected = [0] + list(range(4, PACKETS, 5))
+    assert list(sample_records(capture, 'time', 5.0)) == expected
+    assert list(sample_indices(*all_packets(capture), 'time', 5.0)) == expected
+
+@pytest.mark.parametrize('sample', ['every:4', 'reservoir:12', 'time:3s'])
+def test_filtered_and_unfiltered_samples_agree(capture, sample):
+    # The display filter matches every packet, so only the code path differs
+    unfiltered = [p['index'] for p in sampled_packet_summaries(capture, sample, seed=9)]
+    filtered = [p['index'] for p in sampled_packet_summaries(capture, sample, display_filter='udp', seed=9)]
+    assert filtered == unfiltered
+    assert unfiltered
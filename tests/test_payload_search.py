@@ -0,0 +1,32 @@
+import re
+
+from scapy.all import Ether, IP, TCP, UDP, DNS, DNSQR
+
+from utils.payload_search import compile_search, search_payloads
+
+def test_headers_are_not_searched(tmp_path, write_pcap):
+    path = str(tmp_path / 'headers.pcap')
+    # The ethertype 0x0800 and the ports appear in the headers only
+    frame = bytes(Ether() / IP(src='10.0.0.1', dst='10.0.0.2') / TCP(sport=2048, dport=80) / b'hello')
+    write_pcap(path, [frame])
+
+    assert list(search_payloads(path, compile_search(hex_bytes='0800'))) == []
+    hits = list(search_payloads(path, compile_search(regex='^hello$')))
+    assert [(hit['index'], hit['offset']) for hit in hits] == [(0, len(frame) - 5)]
+
+def test_link_padding_is_not_searched(tmp_path, write_pcap):
+    path = str(tmp_path / 'padding.pcap')
+    frame = bytes(Ether() / IP(src='10.0.0.1', dst='10.0.0.2') / UDP(sport=1000, dport=2000) / b'ab') + b'PAD' * 4
+    write_pcap(path, [frame])
+
+    assert list(search_payloads(path, compile_search(text='PAD'))) == []
+    assert len(list(search_payloads(path, compile_search(text='ab')))) == 1
+
+def test_frames_left_to_scapy_are_searched(tmp_path, write_pcap):
+    path = str(tmp_path / 'dns.pcap')
+    frame = bytes(Ether() / IP(src='10.0.0.1', dst='10.0.0.2') / UDP(sport=1000, dport=53) /
+                  DNS(qd=DNSQR(qname='example.com')))
+    write_pcap(path, [frame])
+
+    hits = list(search_payloads(path, re.compile(b'example')))
+    assert [hit['index'] for hit in hits] == [0]
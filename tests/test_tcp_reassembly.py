@@ -0,0 +1,32 @@
+from utils import tcp_reassembly
+from utils.tcp_reassembly import StreamBuffer
+
+def test_out_of_order_segments_spill_under_memory_pressure(monkeypatch):
+    monkeypatch.setattr(tcp_reassembly, 'REASSEMBLY_MEMORY', 100)
+    buffer = StreamBuffer()
+    buffer.add(1000, 0, b'a' * 10)
+    # Everything after the first segment arrives before the second one
+    for i in range(2, 30):
+        buffer.add(1000 + i * 10, 0, bytes([97 + i % 26]) * 10)
+    buffer.add(1010, 0, b'b' * 10)
+
+    stats = buffer.stats()
+    assert stats['bytes'] == 300
+    assert stats['missing_bytes'] == 0
+    assert stats['gaps'] == []
+    assert stats['spilled_to_disk']
+    assert buffer.read(0, 300) == b''.join(bytes([97 + i % 26]) * 10 for i in range(30))
+    buffer.close()
+    assert tcp_reassembly._memory_in_use == 0
+
+def test_skipped_bytes_are_recorded_as_gaps():
+    buffer = StreamBuffer()
+    buffer.add(0, 0, b'abc')
+    buffer.add(10, 0, b'xyz')
+    buffer.finish()
+
+    stats = buffer.stats()
+    assert stats['missing_bytes'] == 7
+    assert stats['gaps'] == [{'offset': 3, 'length': 7}]
+    assert buffer.read(0, 6) == b'abcxyz'
+    buffer.close()
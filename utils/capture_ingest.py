@@ -0,0 +1,96 @@
+import os
+import hashlib
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from .pcap_index import get_record_index
+from .packet_analyzer import get_summary_index
+from .compressed_capture import compression_of, resolve_capture
+
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+# Captures are indexed one at a time so uploads do not compete for the CPU
+_indexer = ThreadPoolExecutor(max_workers=1, thread_name_prefix='capture-indexer')
+_pending = {}
+_pending_lock = threading.Lock()
+
+def save_capture_stream(stream, pcap_file, chunk_size=UPLOAD_CHUNK_SIZE):
+    """
+    Copy an upload stream to disk in fixed-size chunks
+
+    The content hash is computed while writing, so the summary index can be
+    built later without reading the file again. Data goes to a temporary
+    file that only replaces pcap_file once the upload is complete.
+
+    Args:
+        stream: File-like object to read the upload from
+        pcap_file (str): Destination path
+        chunk_size (int, optional): Bytes read and written at a time
+
+    Returns:
+        tuple: (SHA-256 hex digest, number of bytes written)
+    """
+    digest = hashlib.sha256()
+    size = 0
+    # Each upload gets its own temporary file, so two uploads of the same
+    # name cannot interleave their writes; the last to finish wins
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(pcap_file) or '.', prefix=os.path.basename(pcap_file) + '.',
+                                    suffix='.part')
+
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            for chunk in iter(lambda: stream.read(chunk_size), b''):
+                digest.update(chunk)
+                f.write(chunk)
+                size += len(chunk)
+        os.replace(tmp_path, pcap_file)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+    return digest.hexdigest(), size
+
+def queue_capture_indexing(pcap_file, content_hash=None):
+    """
+    Build the record-offset and summary indexes of a capture in the background
+
+    Args:
+        pcap_file (str): Path to the PCAP file
+        content_hash (str, optional): SHA-256 of the capture, if already known
+
+    Returns:
+        concurrent.futures.Future: Completes once both indexes are built
+    """
+    pcap_file = os.path.abspath(pcap_file)
+    with _pending_lock:
+        future = _pending.get(pcap_file)
+        if future is not None and not future.done():
+            return future
+        future = _indexer.submit(_index_capture, pcap_file, content_hash)
+        _pending[pcap_file] = future
+    return future
+
+def indexing_status(pcap_file):
+    """Return 'pending', 'ready', 'failed' or None if the capture was never queued"""
+    with _pending_lock:
+        future = _pending.get(os.path.abspath(pcap_file))
+    if future is None:
+        return None
+    if not future.done():
+        return 'pending'
+    return 'failed' if future.result() is False else 'ready'
+
+def _index_capture(pcap_file, content_hash):
+    """Build both indexes of a capture, returning False on failure"""
+    try:
+        if compression_of(pcap_file):
+            # The upload's hash is of the compressed bytes
+            pcap_file, content_hash = resolve_capture(pcap_file), None
+        get_record_index(pcap_file)
+        get_summary_index(pcap_file, content_hash)
+        return True
+    except Exception as e:
+        print(f"Error indexing PCAP file: {e}")
+        return False
@@ -0,0 +1,310 @@
+import os
+import math
+import datetime
+import threading
+from array import array
+
+import numpy as np
+from scapy.packet import NoPayload
+
+from .pcap_index import file_signature, iter_records
+from .packet_decoder import decode_frame
+from .packet_analyzer import dissect_record
+
+# Width in seconds of the stored IO-graph histogram buckets. Coarser
+# series are summed from these.
+FINE_RESOLUTION = 0.001
+
+# Largest number of buckets returned for one IO-graph series
+MAX_IO_BUCKETS = 10000
+
+# Bucket count aimed for when no interval is requested
+DEFAULT_IO_BUCKETS = 100
+
+# Packets whose fine bucket numbers are buffered before being summed
+HISTOGRAM_CHUNK = 65536
+
+LINK_NAMES = {1: 'Ethernet', 9: 'PPP', 12: 'Raw IP', 101: 'Raw IP', 228: 'Raw IP', 229: 'Raw IP'}
+
+# Scapy layer names as shown in the protocol hierarchy
+SCAPY_LAYER_NAMES = {
+    'Ether': 'Ethernet',
+    'Dot1Q': 'VLAN',
+    'IP': 'IPv4',
+    'Raw': 'Data',
+    'HTTPRequest': 'HTTP',
+    'HTTPResponse': 'HTTP'
+}
+
+# Scapy layers that are not protocols of their own
+SKIPPED_LAYERS = {'Padding'}
+
+# First bytes of HTTP/1.x requests and responses
+HTTP_PREFIXES = (b'GET ', b'POST ', b'PUT ', b'DELETE ', b'HEAD ', b'OPTIONS ', b'PATCH ', b'CONNECT ',
+                 b'TRACE ', b'HTTP/')
+
+# TLS record content types: change_cipher_spec, alert, handshake, application_data
+TLS_CONTENT_TYPES = range(20, 24)
+
+# Statistics of recently used files, keyed by absolute path
+_stats_cache = {}
+_stats_lock = threading.Lock()
+
+def get_capture_stats(pcap_file, interval=None):
+    """
+    Get the protocol hierarchy and IO graph of a capture
+
+    Args:
+        pcap_file (str): Path to the PCAP file
+        interval (float, optional): IO graph bucket width in seconds; chosen
+                                    from the capture duration if omitted
+
+    Returns:
+        dict: Totals, protocol 'hierarchy' tree and 'io_graph' series
+    """
+    try:
+        stats = get_stats_index(pcap_file)
+        if stats['packets'] == 0:
+            first_seen = last_seen = None
+        else:
+            first_seen = str(datetime.datetime.fromtimestamp(stats['first_seen']))
+            last_seen = str(datetime.datetime.fromtimestamp(stats['last_seen']))
+        return {
+            'packets': stats['packets'],
+            'bytes': stats['bytes'],
+            'first_seen': first_seen,
+            'last_seen': last_seen,
+            'duration': round(stats['last_seen'] - stats['first_seen'], 6),
+            'hierarchy': stats['hierarchy'],
+            'io_graph': io_graph(stats, interval)
+        }
+    except Exception as e:
+        print(f"Error computing capture statistics: {e}")
+        return {'error': str(e)}
+
+def get_stats_index(pcap_file):
+    """
+    Return the statistics of a capture, computing them if needed
+
+    Results are cached until the file's modification time or size changes.
+
+    Args:
+        pcap_file (str): Path to the PCAP file
+
+    Returns:
+        dict: Statistics (see build_stats_index)
+    """
+    path = os.path.abspath(pcap_file)
+    signature = file_signature(path)
+
+    with _stats_lock:
+        cached = _stats_cache.get(path)
+        if cached is not None and cached[0] == signature:
+            return cached[1]
+
+    stats = build_stats_index(path)
+
+    with _stats_lock:
+        _stats_cache[path] = (signature, stats)
+    return stats
+
+def build_stats_index(pcap_file):
+    """
+    Count packets and bytes per protocol path and per time bucket in one pass
+
+    Args:
+        pcap_file (str): Path to the PCAP file
+
+    Returns:
+        dict: Totals, the protocol hierarchy tree and the fine IO-graph
+              histogram as sorted bucket numbers with packet and byte counts
+    """
+    root = _hierarchy_node('Frame')
+    # Bucket numbers and lengths of the latest packets, summed per bucket
+    # every HISTOGRAM_CHUNK packets so memory follows the busy buckets
+    numbers, lengths, histogram = array('q'), array('q'), []
+    first_seen = last_seen = None
+
+    for _, record in iter_records(pcap_file):
+        length = record['wirelen']
+        timestamp = record['time']
+        if first_seen is None:
+            first_seen = last_seen = timestamp
+        first_seen = min(first_seen, timestamp)
+        last_seen = max(last_seen, timestamp)
+
+        node = root
+        node['packets'] += 1
+        node['bytes'] += length
+        for name in protocol_path(record):
+            child = node['children'].get(name)
+            if child is None:
+                child = node['children'][name] = _hierarchy_node(name)
+            child['packets'] += 1
+            child['bytes'] += length
+            node = child
+
+        numbers.append(math.floor(timestamp / FINE_RESOLUTION))
+        lengths.append(length)
+        if len(numbers) >= HISTOGRAM_CHUNK:
+            histogram.append(_sum_buckets(np.frombuffer(numbers, dtype=np.int64), np.frombuffer(lengths, dtype=np.int64)))
+            numbers, lengths = array('q'), array('q')
+
+    histogram.append(_sum_buckets(np.frombuffer(numbers, dtype=np.int64), np.frombuffer(lengths, dtype=np.int64)))
+    # Chunks may share the buckets at their edges, so sum them once more
+    numbers, packets, lengths = (np.concatenate(parts) for parts in zip(*histogram))
+    buckets, bucket_packets, bucket_bytes = _sum_buckets(numbers, lengths, packets)
+    return {
+        'packets': root['packets'],
+        'bytes': root['bytes'],
+        'first_seen': first_seen or 0.0,
+        'last_seen': last_seen or 0.0,
+        'hierarchy': _hierarchy_list(root),
+        'buckets': buckets,
+        'bucket_packets': bucket_packets,
+        'bucket_bytes': bucket_bytes
+    }
+
+def protocol_path(record):
+    """
+    List the protocols of a capture record from the link layer up
+
+    Args:
+        record (dict): Record returned by utils.pcap_index.read_record
+
+    Returns:
+        list: Protocol names, e.g. ['PPP', 'IPv4', 'TCP', 'HTTP']
+    """
+    frame = decode_frame(record['data'], record['linktype'])
+    if frame is None:
+        return _scapy_protocol_path(record)
+
+    path = [LINK_NAMES.get(record['linktype'], 'Unknown')]
+    if frame.get('vlan_tags'):
+        # Stacked tags are one node, as consecutive Dot1Q layers are above
+        path.append('VLAN')
+    if frame.get('arp_op') is not None:
+        path.append('ARP')
+        return path
+    if not frame.get('ip_version'):
+        return path
+    path.append(f"IPv{frame['ip_version']}")
+
+    transport = frame['transport']
+    if transport is None:
+        return path
+    path.append(transport.upper() if transport != 'icmpv6' else 'ICMPv6')
+
+    if 'dns_id' in frame:
+        path.append('DNS')
+    elif transport == 'tcp' and frame['payload_end'] > frame['payload_offset']:
+        payload = record['data'][frame['payload_offset']:frame['payload_end']]
+        path.append(_tcp_application((frame['sport'], frame['dport']), payload))
+    elif transport == 'udp' and frame['payload_end'] > frame['payload_offset']:
+        path.append('Data')
+    return path
+
+def _scapy_protocol_path(record):
+    """List the protocols of a record the fast decoder cannot handle, using scapy"""
+    path = []
+    if LINK_NAMES.get(record['linktype']) == 'Raw IP':
+        path.append('Raw IP')
+
+    layer = dissect_record(record)
+    tcp = None
+    while not isinstance(layer, NoPayload):
+        name = type(layer).__name__
+        if name.endswith(('error', 'error6')):
+            # The rest is the offending packet quoted by an ICMP error
+            break
+        if name.startswith('ICMPv6'):
+            # Message types and options are separate scapy layers
+            name = 'ICMPv6'
+        name = SCAPY_LAYER_NAMES.get(name, name)
+        if name == 'TCP':
+            tcp = layer
+        elif name == 'Data':
+            # As on the fast path, only transport payloads are named
+            if path and path[-1] not in ('TCP', 'UDP'):
+                break
+            if path and path[-1] == 'TCP':
+                name = _tcp_application((tcp.sport, tcp.dport), layer.load)
+        if name not in SKIPPED_LAYERS and (not path or path[-1] != name):
+            path.append(name)
+        layer = layer.payload
+    return path
+
+def _tcp_application(ports, payload):
+    """Name the protocol of a TCP payload from its ports and first bytes"""
+    if 80 in ports and payload.startswith(HTTP_PREFIXES):
+        return 'HTTP'
+    if 443 in ports and len(payload) >= 3 and payload[0] in TLS_CONTENT_TYPES and payload[1] == 3:
+        return 'HTTPS'
+    return 'Data'
+
+def io_graph(stats, interval=None):
+    """
+    Sum the fine histogram into buckets of the given width
+
+    Args:
+        stats (dict): Statistics returned by get_stats_index
+        interval (float, optional): Bucket width in seconds. It is rounded
+                                    to a multiple of FINE_RESOLUTION and
+                                    widened if the series would exceed
+                                    MAX_IO_BUCKETS buckets.
+
+    Returns:
+        dict: Bucket 'interval', series 'start' time and per-bucket
+              'packets' and 'bytes' lists
+    """
+    numbers = stats['buckets']
+    if len(numbers) == 0:
+        return {'interval': interval or 1.0, 'start': None, 'packets': [], 'bytes': []}
+
+    span = int(numbers[-1] - numbers[0]) + 1
+    if not interval or interval <= 0:
+        interval = span * FINE_RESOLUTION / DEFAULT_IO_BUCKETS
+    # Buckets wider than the whole capture hold nothing more
+    factor = max(1, round(min(interval / FINE_RESOLUTION, span)), math.ceil(span / MAX_IO_BUCKETS))
+
+    first = numbers[0] // factor
+    positions = numbers // factor - first
+    size = int(positions[-1]) + 1
+    return {
+        'interval': round(factor * FINE_RESOLUTION, 6),
+        'start': float(first * factor * FINE_RESOLUTION),
+        'packets': np.bincount(positions, weights=stats['bucket_packets'], minlength=size).astype(np.int64).tolist(),
+        'bytes': np.bincount(positions, weights=stats['bucket_bytes'], minlength=size).astype(np.int64).tolist()
+    }
+
+def _sum_buckets(numbers, lengths, packets=None):
+    """
+    Sum packets and bytes per distinct fine bucket number
+
+    Args:
+        numbers (numpy.ndarray): Bucket number of each entry
+        lengths (numpy.ndarray): Bytes of each entry
+        packets (numpy.ndarray, optional): Packets of each entry, one each
+                                           if omitted
+
+    Returns:
+        tuple: Sorted bucket numbers and their packet and byte counts
+    """
+    buckets, positions = np.unique(numbers, return_inverse=True)
+    counts = np.bincount(positions, weights=packets, minlength=len(buckets))
+    sizes = np.bincount(positions, weights=lengths, minlength=len(buckets))
+    return buckets.astype(np.int64), counts.astype(np.int64), sizes.astype(np.int64)
+
+def _hierarchy_node(name):
+    """Create an empty protocol hierarchy node"""
+    return {'protocol': name, 'packets': 0, 'bytes': 0, 'children': {}}
+
+def _hierarchy_list(node):
+    """Convert a hierarchy node's children into lists, largest first"""
+    children = sorted(node['children'].values(), key=lambda child: child['packets'], reverse=True)
+    return {
+        'protocol': node['protocol'],
+        'packets': node['packets'],
+        'bytes': node['bytes'],
+        'children': [_hierarchy_list(child) for child in children]
+    }
@@ -0,0 +1,99 @@
+import os
+import gzip
+import lzma
+import shutil
+import threading
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Compression suffixes accepted after a capture extension, e.g. trace.pcap.gz
+COMPRESSION_SUFFIXES = {'gz', 'xz', 'zst'}
+
+DECOMPRESSED_SUFFIX = '.decompressed'
+
+# Bytes decompressed and written at a time
+DECOMPRESS_CHUNK_SIZE = 1024 * 1024
+
+# One lock per compressed file so it is only decompressed once at a time
+_decompress_locks = {}
+_decompress_locks_lock = threading.Lock()
+
+def compression_of(pcap_file):
+    """Return the compression suffix of a capture file name, or None"""
+    suffix = pcap_file.rsplit('.', 1)[-1].lower() if '.' in pcap_file else ''
+    return suffix if suffix in COMPRESSION_SUFFIXES else None
+
+def strip_compression_suffix(filename):
+    """Return a file name without its compression suffix"""
+    if compression_of(filename):
+        return filename.rsplit('.', 1)[0]
+    return filename
+
+def open_decompressed(pcap_file):
+    """
+    Open a compressed capture as a stream of decompressed bytes
+
+    Args:
+        pcap_file (str): Path to a .gz, .xz or .zst capture
+
+    Returns:
+        file: Binary file object yielding the decompressed capture
+    """
+    compression = compression_of(pcap_file)
+    if compression == 'gz':
+        return gzip.open(pcap_file, 'rb')
+    if compression == 'xz':
+        return lzma.open(pcap_file, 'rb')
+    if compression == 'zst':
+        if zstandard is None:
+            raise ValueError('Reading .zst captures needs the zstandard package')
+        return zstandard.ZstdDecompressor().stream_reader(open(pcap_file, 'rb'), closefd=True)
+    raise ValueError(f'Not a compressed capture: {pcap_file}')
+
+def resolve_capture(pcap_file):
+    """
+    Return the path of a capture that can be memory-mapped
+
+    Uncompressed captures are returned as they are. Compressed captures
+    are decompressed once, as a stream, into a sidecar file next to them;
+    the sidecar is reused until the compressed file is replaced. Record
+    indexes, summaries and packet lookups then work on the sidecar
+    exactly as on an uncompressed upload.
+
+    Args:
+        pcap_file (str): Path to the capture
+
+    Returns:
+        str: Path of the uncompressed capture
+    """
+    if not compression_of(pcap_file):
+        return pcap_file
+
+    path = pcap_file + DECOMPRESSED_SUFFIX
+    with _decompress_locks_lock:
+        lock = _decompress_locks.setdefault(os.path.abspath(pcap_file), threading.Lock())
+
+    with lock:
+        if _is_current(path, pcap_file):
+            return path
+
+        tmp_path = path + '.tmp'
+        try:
+            with open_decompressed(pcap_file) as source, open(tmp_path, 'wb') as target:
+                shutil.copyfileobj(source, target, DECOMPRESS_CHUNK_SIZE)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+    return path
+
+def _is_current(path, pcap_file):
+    """Whether a decompressed sidecar is newer than its compressed capture"""
+    try:
+        return os.stat(path).st_mtime_ns >= os.stat(pcap_file).st_mtime_ns
+    except OSError:
+        return False
@@ -0,0 +1,247 @@
+import os
+import time
+import itertools
+import threading
+from collections import OrderedDict
+
+# Largest number of answers and referrals kept together; the least
+# recently used entry of either kind is evicted first
+DNS_CACHE_SIZE = int(os.getenv('DNS_CACHE_SIZE', 10000))
+
+# Upper bound on how long any answer is kept, in seconds
+DNS_CACHE_MAX_TTL = int(os.getenv('DNS_CACHE_MAX_TTL', 86400))
+
+# Upper bound for NXDOMAIN and NODATA answers (RFC 2308 suggests 3 hours)
+DNS_CACHE_MAX_NEGATIVE_TTL = int(os.getenv('DNS_CACHE_MAX_NEGATIVE_TTL', 10800))
+
+NEGATIVE_STATUSES = {'NXDOMAIN', 'NODATA'}
+
+# Record type under which a name's NXDOMAIN is cached, since it applies to
+# every type of the name
+NXDOMAIN_KEY = '*'
+
+# Answers keyed by (qname, rdtype, rdclass), most recently used last
+_answers = OrderedDict()
+_answers_lock = threading.Lock()
+_stats = {'hits': 0, 'misses': 0, 'inserts': 0, 'evictions': 0, 'expirations': 0,
+          'negative_hits': 0, 'negative_inserts': 0}
+
+# Referrals keyed by the zone they delegate, most recently used last
+_delegations = OrderedDict()
+_delegation_stats = {'hits': 0, 'misses': 0, 'inserts': 0, 'evictions': 0, 'expirations': 0}
+
+# Stamps entries with their last use, so answers and referrals can be
+# evicted in one least-recently-used order
+_ticks = itertools.count()
+
+def cache_key(qname, rdtype, rdclass='IN'):
+    """Normalise a question into a cache key"""
+    qname = str(qname).lower()
+    if not qname.endswith('.'):
+        qname += '.'
+    return qname, str(rdtype).upper(), str(rdclass).upper()
+
+def get_cached_answer(qname, rdtype, rdclass='IN'):
+    """
+    Look up a cached answer, positive or negative
+
+    A cached NXDOMAIN for the name answers questions of any type.
+
+    Args:
+        qname (str): Domain name
+        rdtype (str): Record type, e.g. 'A'
+        rdclass (str, optional): Record class
+
+    Returns:
+        dict: The cached lookup with its rrset TTLs counted down by the time
+              it was cached for and the seconds left in 'ttl', or None if
+              the answer is missing or expired
+    """
+    keys = [cache_key(qname, rdtype, rdclass), cache_key(qname, NXDOMAIN_KEY, rdclass)]
+    now = time.monotonic()
+
+    with _answers_lock:
+        for key in keys:
+            entry = _answers.get(key)
+            if entry is not None and entry['expires'] <= now:
+                del _answers[key]
+                _stats['expirations'] += 1
+                entry = None
+            if entry is not None:
+                break
+        if entry is None:
+            _stats['misses'] += 1
+            return None
+        _answers.move_to_end(key)
+        entry['used'] = next(_ticks)
+        _stats['hits'] += 1
+        if entry['lookup']['status'] in NEGATIVE_STATUSES:
+            _stats['negative_hits'] += 1
+
+    age = int(now - entry['stored'])
+    lookup = dict(entry['lookup'])
+    lookup['records'] = [_with_ttl(rrset, max(rrset.ttl - age, 0)) for rrset in lookup['records']]
+    lookup['cnames'] = [_with_ttl(rrset, max(rrset.ttl - age, 0)) for rrset in lookup['cnames']]
+    if lookup['soa'] is not None:
+        lookup['soa'] = _with_ttl(lookup['soa'], max(int(entry['expires'] - now), 0))
+    lookup['ttl'] = max(int(entry['expires'] - now), 0)
+    return lookup
+
+def cache_answer(qname, rdtype, lookup, rdclass='IN'):
+    """
+    Cache a lookup for as long as its TTLs allow
+
+    Positive answers are kept for their shortest record TTL. NXDOMAIN and
+    NODATA answers are kept as RFC 2308 describes: for the smaller of the
+    SOA record's TTL and its minimum field, and only when the authority
+    section carried the SOA.
+
+    Args:
+        qname (str): Domain name the lookup was for
+        rdtype (str): Record type
+        lookup (dict): Result of utils.dns_engine.resolve_iteratively
+        rdclass (str, optional): Record class
+
+    Returns:
+        bool: Whether the answer was cached
+    """
+    if DNS_CACHE_SIZE <= 0:
+        return False
+
+    negative = lookup['status'] in NEGATIVE_STATUSES
+    if negative:
+        soa = lookup.get('soa')
+        if soa is None:
+            return False
+        ttls = [soa.ttl, soa[0].minimum, DNS_CACHE_MAX_NEGATIVE_TTL]
+        # An NXDOMAIN reached without following CNAMEs holds for every type
+        if lookup['status'] == 'NXDOMAIN' and not lookup['cnames']:
+            rdtype = NXDOMAIN_KEY
+    else:
+        rrsets = lookup['records'] + lookup['cnames']
+        if not rrsets:
+            return False
+        ttls = [rrset.ttl for rrset in rrsets] + [DNS_CACHE_MAX_TTL]
+    ttl = min(ttls)
+    if ttl <= 0:
+        return False
+
+    entry = {
+        'lookup': {
+            'status': lookup['status'],
+            'records': lookup['records'],
+            'cnames': lookup['cnames'],
+            'soa': lookup.get('soa')
+        },
+        'stored': time.monotonic()
+    }
+    entry['expires'] = entry['stored'] + ttl
+    key = cache_key(qname, rdtype, rdclass)
+
+    with _answers_lock:
+        entry['used'] = next(_ticks)
+        _answers[key] = entry
+        _answers.move_to_end(key)
+        _stats['inserts'] += 1
+        if negative:
+            _stats['negative_inserts'] += 1
+        _evict()
+    return True
+
+def get_cached_delegation(qname):
+    """
+    Find the deepest cached zone cut above a name
+
+    Args:
+        qname (str): Domain name about to be resolved
+
+    Returns:
+        tuple: (zone, servers, seconds of TTL left) of the closest enclosing
+               zone with cached nameservers, or None if only the root is known
+    """
+    zone = cache_key(qname, 'NS')[0]
+    now = time.monotonic()
+
+    with _answers_lock:
+        while zone != '.':
+            entry = _delegations.get(zone)
+            if entry is not None and entry['expires'] <= now:
+                del _delegations[zone]
+                _delegation_stats['expirations'] += 1
+                entry = None
+            if entry is not None:
+                _delegations.move_to_end(zone)
+                entry['used'] = next(_ticks)
+                _delegation_stats['hits'] += 1
+                return zone, [dict(server) for server in entry['servers']], max(int(entry['expires'] - now), 0)
+            zone = zone.split('.', 1)[1] or '.'
+        _delegation_stats['misses'] += 1
+    return None
+
+def cache_delegation(zone, servers, ttl):
+    """
+    Remember the nameservers a referral pointed to
+
+    Args:
+        zone (str): Zone the referral delegated
+        servers (list): Server dicts with 'name' and 'ip'
+        ttl (int): Seconds the referral may be used for
+
+    Returns:
+        bool: Whether the referral was cached
+    """
+    ttl = min(ttl, DNS_CACHE_MAX_TTL)
+    if ttl <= 0 or DNS_CACHE_SIZE <= 0 or not any(server['ip'] != 'Unknown' for server in servers):
+        return False
+    zone = cache_key(zone, 'NS')[0]
+
+    with _answers_lock:
+        _delegations[zone] = {'servers': [dict(server) for server in servers], 'expires': time.monotonic() + ttl,
+                              'used': next(_ticks)}
+        _delegations.move_to_end(zone)
+        _delegation_stats['inserts'] += 1
+        _evict()
+    return True
+
+def drop_delegation(zone):
+    """Forget a cached referral whose servers stopped answering"""
+    with _answers_lock:
+        _delegations.pop(cache_key(zone, 'NS')[0], None)
+
+def cache_stats():
+    """Return the cache sizes, capacity and hit/miss counters"""
+    with _answers_lock:
+        stats = dict(_stats, size=len(_answers), capacity=DNS_CACHE_SIZE)
+        delegations = dict(_delegation_stats, size=len(_delegations))
+    for counters in (stats, delegations):
+        lookups = counters['hits'] + counters['misses']
+        counters['hit_rate'] = round(counters['hits'] / lookups, 4) if lookups else 0.0
+    stats['delegations'] = delegations
+    return stats
+
+def clear_cache():
+    """Drop every cached answer and referral and reset the counters"""
+    with _answers_lock:
+        _answers.clear()
+        _delegations.clear()
+        for counters in (_stats, _delegation_stats):
+            for name in counters:
+                counters[name] = 0
+
+def _evict():
+    """Evict least recently used entries beyond DNS_CACHE_SIZE; call with _answers_lock held"""
+    while len(_answers) + len(_delegations) > DNS_CACHE_SIZE:
+        answer = next(iter(_answers.values()), None)
+        delegation = next(iter(_delegations.values()), None)
+        if delegation is None or (answer is not None and answer['used'] < delegation['used']):
+            _answers.popitem(last=False)
+            _stats['evictions'] += 1
+        else:
+            _delegations.popitem(last=False)
+            _delegation_stats['evictions'] += 1
+
+def _with_ttl(rrset, ttl):
+    """Return a copy of an rrset with its TTL replaced"""
+    rrset = rrset.copy()
+    rrset.ttl = ttl
+    return rrset
@@ -0,0 +1,446 @@
+import os
+import time
+import random
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+import dns.exception
+import dns.flags
+import dns.message
+import dns.name
+import dns.query
+import dns.rcode
+import dns.rdataclass
+import dns.rdatatype
+
+from .dns_cache import get_cached_answer, cache_answer, get_cached_delegation, cache_delegation, drop_delegation
+
+# Port and per-server timeout (seconds) of every query the engine sends
+DNS_PORT = int(os.getenv('DNS_PORT', 53))
+DNS_QUERY_TIMEOUT = float(os.getenv('DNS_QUERY_TIMEOUT', 2.0))
+
+# Total time one resolution may take, in seconds
+DNS_LIFETIME = float(os.getenv('DNS_LIFETIME', 10.0))
+
+# Comma-separated root server addresses replacing the built-in root hints,
+# e.g. '127.0.0.1' to walk a local test server
+DNS_ROOT_HINTS = os.getenv('DNS_ROOT_HINTS', '')
+
+# Longest referral and CNAME chains followed before giving up
+MAX_REFERRALS = 16
+MAX_CNAME_CHAIN = 8
+
+# How deep lookups of nameserver addresses missing from a referral may nest
+MAX_GLUE_DEPTH = 3
+
+# Servers of one zone tried before the zone is given up on
+SERVERS_PER_ZONE = 3
+
+# Response codes of servers that cannot answer for a zone; the next server
+# is tried, as after a timeout
+LAME_RCODES = {dns.rcode.SERVFAIL, dns.rcode.REFUSED}
+
+# Shortest wait, in seconds, before the next-best server of a zone is also
+# queried; servers known to be slower get up to twice their smoothed RTT
+DNS_HEDGE_DELAY = float(os.getenv('DNS_HEDGE_DELAY', 0.15))
+
+# Smoothed RTT bookkeeping, as in BIND: each new sample has weight 3/10,
+# servers passed over decay by 2% so they are retried eventually, and
+# servers never queried start at a random few microseconds so they are
+# tried first
+SRTT_SAMPLE_WEIGHT = 0.3
+SRTT_DECAY = 0.98
+MAX_TRACKED_SERVERS = 4096
+
+# Smoothed round-trip time in seconds per nameserver address
+_srtt = OrderedDict()
+_srtt_lock = threading.Lock()
+
+# Threads sending queries, so a slow server can be raced by the next one
+_query_pool = ThreadPoolExecutor(max_workers=int(os.getenv('DNS_QUERY_WORKERS', 8)), thread_name_prefix='dns-query')
+
+def resolve_iteratively(qname, rdtype='A', root_servers=None, port=None, timeout=None, lifetime=None,
+                        use_cache=True):
+    """
+    Resolve a name by walking the delegation chain from the root servers
+
+    Queries are sent without recursion desired, so each server either
+    answers or refers the walk to the servers of a child zone, exactly as
+    a recursive resolver does. Every query is recorded as a hop with the
+    server that answered and its measured round-trip time. CNAMEs are
+    followed, and nameservers whose addresses were not in a referral are
+    looked up with a separate walk. Answers still in the shared answer
+    cache, including NXDOMAIN and NODATA answers, are returned without
+    contacting any server, and walks start at
+    the deepest zone whose referral is still cached instead of the root.
+
+    Args:
+        qname (str): Domain name to resolve
+        rdtype (str, optional): Record type, e.g. 'A' or 'MX'
+        root_servers (list, optional): Root hints as dicts with 'name' and
+            'ip'; DNS_ROOT_HINTS takes precedence when set
+        port (int, optional): Port the servers listen on
+        timeout (float, optional): Seconds to wait for each server
+        lifetime (float, optional): Seconds the whole resolution may take
+        use_cache (bool, optional): Consult and fill the answer and
+            referral caches
+
+    Returns:
+        dict: 'status' (NOERROR, NXDOMAIN, NODATA, SERVFAIL or TIMEOUT),
+              answer 'records' and 'cnames' as rrsets, the 'soa' rrset of
+              negative answers, the 'hops' of the walk, 'elapsed' seconds,
+              an 'error' message, and whether the answer was 'cached' with
+              its remaining 'ttl'
+    """
+    qname = dns.name.from_text(qname) if isinstance(qname, str) else qname
+    rdtype = dns.rdatatype.from_text(rdtype) if isinstance(rdtype, str) else rdtype
+    started = time.perf_counter()
+    context = {
+        'roots': root_hints(root_servers),
+        'port': port or DNS_PORT,
+        'timeout': timeout or DNS_QUERY_TIMEOUT,
+        'deadline': started + (lifetime or DNS_LIFETIME),
+        'use_cache': use_cache
+    }
+    result = {
+        'qname': qname.to_text(),
+        'rdtype': dns.rdatatype.to_text(rdtype),
+        'status': 'SERVFAIL',
+        'records': [],
+        'cnames': [],
+        'soa': None,
+        'hops': [],
+        'elapsed': 0.0,
+        'error': None,
+        'cached': False,
+        'ttl': None
+    }
+
+    if use_cache:
+        cached = get_cached_answer(result['qname'], result['rdtype'])
+        if cached is not None:
+            result.update(cached, cached=True, elapsed=time.perf_counter() - started)
+            return result
+
+    name = qname
+    try:
+        for _ in range(MAX_CNAME_CHAIN + 1):
+            status, response = _walk(name, rdtype, context, result['hops'], 0)
+            if status != 'NOERROR':
+                result['status'] = status
+                result['soa'] = _negative_soa(response)
+                break
+
+            chased = len(result['cnames'])
+            answer, name = _chase_answer(response, name, rdtype, result['cnames'])
+            if answer is not None:
+                result['status'] = 'NOERROR'
+                result['records'].append(answer)
+                break
+            if len(result['cnames']) == chased:
+                result['status'] = 'NODATA'
+                break
+        else:
+            result['error'] = 'CNAME chain is too long'
+    except dns.exception.Timeout:
+        result['status'] = 'TIMEOUT'
+        result['error'] = 'No server answered in time'
+    except (dns.exception.DNSException, OSError) as e:
+        result['error'] = str(e)
+
+    result['elapsed'] = time.perf_counter() - started
+    if use_cache and result['status'] in ('NOERROR', 'NXDOMAIN', 'NODATA'):
+        cache_answer(result['qname'], result['rdtype'], result)
+    return result
+
+def root_hints(root_servers=None):
+    """Return the root servers to start from, honouring DNS_ROOT_HINTS"""
+    if DNS_ROOT_HINTS:
+        return [{'name': ip.strip(), 'ip': ip.strip()} for ip in DNS_ROOT_HINTS.split(',') if ip.strip()]
+    return list(root_servers or [])
+
+def zone_level(zone):
+    """Classify a zone name as 'Root', 'TLD' or 'Authoritative'"""
+    labels = [label for label in zone.rstrip('.').split('.') if label]
+    if not labels:
+        return 'Root'
+    return 'TLD' if len(labels) == 1 else 'Authoritative'
+
+def _walk(name, rdtype, context, hops, depth):
+    """
+    Follow referrals from the deepest known zone until a server answers for name
+
+    Returns:
+        tuple: Status and the final response
+    """
+    zone, servers, cached_ttl = dns.name.root, context['roots'], None
+    if context['use_cache']:
+        delegation = get_cached_delegation(name.to_text())
+        if delegation is not None:
+            zone, servers, cached_ttl = dns.name.from_text(delegation[0]), delegation[1], delegation[2]
+
+    for _ in range(MAX_REFERRALS):
+        try:
+            response, server, rtt, queried = _query_zone(name, rdtype, servers, context)
+        except (dns.exception.DNSException, OSError):
+            if cached_ttl is None:
+                raise
+            # The cached servers stopped answering; start over from the root
+            drop_delegation(zone.to_text())
+            zone, servers, cached_ttl = dns.name.root, context['roots'], None
+            continue
+
+        hop = {
+            'zone': zone.to_text(),
+            'qname': name.to_text(),
+            'servers': servers,
+            'server': server,
+            'rtt': rtt,
+            'queried': queried,
+            'cached_referral': cached_ttl
+        }
+        hops.append(hop)
+        cached_ttl = None
+
+        rcode = response.rcode()
+        if rcode == dns.rcode.NXDOMAIN:
+            hop['kind'] = 'nxdomain'
+            return 'NXDOMAIN', response
+        if rcode != dns.rcode.NOERROR:
+            hop['kind'] = 'error'
+            return 'SERVFAIL', response
+        if response.answer:
+            hop['kind'] = 'answer'
+            return 'NOERROR', response
+
+        referral = _referral(response, name, zone)
+        if referral is None:
+            hop['kind'] = 'nodata'
+            return 'NODATA', response
+
+        next_servers, ttl = _referral_servers(referral, response, context, depth)
+        if context['use_cache']:
+            cache_delegation(referral.name.to_text(), next_servers, ttl)
+        hop['kind'] = 'referral'
+        hop['referral'] = {'zone': referral.name.to_text(), 'servers': next_servers}
+        zone, servers = referral.name, next_servers
+
+    raise dns.exception.DNSException(f'Too many referrals resolving {name}')
+
+def _query_zone(name, rdtype, servers, context):
+    """
+    Ask the servers of one zone until one responds
+
+    Servers are tried fastest first by smoothed RTT. If the chosen server
+    has not answered within the hedge delay, the next-best server is
+    queried as well and the first response wins; a server that fails
+    outright or answers SERVFAIL or REFUSED is replaced at once. Only when
+    every server does so is the last such response returned.
+
+    Returns:
+        tuple: Response, the server that sent it, its round-trip time and
+               the servers queried, in order
+    """
+    candidates = rank_servers([s for s in servers if s.get('ip', 'Unknown') != 'Unknown'])[:SERVERS_PER_ZONE]
+    if not candidates:
+        names = ', '.join(server['name'] for server in servers) or 'none'
+        raise dns.exception.DNSException(f'No address available for any nameserver ({names})')
+    pending = {}
+    queried = []
+    error = None
+    lame = None
+    hedge_at = None
+
+    while True:
+        now = time.perf_counter()
+        remaining = context['deadline'] - now
+        if remaining <= 0:
+            break
+
+        # Query the next server when nothing is in flight or the hedge delay ran out
+        if len(queried) < len(candidates) and (not pending or now >= hedge_at):
+            server = candidates[len(queried)]
+            queried.append(server)
+            future = _query_pool.submit(_send, name, rdtype, server['ip'], context['port'],
+                                        min(context['timeout'], remaining))
+            pending[future] = (server, now)
+            hedge_at = now + hedge_delay(server['ip'])
+
+        if not pending:
+            break
+        wait_for = remaining if len(queried) == len(candidates) else min(hedge_at - now, remaining)
+        done, _ = wait(pending, timeout=max(wait_for, 0), return_when=FIRST_COMPLETED)
+
+        for future in done:
+            server, _ = pending.pop(future)
+            try:
+                response, rtt = future.result()
+            except (dns.exception.DNSException, OSError) as e:
+                error = e
+                continue
+            if response.rcode() in LAME_RCODES:
+                lame = (response, server, rtt)
+                continue
+            # Servers that lost the race have taken at least this long so far;
+            # their real RTT is recorded if their answer still arrives
+            finished = time.perf_counter()
+            for slower, sent in pending.values():
+                record_elapsed(slower['ip'], finished - sent)
+            _cancel(pending)
+            return response, server, rtt, queried
+
+    _cancel(pending)
+    if lame is not None:
+        return lame + (queried,)
+    if error is None or isinstance(error, dns.exception.Timeout):
+        raise dns.exception.Timeout()
+    raise error
+
+def _cancel(pending):
+    """Cancel queries still queued so they do not hold up other lookups' workers"""
+    for future in pending:
+        future.cancel()
+
+def _send(name, rdtype, ip, port, timeout):
+    """Send one query over UDP, retrying over TCP if the answer was truncated"""
+    query = dns.message.make_query(name, rdtype)
+    query.flags &= ~dns.flags.RD
+    started = time.perf_counter()
+    try:
+        response = dns.query.udp(query, ip, timeout=timeout, port=port)
+        if response.flags & dns.flags.TC:
+            response = dns.query.tcp(query, ip, timeout=timeout, port=port)
+    except (dns.exception.Timeout, OSError):
+        record_timeout(ip, timeout)
+        raise
+    rtt = time.perf_counter() - started
+    record_rtt(ip, rtt)
+    return response, rtt
+
+def rank_servers(servers):
+    """
+    Order servers by smoothed RTT, fastest first
+
+    Every server passed over has its estimate decayed slightly, so a server
+    that was slow once is tried again after a while.
+    """
+    with _srtt_lock:
+        for server in servers:
+            if server['ip'] not in _srtt:
+                _srtt[server['ip']] = random.uniform(0.000001, 0.000032)
+        ranked = sorted(servers, key=lambda server: _srtt[server['ip']])
+        for server in ranked[1:]:
+            _srtt[server['ip']] *= SRTT_DECAY
+        _trim_srtt()
+    return ranked
+
+def record_rtt(ip, rtt):
+    """Fold a measured round-trip time into a server's smoothed RTT"""
+    with _srtt_lock:
+        srtt = _srtt.get(ip)
+        _srtt[ip] = rtt if srtt is None else srtt * (1 - SRTT_SAMPLE_WEIGHT) + rtt * SRTT_SAMPLE_WEIGHT
+        _srtt.move_to_end(ip)
+        _trim_srtt()
+
+def record_elapsed(ip, elapsed):
+    """Raise a server's smoothed RTT to the time spent waiting on it, never lowering it"""
+    with _srtt_lock:
+        _srtt[ip] = max(_srtt.get(ip, 0.0), elapsed)
+        _srtt.move_to_end(ip)
+        _trim_srtt()
+
+def record_timeout(ip, timeout):
+    """Penalise a server that did not answer by at least doubling its smoothed RTT"""
+    with _srtt_lock:
+        _srtt[ip] = max(_srtt.get(ip, 0.0) * 2, timeout)
+        _srtt.move_to_end(ip)
+        _trim_srtt()
+
+def hedge_delay(ip):
+    """Seconds to wait for a server before also querying the next-best one"""
+    with _srtt_lock:
+        srtt = _srtt.get(ip, 0.0)
+    return max(DNS_HEDGE_DELAY, 2 * srtt)
+
+def nameserver_stats():
+    """Return the smoothed RTT of every tracked nameserver in milliseconds"""
+    with _srtt_lock:
+        return {ip: round(srtt * 1000, 3) for ip, srtt in _srtt.items()}
+
+def _trim_srtt():
+    """Forget the least recently measured servers beyond MAX_TRACKED_SERVERS"""
+    while len(_srtt) > MAX_TRACKED_SERVERS:
+        _srtt.popitem(last=False)
+
+def _referral(response, name, zone):
+    """Return the NS rrset delegating name to a child of zone, or None"""
+    for rrset in response.authority:
+        if rrset.rdtype == dns.rdatatype.NS and rrset.name != zone and \
+                name.is_subdomain(rrset.name) and rrset.name.is_subdomain(zone):
+            return rrset
+    return None
+
+def _referral_servers(ns_rrset, response, context, depth):
+    """
+    Turn a referral into server dicts, looking up addresses missing from its glue
+
+    Returns:
+        tuple: Server dicts and the TTL the referral may be cached for
+    """
+    glue = {}
+    for rrset in response.additional:
+        if rrset.rdtype == dns.rdatatype.A:
+            glue.setdefault(rrset.name, rrset)
+
+    servers = [{
+        'name': ns.target.to_text(omit_final_dot=True),
+        'ip': glue[ns.target][0].address if ns.target in glue else 'Unknown',
+        'location': 'Unknown'
+    } for ns in ns_rrset]
+    ttl = min([ns_rrset.ttl] + [glue[ns.target].ttl for ns in ns_rrset if ns.target in glue])
+
+    if depth < MAX_GLUE_DEPTH and all(server['ip'] == 'Unknown' for server in servers):
+        # Glue-less delegation: resolve a nameserver's address first
+        for server in servers:
+            try:
+                status, reply = _walk(dns.name.from_text(server['name']), dns.rdatatype.A, context, [], depth + 1)
+            except (dns.exception.DNSException, OSError):
+                continue
+            addresses = [rrset for rrset in reply.answer if rrset.rdtype == dns.rdatatype.A]
+            if status == 'NOERROR' and addresses:
+                server['ip'] = addresses[0][0].address
+                ttl = min(ttl, addresses[0].ttl)
+                break
+
+    # Servers with an address are tried first
+    servers.sort(key=lambda server: server['ip'] == 'Unknown')
+    return servers, ttl
+
+def _chase_answer(response, name, rdtype, cnames):
+    """
+    Follow the CNAMEs for name within one answer
+
+    Returns:
+        tuple: The rrset of the requested type, or None, and the name the
+               chain ended at
+    """
+    for _ in range(MAX_CNAME_CHAIN):
+        answer = response.get_rrset(response.answer, name, dns.rdataclass.IN, rdtype)
+        if answer is not None:
+            return answer, name
+        cname = response.get_rrset(response.answer, name, dns.rdataclass.IN, dns.rdatatype.CNAME)
+        if cname is None or rdtype == dns.rdatatype.CNAME:
+            break
+        cnames.append(cname)
+        name = cname[0].target
+    return None, name
+
+def _negative_soa(response):
+    """Return the SOA rrset from the authority section of a negative answer"""
+    if response is None:
+        return None
+    for rrset in response.authority:
+        if rrset.rdtype == dns.rdatatype.SOA:
+            return rrset
+    return None
@@ -1,7 +1,32 @@
 import dns.resolver
+import dns.exception
+import dns.name
+import dns.rdatatype
 import subprocess
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 
+from .dns_engine import resolve_iteratively, zone_level
+from .dns_cache import get_cached_answer, cache_answer, cache_stats
+
+# Step titles for each level of the delegation chain
+RECURSIVE_STEP_NAMES = {
+    'Root': 'Root DNS Servers',
+    'TLD': 'TLD DNS Servers',
+    'Authoritative': 'Authoritative Name Servers'
+}
+ITERATIVE_STEP_NAMES = {
+    'Root': 'Root DNS Server Query',
+    'TLD': 'TLD DNS Server Query',
+    'Authoritative': 'Authoritative Server Query'
+}
+
+# Cache fills for nslookup mode run one at a time, off the request path
+_cache_filler = ThreadPoolExecutor(max_workers=1, thread_name_prefix='dns-cache-fill')
+_pending_fills = {}
+_pending_fills_lock = threading.Lock()
+
 def get_record_types():
     """Return a list of common DNS record types"""
     return [
@@ -49,10 +74,7 @@ def resolve_domain(domain, record_type='A', query_mode='recursive'):
     return results
 
 def recursive_resolution(domain, record_type, results):
-    """Perform recursive DNS resolution with detailed path tracking using actual DNS commands"""
-    # Run the actual dig command to get the full resolution information
-    import subprocess
-
+    """Perform recursive DNS resolution, walking root, TLD and authoritative servers in-process"""
     # Step 1: Local DNS Resolver
     results['resolution_steps'].append({
         'step': 'Local DNS Resolver',
@@ -61,288 +83,54 @@ def recursive_resolution(domain, record_type, results):
         'details': 'Your computer sends a recursive query to your configured DNS resolver'
     })
 
-    # Get information about the root servers that were actually contacted
-    # We'll use the actual root servers from a real DNS query
-    cmd = ['dig', '+trace', domain, record_type]
-    try:
-        trace_result = subprocess.run(cmd, capture_output=True, text=True, timeout=15)
-        contacted_root_servers = []
-
-        # Parse the output to find which root servers were actually contacted
-        for line in trace_result.stdout.splitlines():
-            if line.strip() and '.root-servers.net.' in line and 'IN' in line:
-                parts = line.strip().split()
-                if len(parts) >= 2:
-                    # Extract the server that was contacted (usually at the beginning of the line)
-                    server_info = parts[0].strip()
-                    if '.root-servers.net' in server_info:
-                        root_server_name = server_info.rstrip('.')
-
-                        # Get the IP for this root server
-                        ip_cmd = ['dig', '+short', root_server_name, 'A']
-                        ip_result = subprocess.run(ip_cmd, capture_output=True, text=True, timeout=5)
-                        ip = ip_result.stdout.strip() if ip_result.stdout.strip() else 'Unknown'
-
-                        # Add to our list of contacted root servers
-                        root_server_info = next((s for s in get_root_servers() if s['name'] == root_server_name), None)
-                        if root_server_info and not any(s['name'] == root_server_name for s in contacted_root_servers):
-                            contacted_root_servers.append(root_server_info)
-                        elif not any(s['name'] == root_server_name for s in contacted_root_servers):
-                            contacted_root_servers.append({
-                                'name': root_server_name,
-                                'ip': ip,
-                                'operator': 'Unknown',
-                                'location': 'Unknown'
-                            })
-
-        # If we couldn't identify any contacted root servers, use a single one from our predefined list
-        if not contacted_root_servers:
-            # Try to get the first root server from the system's resolver configuration
-            cmd = ['dig', '+norecurse', '.', 'NS']
-            root_ns_result = subprocess.run(cmd, capture_output=True, text=True, timeout=10)
-
-            for line in root_ns_result.stdout.splitlines():
-                if line.strip() and not line.startswith(';') and '.root-servers.net.' in line:
-                    parts = line.strip().split()
-                    if len(parts) >= 5 and parts[3] == 'NS':
-                        root_server_name = parts[4].rstrip('.')
-                        root_server_info = next((s for s in get_root_servers() if s['name'] == root_server_name), None)
-                        if root_server_info:
-                            contacted_root_servers = [root_server_info]
-                            break
-
-            # If still empty, use the first one from our predefined list
-            if not contacted_root_servers:
-                contacted_root_servers = [get_root_servers()[0]]
-    except Exception as e:
-        # Fallback to a single root server if the command fails
-        contacted_root_servers = [get_root_servers()[0]]
-        results['errors'].append(f"Error identifying contacted root servers: {str(e)}")
-
-    # Add the root servers step with detailed information
-    results['resolution_steps'].append({
-        'step': 'Root DNS Servers',
-        'description': 'Resolver queries root DNS servers to find TLD servers',
-        'servers': contacted_root_servers,  # Only show the servers that were actually contacted
-        'animation_delay': 1000,
-        'details': f'Resolver contacts root servers to find information about the .{domain.split(".")[-1]} TLD',
-        'server_details': [
-            f"Contacted {server['name']} ({server['ip']}) operated by {server.get('operator', 'Unknown')} in {server.get('location', 'Unknown')}"
-            for server in contacted_root_servers
-        ]
-    })
-
-    # Step 3: TLD servers query - get actual TLD servers for the domain
-    tld = domain.split('.')[-1]
-    cmd = ['dig', '+norecurse', f'.{tld}.', 'NS']
-    try:
-        tld_ns_result = subprocess.run(cmd, capture_output=True, text=True, timeout=10)
-        tld_servers = []
-
-        # Parse the output to get the TLD servers
-        for line in tld_ns_result.stdout.splitlines():
-            if line.strip() and not line.startswith(';') and 'IN' in line and 'NS' in line:
-                parts = line.strip().split()
-                if len(parts) >= 5 and parts[3] == 'NS':
-                    tld_server_name = parts[4].rstrip('.')
-                    # Get the IP for this TLD server
-                    ip_cmd = ['dig', '+short', tld_server_name, 'A']
-                    ip_result = subprocess.run(ip_cmd, capture_output=True, text=True, timeout=5)
-                    ip = ip_result.stdout.strip() if ip_result.stdout.strip() else 'Unknown'
-
-                    # Add to our list of TLD servers
-                    tld_servers.append({
-                        'name': tld_server_name,
-                        'ip': ip,
-                        'location': 'Unknown'  # We don't have location data for all TLD servers
-                    })
-
-        # If we couldn't get the TLD servers from the command, use our predefined list
-        if not tld_servers:
-            tld_servers = get_tld_servers(tld)
-    except Exception as e:
-        # Fallback to our predefined list if the command fails
-        tld_servers = get_tld_servers(tld)
-        results['errors'].append(f"Error getting TLD servers: {str(e)}")
-
-    # Use the first TLD server for display purposes
-    selected_tld_server = tld_servers[0] if tld_servers else {'name': f'Unknown .{tld} server', 'ip': 'Unknown', 'location': 'Unknown'}
+    lookup = resolve_iteratively(domain, record_type, get_root_servers())
 
-    results['resolution_steps'].append({
-        'step': 'TLD DNS Servers',
-        'description': f'Resolver queries .{tld} TLD servers to find authoritative name servers',
-        'animation_delay': 2000,
-        'servers': tld_servers,
-        'selected_server': selected_tld_server,
-        'details': f'Resolver contacts .{tld} TLD server to find authoritative name servers for {domain}',
-        'server_details': [
-            f"Contacted {selected_tld_server['name']} ({selected_tld_server['ip']}) in {selected_tld_server.get('location', 'Unknown')}"
-        ]
-    })
+    # One step per server the resolver contacted
+    for hop in lookup['hops']:
+        level = zone_level(hop['zone'])
+        results['resolution_steps'].append({
+            'step': RECURSIVE_STEP_NAMES[level],
+            'description': f'Resolver queries {server_role(hop["zone"])} about {hop["qname"].rstrip(".")}',
+            'animation_delay': 1000 * len(results['resolution_steps']),
+            'servers': hop['servers'],
+            'selected_server': hop['server'],
+            'details': hop_outcome(hop),
+            'server_details': server_details(hop),
+            'query_time': format_rtt(hop['rtt'])
+        })
 
-    # Step 4: Get authoritative name servers for the domain using actual dig command
-    cmd = ['dig', '+norecurse', domain, 'NS']
-    try:
-        auth_ns_result = subprocess.run(cmd, capture_output=True, text=True, timeout=10)
-        auth_servers = []
-
-        # Parse the output to get the authoritative name servers
-        for line in auth_ns_result.stdout.splitlines():
-            if line.strip() and not line.startswith(';') and 'IN' in line and 'NS' in line:
-                parts = line.strip().split()
-                if len(parts) >= 5 and parts[3] == 'NS':
-                    auth_server_name = parts[4].rstrip('.')
-                    # Get the IP for this authoritative server
-                    ip_cmd = ['dig', '+short', auth_server_name, 'A']
-                    ip_result = subprocess.run(ip_cmd, capture_output=True, text=True, timeout=5)
-                    ip = ip_result.stdout.strip() if ip_result.stdout.strip() else 'Unknown'
-
-                    # Add to our list of authoritative servers
-                    auth_servers.append({
-                        'name': auth_server_name,
-                        'ip': ip,
-                        'location': 'Unknown'
-                    })
-
-        # If we couldn't get the authoritative servers from the command, try using dnspython
-        if not auth_servers:
-            resolver = dns.resolver.Resolver()
-            resolver.timeout = 5
-            resolver.lifetime = 10
-
-            try:
-                ns_records = resolver.resolve(domain, 'NS')
-                for ns in ns_records:
-                    # For each name server, try to get its IP address
-                    try:
-                        ns_name = str(ns)
-                        ns_ips = resolver.resolve(ns_name, 'A')
-                        for ip in ns_ips:
-                            auth_servers.append({
-                                'name': ns_name,
-                                'ip': str(ip),
-                                'location': 'Unknown'
-                            })
-                    except Exception:
-                        # If we can't resolve the IP, just use the name
-                        auth_servers.append({
-                            'name': str(ns),
-                            'ip': 'Unknown',
-                            'location': 'Unknown'
-                        })
-            except Exception as e:
-                results['errors'].append(f"Could not retrieve NS records using dnspython: {str(e)}")
-
-        # If we still don't have any authoritative servers, create a fallback
-        if not auth_servers:
-            auth_servers = [{
-                'name': f'ns.{domain}',
-                'ip': 'Unknown',
-                'location': 'Unknown'
-            }]
-    except Exception as e:
-        # If the command fails, create a fallback
-        auth_servers = [{
-            'name': f'ns.{domain}',
-            'ip': 'Unknown',
-            'location': 'Unknown'
-        }]
-        results['errors'].append(f"Error getting authoritative servers: {str(e)}")
-
-    # Use the first authoritative server for display purposes
-    selected_auth_server = auth_servers[0] if auth_servers else {'name': f'ns.{domain}', 'ip': 'Unknown', 'location': 'Unknown'}
-
-    # Step 4: Authoritative name servers query
-    results['resolution_steps'].append({
-        'step': 'Authoritative Name Servers',
-        'description': f'Resolver queries authoritative name servers for {domain}',
-        'animation_delay': 3000,
-        'servers': auth_servers,
-        'selected_server': selected_auth_server,
-        'details': f'Resolver contacts authoritative name server to get {record_type} records for {domain}',
-        'server_details': [
-            f"Contacted {selected_auth_server['name']} ({selected_auth_server['ip']}) in {selected_auth_server.get('location', 'Unknown')}"
-        ]
-    })
+    answers = answer_records(lookup)
+    results['final_records'].extend(answers)
 
-    # Step 5: Get the final answer using the actual dig command
-    cmd = ['dig', domain, record_type]
-    try:
-        final_result = subprocess.run(cmd, capture_output=True, text=True, timeout=10)
-        answers = []
-        ttl = 300  # Default TTL if we can't parse it
-
-        # Parse the output to get the final records
-        for line in final_result.stdout.splitlines():
-            if line.strip() and not line.startswith(';') and domain in line and record_type in line:
-                parts = line.strip().split()
-                if len(parts) >= 5 and parts[3] == record_type:
-                    value = parts[4]
-                    try:
-                        ttl = int(parts[1])
-                    except (ValueError, IndexError):
-                        pass  # Use default TTL
-
-                    answers.append({
-                        'type': record_type,
-                        'value': value,
-                        'ttl': ttl
-                    })
-
-        # If we couldn't get the answers from the command, try using dnspython
-        if not answers:
-            resolver = dns.resolver.Resolver()
-            resolver.timeout = 5
-            resolver.lifetime = 10
-
-            try:
-                dns_answers = resolver.resolve(domain, record_type)
-                for rdata in dns_answers:
-                    answers.append({
-                        'type': record_type,
-                        'value': str(rdata),
-                        'ttl': dns_answers.ttl
-                    })
-                ttl = dns_answers.ttl
-            except Exception as e:
-                results['errors'].append(f"Could not resolve {record_type} records using dnspython: {str(e)}")
-
-        # Add the final records to the results
-        results['final_records'].extend(answers)
-
-        # Get query time from the dig output
-        query_time = 'Unknown'
-        for line in final_result.stdout.splitlines():
-            if 'Query time:' in line:
-                query_time = line.split(':', 1)[1].strip()
-                break
-
-        # Step 5: Final answer
+    if lookup['cached']:
         results['resolution_steps'].append({
             'step': 'Final Answer',
-            'description': f'Resolver returns {len(answers)} records to client',
-            'query_time': query_time,
-            'animation_delay': 4000,
-            'details': f'Resolver has completed the DNS resolution process and returns the final {record_type} records to your computer'
+            'description': f'Resolver returns {lookup_result(lookup, answers)} to client from its cache',
+            'query_time': format_rtt(lookup['elapsed']),
+            'animation_delay': 1000 * len(results['resolution_steps']),
+            'details': cached_details(domain, record_type, lookup)
+        })
+    else:
+        results['resolution_steps'].append({
+            'step': 'Final Answer',
+            'description': f'Resolver returns {lookup_result(lookup, answers)} to client',
+            'query_time': format_rtt(lookup['elapsed']),
+            'animation_delay': 1000 * len(results['resolution_steps']),
+            'details': (f'Resolver has completed the DNS resolution process and returns the final {record_type} records to your computer'
+                        if lookup['status'] == 'NOERROR' else final_details(domain, record_type, lookup))
         })
-    except Exception as e:
-        results['errors'].append(f"Error getting final answer: {str(e)}")
 
     # Add a summary of the path followed
-    path_summary = [
-        f"Your computer → DNS Resolver",
-        f"DNS Resolver → Root Servers ({contacted_root_servers[0]['name']})",
-        f"DNS Resolver → TLD Server ({selected_tld_server['name']})",
-        f"DNS Resolver → Authoritative Server ({selected_auth_server['name']})",
-        f"DNS Resolver → Your Computer (Final Answer)"
-    ]
+    path_summary = ["Your computer → DNS Resolver"]
+    for hop in lookup['hops']:
+        path_summary.append(f"DNS Resolver → {zone_level(hop['zone'])} Server ({hop['server']['name']})")
+    path_summary.append(f"DNS Resolver → Your Computer (Final Answer{' from cache' if lookup['cached'] else ''})")
 
     results['path_summary'] = path_summary
+    raise_for_status(domain, lookup)
 
 def iterative_resolution(domain, record_type, results):
-    """Perform iterative DNS resolution with detailed path tracking using actual DNS commands"""
-    import subprocess
-
+    """Perform iterative DNS resolution, querying each server of the delegation chain in turn"""
     # Step 1: Client initiates query
     results['resolution_steps'].append({
         'step': 'Client',
@@ -351,300 +139,172 @@ def iterative_resolution(domain, record_type, results):
         'details': 'Your computer begins the iterative DNS resolution process'
     })
 
-    # Step 2: Query root servers - get the actual root server that was contacted
-    cmd = ['dig', '+trace', domain, record_type]
-    try:
-        trace_result = subprocess.run(cmd, capture_output=True, text=True, timeout=15)
-        contacted_root_server = None
-
-        # Parse the output to find which root server was actually contacted
-        for line in trace_result.stdout.splitlines():
-            if line.strip() and '.root-servers.net.' in line and 'IN' in line:
-                parts = line.strip().split()
-                if len(parts) >= 2:
-                    # Extract the server that was contacted (usually at the beginning of the line)
-                    server_info = parts[0].strip()
-                    if '.root-servers.net' in server_info:
-                        root_server_name = server_info.rstrip('.')
-
-                        # Get the IP for this root server
-                        ip_cmd = ['dig', '+short', root_server_name, 'A']
-                        ip_result = subprocess.run(ip_cmd, capture_output=True, text=True, timeout=5)
-                        ip = ip_result.stdout.strip() if ip_result.stdout.strip() else 'Unknown'
-
-                        # Use this as our contacted root server
-                        root_server_info = next((s for s in get_root_servers() if s['name'] == root_server_name), None)
-                        if root_server_info:
-                            contacted_root_server = root_server_info
-                            break
-                        else:
-                            contacted_root_server = {
-                                'name': root_server_name,
-                                'ip': ip,
-                                'operator': 'Unknown',
-                                'location': 'Unknown'
-                            }
-                            break
-
-        # If we couldn't identify a contacted root server, use one from our predefined list
-        if not contacted_root_server:
-            # Try to get a root server from the system's resolver configuration
-            cmd = ['dig', '+norecurse', '.', 'NS']
-            root_ns_result = subprocess.run(cmd, capture_output=True, text=True, timeout=10)
-
-            for line in root_ns_result.stdout.splitlines():
-                if line.strip() and not line.startswith(';') and '.root-servers.net.' in line:
-                    parts = line.strip().split()
-                    if len(parts) >= 5 and parts[3] == 'NS':
-                        root_server_name = parts[4].rstrip('.')
-                        root_server_info = next((s for s in get_root_servers() if s['name'] == root_server_name), None)
-                        if root_server_info:
-                            contacted_root_server = root_server_info
-                            break
-
-            # If still not found, use the first one from our predefined list
-            if not contacted_root_server:
-                contacted_root_server = get_root_servers()[0]
-    except Exception as e:
-        # Fallback to a single root server if the command fails
-        contacted_root_server = get_root_servers()[0]
-        results['errors'].append(f"Error identifying contacted root server: {str(e)}")
-
-    # Use the identified root server for display purposes
-    selected_root_server = contacted_root_server
-
-    results['resolution_steps'].append({
-        'step': 'Root DNS Server Query',
-        'description': 'Client queries a root DNS server',
-        'server': selected_root_server,
-        'servers': [selected_root_server],  # Include only the one that was contacted
-        'animation_delay': 1000,
-        'details': f'Your computer directly contacts a root server to ask about .{domain.split(".")[-1]} TLD',
-        'server_details': [
-            f"Contacted {selected_root_server['name']} ({selected_root_server['ip']}) operated by {selected_root_server.get('operator', 'Unknown')} in {selected_root_server.get('location', 'Unknown')}"
-        ]
-    })
-
-    # Step 3: Root server refers to TLD servers - get actual TLD servers
-    tld = domain.split('.')[-1]
-    cmd = ['dig', '+norecurse', f'.{tld}.', 'NS']
-    try:
-        tld_ns_result = subprocess.run(cmd, capture_output=True, text=True, timeout=10)
-        tld_servers = []
-
-        # Parse the output to get the TLD servers
-        for line in tld_ns_result.stdout.splitlines():
-            if line.strip() and not line.startswith(';') and 'IN' in line and 'NS' in line:
-                parts = line.strip().split()
-                if len(parts) >= 5 and parts[3] == 'NS':
-                    tld_server_name = parts[4].rstrip('.')
-                    # Get the IP for this TLD server
-                    ip_cmd = ['dig', '+short', tld_server_name, 'A']
-                    ip_result = subprocess.run(ip_cmd, capture_output=True, text=True, timeout=5)
-                    ip = ip_result.stdout.strip() if ip_result.stdout.strip() else 'Unknown'
-
-                    # Add to our list of TLD servers
-                    tld_servers.append({
-                        'name': tld_server_name,
-                        'ip': ip,
-                        'location': 'Unknown'  # We don't have location data for all TLD servers
-                    })
-
-        # If we couldn't get the TLD servers from the command, use our predefined list
-        if not tld_servers:
-            tld_servers = get_tld_servers(tld)
-    except Exception as e:
-        # Fallback to our predefined list if the command fails
-        tld_servers = get_tld_servers(tld)
-        results['errors'].append(f"Error getting TLD servers: {str(e)}")
-
-    results['resolution_steps'].append({
-        'step': 'TLD Server Referral',
-        'description': f'Root server refers client to .{tld} TLD servers',
-        'animation_delay': 2000,
-        'servers': tld_servers,
-        'details': f'Root server responds with a referral to .{tld} TLD servers',
-        'server_details': [
-            f"Root server {selected_root_server['name']} provided referral to {len(tld_servers)} .{tld} TLD servers"
-        ]
-    })
+    lookup = resolve_iteratively(domain, record_type, get_root_servers())
+    path_summary = []
 
-    # Step 4: Query TLD servers
-    # Use the first TLD server for display purposes
-    selected_tld_server = tld_servers[0] if tld_servers else {'name': f'Unknown .{tld} server', 'ip': 'Unknown', 'location': 'Unknown'}
-
-    results['resolution_steps'].append({
-        'step': 'TLD DNS Server Query',
-        'description': f'Client queries a .{tld} TLD server',
-        'animation_delay': 3000,
-        'server': selected_tld_server,
-        'details': f'Your computer directly contacts a .{tld} TLD server to ask about {domain}',
-        'server_details': [
-            f"Contacted {selected_tld_server['name']} ({selected_tld_server['ip']}) in {selected_tld_server.get('location', 'Unknown')}"
-        ]
-    })
+    # A query step per server contacted, and a referral step per referral
+    for hop in lookup['hops']:
+        level = zone_level(hop['zone'])
+        server = hop['server']
+        results['resolution_steps'].append({
+            'step': ITERATIVE_STEP_NAMES[level],
+            'description': f'Client queries {server_role(hop["zone"])}',
+            'animation_delay': 1000 * len(results['resolution_steps']),
+            'server': server,
+            'servers': hop['servers'],
+            'selected_server': server,
+            'details': f'Your computer directly contacts {server_role(hop["zone"])} to ask about {hop["qname"].rstrip(".")}',
+            'server_details': server_details(hop),
+            'query_time': format_rtt(hop['rtt'])
+        })
+        path_summary.append(f"Your computer → {level} Server ({server['name']})")
+
+        if hop['kind'] == 'referral':
+            referral = hop['referral']
+            results['resolution_steps'].append({
+                'step': f"{'TLD' if zone_level(referral['zone']) == 'TLD' else 'Authoritative'} Server Referral",
+                'description': f'{level} server refers client to {zone_label(referral["zone"])} servers',
+                'animation_delay': 1000 * len(results['resolution_steps']),
+                'servers': referral['servers'],
+                'details': hop_outcome(hop),
+                'server_details': [
+                    f"{level} server {server['name']} provided referral to {len(referral['servers'])} {zone_label(referral['zone'])} servers"
+                ]
+            })
+            path_summary.append(f"{level} Server → Your computer (with referral to {zone_label(referral['zone'])} servers)")
+        else:
+            path_summary.append(f"{level} Server → Your computer ({hop_outcome(hop)})")
 
-    # Step 5: Get authoritative name servers for the domain without explicitly querying NS records
-    # Instead, we'll use the domain's base name to create a likely authoritative server name
-    auth_servers = []
+    answers = answer_records(lookup)
+    results['final_records'].extend(answers)
 
-    # Extract the base domain (e.g., example.com from www.example.com)
-    domain_parts = domain.split('.')
-    if len(domain_parts) > 1:
-        base_domain = '.'.join(domain_parts[-2:])
+    if lookup['cached']:
+        results['resolution_steps'].append({
+            'step': 'Final Answer',
+            'description': f'Client returns {lookup_result(lookup, answers)} from its cache',
+            'query_time': format_rtt(lookup['elapsed']),
+            'animation_delay': 1000 * len(results['resolution_steps']),
+            'details': cached_details(domain, record_type, lookup)
+        })
+        path_summary.append("Local cache → Your computer (Final Answer)")
     else:
-        base_domain = domain
-
-    # Create likely authoritative server names
-    likely_auth_servers = [
-        f"ns1.{base_domain}",
-        f"ns2.{base_domain}",
-        f"dns1.{base_domain}",
-        f"dns2.{base_domain}"
-    ]
-
-    # Try to get IPs for these likely servers
-    for server_name in likely_auth_servers:
-        try:
-            ip_cmd = ['dig', '+short', server_name, 'A']
-            ip_result = subprocess.run(ip_cmd, capture_output=True, text=True, timeout=5)
-            ip = ip_result.stdout.strip()
-
-            if ip:
-                auth_servers.append({
-                    'name': server_name,
-                    'ip': ip,
-                    'location': 'Unknown'
-                })
-        except Exception:
-            pass
-
-    # If we couldn't find any likely authoritative servers, use a generic approach
-    if not auth_servers:
-        # Try to get the authoritative server from the SOA record
-        try:
-            soa_cmd = ['dig', '+short', domain, 'SOA']
-            soa_result = subprocess.run(soa_cmd, capture_output=True, text=True, timeout=5)
-            soa_output = soa_result.stdout.strip()
-
-            if soa_output:
-                # SOA record format: primary-ns admin-email serial refresh retry expire minimum
-                soa_parts = soa_output.split()
-                if len(soa_parts) > 0:
-                    primary_ns = soa_parts[0].rstrip('.')
-
-                    # Get IP for the primary nameserver
-                    ip_cmd = ['dig', '+short', primary_ns, 'A']
-                    ip_result = subprocess.run(ip_cmd, capture_output=True, text=True, timeout=5)
-                    ip = ip_result.stdout.strip() if ip_result.stdout.strip() else 'Unknown'
-
-                    auth_servers.append({
-                        'name': primary_ns,
-                        'ip': ip,
-                        'location': 'Unknown'
-                    })
-        except Exception:
-            pass
-
-    # If we still don't have any authoritative servers, create a fallback
-    if not auth_servers:
-        auth_servers = [{
-            'name': f'ns.{domain}',
-            'ip': 'Unknown',
-            'location': 'Unknown'
-        }]
-
-    # Use the first authoritative server for display purposes
-    selected_auth_server = auth_servers[0] if auth_servers else {'name': f'ns.{domain}', 'ip': 'Unknown', 'location': 'Unknown'}
-
-    # Step 5: TLD server refers to authoritative servers
-    results['resolution_steps'].append({
-        'step': 'Authoritative Server Referral',
-        'description': f'TLD server refers client to authoritative name servers for {domain}',
-        'animation_delay': 4000,
-        'servers': auth_servers,
-        'details': f'TLD server responds with a referral to authoritative name servers for {domain}',
-        'server_details': [
-            f"TLD server {selected_tld_server['name']} provided referral to {len(auth_servers)} authoritative servers"
-        ]
-    })
-
-    # Step 6: Query authoritative servers
-    results['resolution_steps'].append({
-        'step': 'Authoritative Server Query',
-        'description': f'Client queries authoritative name server for {domain}',
-        'animation_delay': 5000,
-        'server': selected_auth_server,
-        'details': f'Your computer directly contacts an authoritative name server to get {record_type} records for {domain}',
-        'server_details': [
-            f"Contacted {selected_auth_server['name']} ({selected_auth_server['ip']}) in {selected_auth_server.get('location', 'Unknown')}"
-        ]
-    })
-
-    # Step 7: Get the final answer using the actual dig command
-    cmd = ['dig', '@' + selected_auth_server['ip'] if selected_auth_server['ip'] != 'Unknown' else '', domain, record_type]
-    try:
-        final_result = subprocess.run(cmd, capture_output=True, text=True, timeout=10)
-        answers = []
-        # No TTL needed
-
-        # Parse the output to get the final records
-        for line in final_result.stdout.splitlines():
-            if line.strip() and not line.startswith(';') and domain in line and record_type in line:
-                parts = line.strip().split()
-                if len(parts) >= 5 and parts[3] == record_type:
-                    value = parts[4]
-                    # No TTL needed
-
-                    answers.append({
-                        'type': record_type,
-                        'value': value
-                    })
-
-        # If we couldn't get the answers from the command, try using dnspython
-        if not answers:
-            resolver = dns.resolver.Resolver()
-            resolver.timeout = 5
-            resolver.lifetime = 10
-
-            try:
-                dns_answers = resolver.resolve(domain, record_type)
-                for rdata in dns_answers:
-                    answers.append({
-                        'type': record_type,
-                        'value': str(rdata)
-                    })
-                # No TTL needed
-            except Exception as e:
-                results['errors'].append(f"Could not resolve {record_type} records using dnspython: {str(e)}")
-
-        # Add the final records to the results
-        results['final_records'].extend(answers)
-
-        # No query time needed
-
-        # Step 7: Authoritative server provides the final answer
         results['resolution_steps'].append({
             'step': 'Final Answer',
-            'description': f'Authoritative server returns {len(answers)} records to client',
-            # No query time
-            'animation_delay': 6000,
-            'details': f'Authoritative server responds with the final {record_type} records for {domain}'
+            'description': (f'Authoritative server returns {lookup_result(lookup, answers)} to client'
+                            if lookup['status'] in ('NOERROR', 'NXDOMAIN', 'NODATA')
+                            else f'Resolution ends with {lookup_result(lookup, answers)}'),
+            'query_time': format_rtt(lookup['elapsed']),
+            'animation_delay': 1000 * len(results['resolution_steps']),
+            'details': (f'Authoritative server responds with the final {record_type} records for {domain}'
+                        if lookup['status'] == 'NOERROR' else final_details(domain, record_type, lookup))
         })
-    except Exception as e:
-        results['errors'].append(f"Error getting final answer: {str(e)}")
-
-    # Add a summary of the path followed
-    path_summary = [
-        f"Your computer → Root Server ({selected_root_server['name']})",
-        f"Root Server → Your computer (with referral to TLD servers)",
-        f"Your computer → TLD Server ({selected_tld_server['name']})",
-        f"TLD Server → Your computer (with referral to authoritative servers)",
-        f"Your computer → Authoritative Server ({selected_auth_server['name']})",
-        f"Authoritative Server → Your computer (Final Answer)"
-    ]
 
     results['path_summary'] = path_summary
+    raise_for_status(domain, lookup)
+
+def zone_label(zone):
+    """Describe a zone for display, e.g. 'root', '.com TLD' or 'example.com'"""
+    level = zone_level(zone)
+    if level == 'Root':
+        return 'root'
+    if level == 'TLD':
+        return f".{zone.rstrip('.')} TLD"
+    return zone.rstrip('.')
+
+def server_role(zone):
+    """Describe a server of a zone, e.g. 'a .com TLD server'"""
+    level = zone_level(zone)
+    if level == 'Authoritative':
+        return f'an authoritative name server for {zone_label(zone)}'
+    return f'a {zone_label(zone)} DNS server' if level == 'Root' else f'a {zone_label(zone)} server'
+
+def hop_outcome(hop):
+    """Describe what a contacted server replied"""
+    if hop['kind'] == 'referral':
+        referral = hop['referral']
+        return f"Referral to {len(referral['servers'])} {zone_label(referral['zone'])} servers"
+    return {
+        'answer': 'Final Answer',
+        'nxdomain': 'Domain does not exist',
+        'nodata': 'No records of the requested type',
+        'error': 'Server failure'
+    }[hop['kind']]
+
+def contacted_server(hop):
+    """Describe the server contacted in a hop and its round-trip time"""
+    server = hop['server']
+    detail = f"Contacted {server['name']} ({server['ip']})"
+    if server.get('operator'):
+        detail += f" operated by {server['operator']}"
+    detail += f" in {server.get('location', 'Unknown')}, answered in {format_rtt(hop['rtt'])}"
+    return detail
+
+def server_details(hop):
+    """Describe the server contacted in a hop and how it was found"""
+    details = [contacted_server(hop)]
+    raced = [server for server in hop.get('queried', []) if server is not hop['server']]
+    if raced:
+        names = ', '.join(server['name'] for server in raced)
+        details.append(f"Also queried {names} to avoid waiting on a slow server; {hop['server']['name']} answered first")
+    if hop.get('cached_referral') is not None:
+        details.append(f"The {zone_label(hop['zone'])} servers were known from a cached referral "
+                       f"({hop['cached_referral']} s of TTL left), so the servers above them were skipped")
+    return details
+
+def lookup_result(lookup, answers):
+    """Describe what a lookup returns, e.g. '2 records' or 'an NXDOMAIN answer'"""
+    if lookup['status'] == 'NXDOMAIN':
+        return 'an NXDOMAIN answer'
+    if lookup['status'] == 'NODATA':
+        return 'an empty (NODATA) answer'
+    if lookup['status'] == 'TIMEOUT':
+        return 'no answer (timed out)'
+    if lookup['status'] != 'NOERROR':
+        return 'a server failure (SERVFAIL)'
+    return f'{len(answers)} records'
+
+def final_details(domain, record_type, lookup):
+    """Explain the outcome of a lookup that was not served from the cache"""
+    if lookup['status'] == 'NXDOMAIN':
+        return f'The authoritative servers report that {domain} does not exist'
+    if lookup['status'] == 'NODATA':
+        return f'{domain} exists but the authoritative servers have no {record_type} records for it'
+    if lookup['status'] == 'TIMEOUT':
+        return f'No DNS server answered in time while resolving {domain}'
+    return f"Resolution of {domain} failed: {lookup['error'] or 'Server failure'}"
+
+def cached_details(domain, record_type, lookup):
+    """Explain an answer served from the cache"""
+    if lookup['status'] == 'NXDOMAIN':
+        return (f"{domain} was recently found not to exist. The negative answer is cached for the zone's "
+                f"SOA minimum TTL ({lookup['ttl']} s left), so no DNS servers were contacted")
+    if lookup['status'] == 'NODATA':
+        return (f"{domain} was recently found to have no {record_type} records. The negative answer is cached "
+                f"for the zone's SOA minimum TTL ({lookup['ttl']} s left), so no DNS servers were contacted")
+    return f"The {record_type} records for {domain} were still cached ({lookup['ttl']} s of TTL left), so no DNS servers were contacted"
+
+def format_rtt(seconds):
+    """Format a round-trip time like dig's query time"""
+    return f'{seconds * 1000:.0f} msec'
+
+def answer_records(lookup):
+    """Flatten the answer rrsets of a lookup into record dicts"""
+    return [{
+        'type': dns.rdatatype.to_text(rrset.rdtype),
+        'value': rdata.to_text(),
+        'ttl': rrset.ttl
+    } for rrset in lookup['records'] for rdata in rrset]
+
+def raise_for_status(domain, lookup):
+    """Raise the dnspython exception matching an unsuccessful lookup"""
+    if lookup['status'] == 'NXDOMAIN':
+        raise dns.resolver.NXDOMAIN(qnames=[dns.name.from_text(domain)])
+    if lookup['status'] == 'NODATA':
+        raise dns.resolver.NoAnswer()
+    if lookup['status'] == 'TIMEOUT':
+        raise dns.resolver.LifetimeTimeout(timeout=lookup['elapsed'], errors={})
+    if lookup['status'] != 'NOERROR':
+        raise dns.exception.DNSException(lookup['error'] or 'Server failure')
 
 def get_root_servers():
     """Return a list of root DNS servers with their actual information"""
@@ -664,42 +324,13 @@ def get_root_servers():
         {'name': 'm.root-servers.net', 'ip': '202.12.27.33', 'operator': 'WIDE Project', 'location': 'Tokyo, Japan'}
     ]
 
-def get_tld_servers(tld):
-    """Return a list of TLD servers for the given TLD"""
-    # This is a simplified simulation - in reality, we would query the root servers
-    # to get the actual TLD servers for the specific TLD
-    tld_servers = {
-        'com': [
-            {'name': 'a.gtld-servers.net', 'ip': '192.5.6.30', 'location': 'Dulles, Virginia, USA'},
-            {'name': 'b.gtld-servers.net', 'ip': '192.33.14.30', 'location': 'Los Angeles, California, USA'},
-            {'name': 'c.gtld-servers.net', 'ip': '192.26.92.30', 'location': 'Herndon, Virginia, USA'},
-            {'name': 'd.gtld-servers.net', 'ip': '192.31.80.30', 'location': 'Sterling, Virginia, USA'}
-        ],
-        'org': [
-            {'name': 'a0.org.afilias-nst.info', 'ip': '199.19.56.1', 'location': 'Toronto, Canada'},
-            {'name': 'a2.org.afilias-nst.info', 'ip': '199.249.112.1', 'location': 'Toronto, Canada'},
-            {'name': 'b0.org.afilias-nst.org', 'ip': '199.19.54.1', 'location': 'Toronto, Canada'},
-            {'name': 'b2.org.afilias-nst.org', 'ip': '199.249.120.1', 'location': 'Toronto, Canada'}
-        ],
-        'net': [
-            {'name': 'a.gtld-servers.net', 'ip': '192.5.6.30', 'location': 'Dulles, Virginia, USA'},
-            {'name': 'b.gtld-servers.net', 'ip': '192.33.14.30', 'location': 'Los Angeles, California, USA'},
-            {'name': 'c.gtld-servers.net', 'ip': '192.26.92.30', 'location': 'Herndon, Virginia, USA'},
-            {'name': 'd.gtld-servers.net', 'ip': '192.31.80.30', 'location': 'Sterling, Virginia, USA'}
-        ],
-        'edu': [
-            {'name': 'a.edu-servers.net', 'ip': '192.5.6.30', 'location': 'Dulles, Virginia, USA'},
-            {'name': 'b.edu-servers.net', 'ip': '192.33.14.30', 'location': 'Los Angeles, California, USA'},
-            {'name': 'c.edu-servers.net', 'ip': '192.26.92.30', 'location': 'Herndon, Virginia, USA'},
-            {'name': 'd.edu-servers.net', 'ip': '192.31.80.30', 'location': 'Sterling, Virginia, USA'}
-        ]
-    }
-
-    # Return servers for the requested TLD, or default to .com if not found
-    return tld_servers.get(tld, tld_servers['com'])
-
 def run_nslookup(domain, record_type='A', query_mode='recursive'):
     """Run DNS lookup commands and return the output"""
+    # A lookup the resolver just made is answered without running dig
+    cached = get_cached_answer(domain, record_type)
+    if cached is not None:
+        return cached_nslookup(domain, record_type, query_mode, cached)
+
     try:
         # Determine which command to run based on query mode
         if query_mode == 'iterative':
@@ -771,6 +402,9 @@ def run_nslookup(domain, record_type='A', query_mode='recursive'):
 
             combined_output = header + output + explanation + visual + trace_header + trace_result.stdout
 
+        # Later lookups of the same name are answered from the cache
+        queue_cache_fill(domain, record_type)
+
         return {
             'status': 'success',
             'command': ' '.join(cmd),
@@ -790,3 +424,78 @@ def run_nslookup(domain, record_type='A', query_mode='recursive'):
             'message': f'Error executing DNS commands: {str(e)}',
             'command': ' '.join(cmd) if 'cmd' in locals() else 'DNS command'
         }
+
+def queue_cache_fill(domain, record_type):
+    """
+    Resolve a name in the background and cache the answer for later lookups
+
+    dig's text output cannot be cached, so a cache miss in nslookup mode
+    is resolved once more by the engine to fill the shared cache. The
+    request that missed does not wait for it.
+
+    Args:
+        domain (str): Domain name to resolve
+        record_type (str): Record type
+
+    Returns:
+        concurrent.futures.Future: Completes with fill_cache's result
+    """
+    key = (domain.lower().rstrip('.'), record_type.upper())
+    with _pending_fills_lock:
+        future = _pending_fills.get(key)
+        if future is not None and not future.done():
+            return future
+        future = _cache_filler.submit(fill_cache, domain, record_type)
+        _pending_fills[key] = future
+    future.add_done_callback(lambda done: _forget_fill(key, done))
+    return future
+
+def _forget_fill(key, future):
+    """Drop a finished fill from the pending ones"""
+    with _pending_fills_lock:
+        if _pending_fills.get(key) is future:
+            del _pending_fills[key]
+
+def fill_cache(domain, record_type):
+    """
+    Resolve a name in-process and cache the answer for later lookups
+
+    Returns:
+        bool: Whether an answer was cached
+    """
+    try:
+        lookup = resolve_iteratively(domain, record_type, get_root_servers(), use_cache=False)
+    except dns.exception.DNSException:
+        return False
+    if lookup['status'] not in ('NOERROR', 'NXDOMAIN', 'NODATA'):
+        return False
+    return cache_answer(lookup['qname'], lookup['rdtype'], lookup)
+
+def cached_nslookup(domain, record_type, query_mode, lookup):
+    """Format a cached answer like the output of dig"""
+    mode = 'ITERATIVE' if query_mode == 'iterative' else 'RECURSIVE'
+    output = f"\n;; {mode} DNS QUERY\n"
+    output += ";; Answered from the resolver cache, no DNS servers were contacted\n\n"
+    output += f";; status: {'NOERROR' if lookup['status'] == 'NODATA' else lookup['status']}\n\n"
+    if lookup['cnames'] or lookup['records']:
+        output += ";; ANSWER SECTION:\n"
+        output += ''.join(rrset.to_text() + '\n' for rrset in lookup['cnames'] + lookup['records'])
+        output += "\n"
+    if lookup['soa'] is not None:
+        output += ";; AUTHORITY SECTION:\n"
+        output += lookup['soa'].to_text() + '\n\n'
+    output += f";; Query time: 0 msec\n"
+    output += f";; TTL remaining: {lookup['ttl']} s\n"
+
+    stats = cache_stats()
+    output += (f";; Cache: {stats['size']} answers, {stats['hits']} hits "
+               f"({stats['negative_hits']} negative), {stats['misses']} misses\n")
+
+    return {
+        'status': 'success',
+        'command': f'cache lookup {domain} {record_type}',
+        'stdout': output,
+        'stderr': '',
+        'exit_code': 0,
+        'cached': True
+    }
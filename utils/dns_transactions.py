@@ -0,0 +1,254 @@
+import os
+import datetime
+import threading
+import collections
+from array import array
+
+import numpy as np
+from scapy.all import IP, TCP, UDP, DNS
+from scapy.layers.inet6 import IPv6
+
+from .pcap_index import file_signature, iter_records
+from .packet_decoder import decode_frame
+from .packet_analyzer import dissect_record
+
+# Seconds after which an unanswered query is given up on
+DEFAULT_QUERY_TIMEOUT = 5.0
+
+# Largest number of queries waiting for a response at any time; the
+# oldest is counted as unanswered when the table is full
+MAX_PENDING_QUERIES = 100000
+
+# Upper bounds in milliseconds of the latency histogram buckets
+LATENCY_BUCKETS_MS = [1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000]
+
+LATENCY_PERCENTILES = [50, 90, 95, 99]
+
+# Number of unanswered and slowest queries listed individually
+MAX_LISTED_QUERIES = 100
+SLOWEST_QUERIES = 10
+
+# Reports of recently used files, keyed by absolute path
+_dns_cache = {}
+_dns_lock = threading.Lock()
+
+def get_dns_latency(pcap_file, timeout=DEFAULT_QUERY_TIMEOUT):
+    """
+    Pair the DNS queries and responses of a capture and report latencies
+
+    Results are cached until the file's modification time or size changes.
+
+    Args:
+        pcap_file (str): Path to the PCAP file
+        timeout (float, optional): Seconds to wait for a response
+
+    Returns:
+        dict: Counts, latency percentiles and histogram, unanswered and
+              slowest queries
+    """
+    try:
+        path = os.path.abspath(pcap_file)
+        signature = file_signature(path)
+
+        with _dns_lock:
+            cached = _dns_cache.get(path)
+            if cached is not None and cached[0] == (signature, timeout):
+                return cached[1]
+
+        report = match_dns_transactions(path, timeout)
+
+        with _dns_lock:
+            _dns_cache[path] = ((signature, timeout), report)
+        return report
+    except Exception as e:
+        print(f"Error matching DNS transactions: {e}")
+        return {'error': str(e)}
+
+def match_dns_transactions(pcap_file, timeout=DEFAULT_QUERY_TIMEOUT, max_pending=MAX_PENDING_QUERIES):
+    """
+    Match DNS responses to their queries in one pass over a capture
+
+    Queries are keyed on (transaction id, client address, client port,
+    question name). A repeated query with the same key is counted as a
+    retransmission; latency is measured from the first transmission.
+    Pending queries are kept in arrival order, so expired ones are evicted
+    from the front of the table.
+
+    Args:
+        pcap_file (str): Path to the PCAP file
+        timeout (float, optional): Seconds to wait for a response
+        max_pending (int, optional): Largest number of pending queries
+
+    Returns:
+        dict: DNS latency report (see get_dns_latency)
+    """
+    pending = collections.OrderedDict()
+    latencies = array('d')
+    unanswered = []
+    slowest = []
+    counts = collections.Counter()
+
+    def give_up(query):
+        counts['unanswered'] += 1
+        if len(unanswered) < MAX_LISTED_QUERIES:
+            unanswered.append(_format_query(query))
+
+    for record_number, record in iter_records(pcap_file):
+        message = dns_message(record)
+        if message is None:
+            continue
+        now = record['time']
+
+        while pending:
+            oldest = next(iter(pending.values()))
+            if now - oldest['time'] <= timeout:
+                break
+            give_up(pending.popitem(last=False)[1])
+
+        if not message['response']:
+            counts['queries'] += 1
+            key = (message['id'], message['src'], message['sport'], message['qname'])
+            query = pending.get(key)
+            if query is not None:
+                query['retransmissions'] += 1
+                counts['retransmissions'] += 1
+                continue
+            if len(pending) >= max_pending:
+                give_up(pending.popitem(last=False)[1])
+            pending[key] = {
+                'packet': record_number,
+                'time': now,
+                'id': message['id'],
+                'client': message['src'],
+                'client_port': message['sport'],
+                'server': message['dst'],
+                'qname': message['qname'],
+                'retransmissions': 0
+            }
+            continue
+
+        counts['responses'] += 1
+        key = (message['id'], message['dst'], message['dport'], message['qname'])
+        query = pending.pop(key, None)
+        if query is None:
+            counts['unmatched_responses'] += 1
+            continue
+
+        latency = now - query['time']
+        latencies.append(latency)
+        if message['rcode']:
+            counts['errors'] += 1
+        transaction = _format_query(query)
+        transaction['response_packet'] = record_number
+        transaction['rcode'] = message['rcode']
+        transaction['latency_ms'] = round(latency * 1000, 3)
+        slowest.append(transaction)
+        if len(slowest) > SLOWEST_QUERIES * 2:
+            slowest.sort(key=lambda item: item['latency_ms'], reverse=True)
+            del slowest[SLOWEST_QUERIES:]
+
+    for query in pending.values():
+        give_up(query)
+
+    slowest.sort(key=lambda item: item['latency_ms'], reverse=True)
+    return {
+        'queries': counts['queries'],
+        'responses': counts['responses'],
+        'answered': len(latencies),
+        'unanswered': counts['unanswered'],
+        'retransmissions': counts['retransmissions'],
+        'unmatched_responses': counts['unmatched_responses'],
+        'error_responses': counts['errors'],
+        'timeout': timeout,
+        'latency_ms': _latency_summary(latencies),
+        'histogram': _latency_histogram(latencies),
+        'unanswered_queries': unanswered,
+        'slowest_queries': slowest[:SLOWEST_QUERIES]
+    }
+
+def dns_message(record):
+    """
+    Extract the fields used for query/response matching from a record
+
+    Args:
+        record (dict): Record returned by utils.pcap_index.read_record
+
+    Returns:
+        dict: Transaction id, response flag, rcode, question name and the
+              addresses and ports, or None if the record is not DNS
+    """
+    frame = decode_frame(record['data'], record['linktype'])
+    if frame is not None:
+        if 'dns_id' not in frame:
+            return None
+        qname = frame['dns_qname']
+        return {
+            'id': frame['dns_id'],
+            'response': bool(frame['dns_qr']),
+            'rcode': frame['dns_rcode'],
+            'qname': qname.decode('utf-8', 'replace').lower() if qname else '',
+            'src': frame['src'],
+            'sport': frame['sport'],
+            'dst': frame['dst'],
+            'dport': frame['dport']
+        }
+
+    packet = dissect_record(record)
+    if DNS not in packet:
+        return None
+    if IP in packet:
+        ip_layer = packet[IP]
+    elif IPv6 in packet:
+        ip_layer = packet[IPv6]
+    else:
+        return None
+    transport = packet[TCP] if TCP in packet else packet[UDP] if UDP in packet else None
+    if transport is None:
+        return None
+
+    dns = packet[DNS]
+    qname = dns.qd[0].qname if dns.qdcount and dns.qd else b''
+    return {
+        'id': dns.id,
+        'response': bool(dns.qr),
+        'rcode': dns.rcode,
+        'qname': qname.decode('utf-8', 'replace').lower() if qname else '',
+        'src': ip_layer.src,
+        'sport': transport.sport,
+        'dst': ip_layer.dst,
+        'dport': transport.dport
+    }
+
+def _format_query(query):
+    """Convert a pending query into the report format"""
+    return {
+        'packet': query['packet'],
+        'time': str(datetime.datetime.fromtimestamp(query['time'])),
+        'id': query['id'],
+        'client': f"{query['client']}:{query['client_port']}",
+        'server': query['server'],
+        'qname': query['qname'],
+        'retransmissions': query['retransmissions']
+    }
+
+def _latency_summary(latencies):
+    """Minimum, mean, maximum and percentiles of the latencies in milliseconds"""
+    if not latencies:
+        return None
+    values = np.frombuffer(latencies, dtype=np.float64) * 1000
+    summary = {
+        'min': round(float(values.min()), 3),
+        'mean': round(float(values.mean()), 3),
+        'max': round(float(values.max()), 3)
+    }
+    for percentile, value in zip(LATENCY_PERCENTILES, np.percentile(values, LATENCY_PERCENTILES)):
+        summary[f'p{percentile}'] = round(float(value), 3)
+    return summary
+
+def _latency_histogram(latencies):
+    """Count latencies per histogram bucket; the last bucket has no upper bound"""
+    values = np.frombuffer(latencies, dtype=np.float64) * 1000 if latencies else np.zeros(0)
+    positions = np.searchsorted(LATENCY_BUCKETS_MS, values, side='left')
+    counts = np.bincount(positions, minlength=len(LATENCY_BUCKETS_MS) + 1)
+    bounds = LATENCY_BUCKETS_MS + [None]
+    return [{'le_ms': bound, 'count': int(count)} for bound, count in zip(bounds, counts)]
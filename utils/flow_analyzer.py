@@ -0,0 +1,242 @@
+import os
+import datetime
+import threading
+
+from scapy.all import IP, TCP, UDP, ICMP
+from scapy.layers.inet6 import IPv6
+
+from .pcap_index import file_signature, iter_records
+from .packet_decoder import decode_frame
+from .packet_analyzer import dissect_record
+
+# TCP flag bits
+TCP_FIN = 0x01
+TCP_SYN = 0x02
+TCP_RST = 0x04
+TCP_ACK = 0x10
+
+TRANSPORT_NAMES = {6: 'TCP', 17: 'UDP', 1: 'ICMP', 58: 'ICMPv6'}
+
+# Keys flows can be sorted by
+FLOW_SORT_KEYS = {'flow_id', 'packets', 'bytes', 'first_seen', 'last_seen', 'duration'}
+
+# Flow tables of recently used files, keyed by absolute path
+_flow_cache = {}
+_flow_lock = threading.Lock()
+
+def get_flows(pcap_file, sort='flow_id', descending=False, offset=0, limit=None):
+    """
+    Get a sorted page of the conversations in a capture
+
+    Args:
+        pcap_file (str): Path to the PCAP file
+        sort (str, optional): Flow field to sort by (see FLOW_SORT_KEYS)
+        descending (bool, optional): Sort largest first
+        offset (int, optional): Number of flows to skip
+        limit (int, optional): Maximum number of flows to return
+
+    Returns:
+        dict: 'total' number of flows and the requested 'flows'
+    """
+    try:
+        flows = get_flow_table(pcap_file)
+        if sort not in FLOW_SORT_KEYS:
+            sort = 'flow_id'
+        if sort != 'flow_id' or descending:
+            flows = sorted(flows, key=lambda flow: flow[sort], reverse=descending)
+        stop = offset + limit if limit is not None else None
+        return {'total': len(flows), 'flows': [format_flow(flow) for flow in flows[offset:stop]]}
+    except Exception as e:
+        print(f"Error building flow table: {e}")
+        return {'error': str(e)}
+
+def get_flow_table(pcap_file):
+    """
+    Return the flow table of a capture, building it if needed
+
+    The table is cached until the file's modification time or size changes.
+
+    Args:
+        pcap_file (str): Path to the PCAP file
+
+    Returns:
+        list: Flows in first-seen order (see build_flow_table)
+    """
+    path = os.path.abspath(pcap_file)
+    signature = file_signature(path)
+
+    with _flow_lock:
+        cached = _flow_cache.get(path)
+        if cached is not None and cached[0] == signature:
+            return cached[1]
+
+    flows = build_flow_table(path)
+
+    with _flow_lock:
+        _flow_cache[path] = (signature, flows)
+    return flows
+
+def build_flow_table(pcap_file):
+    """
+    Group the IP packets of a capture into bidirectional flows in one pass
+
+    Both directions of a conversation share one flow. The endpoint that
+    sent the first packet is reported as the source. Only one small entry
+    per flow is kept, never per-packet objects.
+
+    Args:
+        pcap_file (str): Path to the PCAP file
+
+    Returns:
+        list: Flow dicts in first-seen order; 'flow_id' is the position
+    """
+    table = {}
+    flows = []
+
+    for record_number, record in iter_records(pcap_file):
+        endpoints = record_endpoints(record)
+        if endpoints is None:
+            continue
+        protocol, src, sport, dst, dport, tcp_flags = endpoints
+
+        key = flow_key(protocol, src, sport, dst, dport)
+        flow = table.get(key)
+        if flow is None:
+            flow = {
+                'flow_id': len(flows),
+                'key': key,
+                'protocol': protocol,
+                'src': src,
+                'src_port': sport,
+                'dst': dst,
+                'dst_port': dport,
+                'packets': 0,
+                'bytes': 0,
+                'packets_forward': 0,
+                'bytes_forward': 0,
+                'first_packet': record_number,
+                'last_packet': record_number,
+                'first_seen': record['time'],
+                'last_seen': record['time'],
+                'duration': 0.0,
+                'tcp_flags': 0,
+                'syn': False,
+                'syn_ack': False,
+                'fin_forward': False,
+                'fin_reverse': False,
+                'rst': False
+            }
+            table[key] = flow
+            flows.append(flow)
+
+        length = record['wirelen']
+        forward = src == flow['src'] and sport == flow['src_port']
+        flow['packets'] += 1
+        flow['bytes'] += length
+        if forward:
+            flow['packets_forward'] += 1
+            flow['bytes_forward'] += length
+        flow['last_packet'] = record_number
+        flow['last_seen'] = max(flow['last_seen'], record['time'])
+        flow['duration'] = flow['last_seen'] - flow['first_seen']
+
+        if tcp_flags is not None:
+            flow['tcp_flags'] |= tcp_flags
+            if tcp_flags & TCP_SYN:
+                if tcp_flags & TCP_ACK:
+                    flow['syn_ack'] = True
+                else:
+                    flow['syn'] = True
+            if tcp_flags & TCP_FIN:
+                flow['fin_forward' if forward else 'fin_reverse'] = True
+            if tcp_flags & TCP_RST:
+                flow['rst'] = True
+
+    return flows
+
+def flow_key(protocol, src, sport, dst, dport):
+    """Return the same hashable key for both directions of a conversation"""
+    a, b = (src, sport), (dst, dport)
+    if b < a:
+        a, b = b, a
+    return (protocol, a[0], a[1], b[0], b[1])
+
+def record_endpoints(record):
+    """
+    Extract the addresses and ports of a capture record
+
+    Args:
+        record (dict): Record returned by utils.pcap_index.read_record
+
+    Returns:
+        tuple: (protocol, src, sport, dst, dport, tcp flags or None), or
+               None for packets without an IP layer
+    """
+    frame = decode_frame(record['data'], record['linktype'])
+    if frame is not None:
+        if not frame.get('ip_version'):
+            return None
+        protocol = TRANSPORT_NAMES.get(frame['ip_proto'], str(frame['ip_proto']))
+        return (protocol, frame['src'], frame.get('sport', 0), frame['dst'], frame.get('dport', 0),
+                frame.get('tcp_flags'))
+
+    packet = dissect_record(record)
+    if IP in packet:
+        ip_layer = packet[IP]
+        protocol_number = ip_layer.proto
+    elif IPv6 in packet:
+        ip_layer = packet[IPv6]
+        protocol_number = ip_layer.nh
+    else:
+        return None
+
+    protocol = TRANSPORT_NAMES.get(protocol_number, str(protocol_number))
+    if TCP in packet:
+        return ('TCP', ip_layer.src, packet[TCP].sport, ip_layer.dst, packet[TCP].dport, int(packet[TCP].flags))
+    if UDP in packet:
+        return ('UDP', ip_layer.src, packet[UDP].sport, ip_layer.dst, packet[UDP].dport, None)
+    if ICMP in packet:
+        protocol = 'ICMP'
+    return (protocol, ip_layer.src, 0, ip_layer.dst, 0, None)
+
+def tcp_state(flow):
+    """Describe how far a TCP conversation got"""
+    if flow['rst']:
+        return 'reset'
+    if flow['fin_forward'] and flow['fin_reverse']:
+        return 'closed'
+    if flow['fin_forward'] or flow['fin_reverse']:
+        return 'closing'
+    if flow['syn'] and flow['syn_ack']:
+        return 'established'
+    if flow['syn']:
+        return 'syn_sent'
+    # The handshake happened before the capture started
+    return 'midstream'
+
+def format_flow(flow):
+    """Convert a flow table entry into the API format"""
+    formatted = {
+        'flow_id': flow['flow_id'],
+        'protocol': flow['protocol'],
+        'src': flow['src'],
+        'dst': flow['dst'],
+        'packets': flow['packets'],
+        'bytes': flow['bytes'],
+        'packets_forward': flow['packets_forward'],
+        'bytes_forward': flow['bytes_forward'],
+        'packets_reverse': flow['packets'] - flow['packets_forward'],
+        'bytes_reverse': flow['bytes'] - flow['bytes_forward'],
+        'first_packet': flow['first_packet'],
+        'last_packet': flow['last_packet'],
+        'first_seen': str(datetime.datetime.fromtimestamp(flow['first_seen'])),
+        'last_seen': str(datetime.datetime.fromtimestamp(flow['last_seen'])),
+        'duration': round(flow['duration'], 6)
+    }
+    if flow['protocol'] in ('TCP', 'UDP'):
+        formatted['src_port'] = flow['src_port']
+        formatted['dst_port'] = flow['dst_port']
+    if flow['protocol'] == 'TCP':
+        formatted['tcp_flags'] = flow['tcp_flags']
+        formatted['state'] = tcp_state(flow)
+    return formatted
@@ -0,0 +1,374 @@
+import os
+import json
+import tempfile
+import bisect
+import datetime
+import threading
+import collections
+from array import array
+
+from .pcap_index import file_signature, iter_records
+from .flow_analyzer import get_flow_table, flow_key
+from .tcp_reassembly import StreamBuffer, tcp_segment
+
+HTTP_SUFFIX = '.http'
+HTTP_INDEX_VERSION = 2
+
+HTTP_METHODS = (b'GET', b'POST', b'PUT', b'DELETE', b'HEAD', b'OPTIONS', b'PATCH', b'CONNECT', b'TRACE')
+
+# Largest header block parsed; longer messages end the parse of a stream
+MAX_HEADER_BYTES = 64 * 1024
+
+# Flows reassembled at the same time. Each holds two spooled buffers that
+# may roll over to temporary files, so this also bounds the open files;
+# past it the least recently active flow is parsed early and the rest of
+# its packets are ignored.
+HTTP_MAX_OPEN_FLOWS = int(os.getenv('PACKET_HTTP_MAX_OPEN_FLOWS', 256))
+
+# Loaded transaction indexes, keyed by absolute capture path
+_http_cache = {}
+_http_lock = threading.Lock()
+
+# Per-capture locks, so concurrent requests build each index only once
+_http_build_locks = {}
+
+def get_http_transactions(pcap_file, offset=0, limit=None, method=None, host=None, status=None):
+    """
+    List the HTTP/1.x transactions of a capture
+
+    Args:
+        pcap_file (str): Path to the PCAP file
+        offset (int, optional): Number of matching transactions to skip
+        limit (int, optional): Maximum number of transactions to return
+        method (str, optional): Only requests with this method
+        host (str, optional): Only requests to this host
+        status (int, optional): Only responses with this status code
+
+    Returns:
+        dict: 'total' number of matching transactions and the requested page
+    """
+    try:
+        transactions = get_http_index(pcap_file)
+        if method:
+            transactions = [t for t in transactions if t['method'] == method.upper()]
+        if host:
+            transactions = [t for t in transactions if t['host'] == host.lower()]
+        if status is not None:
+            transactions = [t for t in transactions if t['status'] == status]
+        stop = offset + limit if limit is not None else None
+        return {'total': len(transactions), 'transactions': transactions[offset:stop]}
+    except Exception as e:
+        print(f"Error indexing HTTP transactions: {e}")
+        return {'error': str(e)}
+
+def get_http_index(pcap_file):
+    """
+    Return the HTTP transaction index of a capture, building it if needed
+
+    The index is stored in a sidecar next to the capture, so it is built
+    once per capture rather than once per process.
+
+    Args:
+        pcap_file (str): Path to the PCAP file
+
+    Returns:
+        list: Transactions (see build_http_index)
+    """
+    path = os.path.abspath(pcap_file)
+    signature = file_signature(path)
+
+    with _http_lock:
+        cached = _http_cache.get(path)
+        if cached is not None and cached[0] == signature:
+            return cached[1]
+
+    with _http_lock:
+        lock = _http_build_locks.setdefault(path, threading.Lock())
+
+    # A request arriving while another one builds the index waits for it
+    # and then reads the sidecar instead of reassembling the capture again
+    with lock:
+        transactions = _read_http_sidecar(path, signature)
+        if transactions is None:
+            transactions = build_http_index(path)
+            _write_http_sidecar(path, signature, transactions)
+
+    with _http_lock:
+        _http_cache[path] = (signature, transactions)
+    return transactions
+
+def build_http_index(pcap_file):
+    """
+    Extract HTTP/1.x requests and responses from the TCP streams of a capture
+
+    All TCP flows are reassembled in a single pass. A flow is dropped as
+    soon as its client's first bytes are not an HTTP request, and parsed
+    and released when its last packet has been read, so only the flows
+    that are open at a time are held, at most HTTP_MAX_OPEN_FLOWS of them.
+
+    Args:
+        pcap_file (str): Path to the PCAP file
+
+    Returns:
+        list: Transactions in request order with method, host, URI, status,
+              content length and request-to-response latency
+    """
+    flows = {flow['key']: flow for flow in get_flow_table(pcap_file) if flow['protocol'] == 'TCP'}
+    # Open flows, least recently active first
+    open_flows = collections.OrderedDict()
+    skipped = set()
+    transactions = []
+    now = [0.0]
+
+    for record_number, record in iter_records(pcap_file):
+        segment = tcp_segment(record)
+        if segment is None:
+            continue
+        src, sport, dst, dport, seq, flags, payload = segment
+        key = flow_key('TCP', src, sport, dst, dport)
+        if key in skipped or key not in flows:
+            continue
+        now[0] = record['time']
+
+        state = open_flows.get(key)
+        if state is None:
+            if len(open_flows) >= HTTP_MAX_OPEN_FLOWS:
+                idle_key, idle = open_flows.popitem(last=False)
+                skipped.add(idle_key)
+                if idle['is_http']:
+                    transactions.extend(_finish_flow(idle))
+                else:
+                    _close_flow(idle)
+            state = open_flows[key] = _open_flow(flows[key], now)
+        else:
+            open_flows.move_to_end(key)
+        client = (flows[key]['src'], flows[key]['src_port'])
+        direction = 0 if (src, sport) == client else 1
+        state['buffers'][direction].add(seq, flags, payload, record_number)
+
+        is_last = record_number == flows[key]['last_packet']
+        if not state['is_http'] and (state['buffers'][0].stored >= 8 or is_last):
+            if not state['buffers'][0].read(0, 8).startswith(HTTP_METHODS):
+                _close_flow(state)
+                del open_flows[key]
+                skipped.add(key)
+                continue
+            state['is_http'] = True
+        if is_last:
+            transactions.extend(_finish_flow(state))
+            del open_flows[key]
+
+    for state in open_flows.values():
+        transactions.extend(_finish_flow(state))
+
+    transactions.sort(key=lambda t: (t['request_time'], t['request_packet']))
+    for transaction in transactions:
+        transaction['time'] = str(datetime.datetime.fromtimestamp(transaction.pop('request_time')))
+    return transactions
+
+def _open_flow(flow, now):
+    """Start reassembling a flow, remembering when each byte was delivered"""
+    state = {
+        'flow': flow,
+        'is_http': False,
+        'offsets': (array('Q'), array('Q')),
+        'packets': (array('Q'), array('Q')),
+        'times': (array('d'), array('d'))
+    }
+
+    def on_deliver(direction):
+        def record_delivery(offset, length, packet):
+            state['offsets'][direction].append(offset)
+            state['packets'][direction].append(packet)
+            state['times'][direction].append(now[0])
+        return record_delivery
+
+    state['buffers'] = (StreamBuffer(on_deliver(0)), StreamBuffer(on_deliver(1)))
+    return state
+
+def _close_flow(state):
+    """Release the buffers of a flow"""
+    for buffer in state['buffers']:
+        buffer.close()
+
+def _finish_flow(state):
+    """Parse the HTTP messages of a reassembled flow and pair them up"""
+    try:
+        for buffer in state['buffers']:
+            buffer.finish()
+        requests = _parse_messages(state, 0)
+        responses = _parse_messages(state, 1, [request['method'] for request in requests])
+    finally:
+        _close_flow(state)
+
+    flow = state['flow']
+    transactions = []
+    # HTTP/1.x answers requests in order, including pipelined ones
+    for i, request in enumerate(requests):
+        response = responses[i] if i < len(responses) else None
+        transaction = {
+            'flow_id': flow['flow_id'],
+            'client': f"{flow['src']}:{flow['src_port']}",
+            'server': f"{flow['dst']}:{flow['dst_port']}",
+            'request_packet': request['packet'],
+            'request_time': request['time'],
+            'method': request['method'],
+            'host': request['headers'].get('host', '').lower(),
+            'uri': request['target'],
+            'version': request['version'],
+            'user_agent': request['headers'].get('user-agent'),
+            'request_content_length': request['body_length'],
+            'response_packet': None,
+            'status': None,
+            'reason': None,
+            'content_type': None,
+            'content_length': None,
+            'latency_ms': None
+        }
+        if response is not None:
+            transaction.update({
+                'response_packet': response['packet'],
+                'status': response['status'],
+                'reason': response['reason'],
+                'content_type': response['headers'].get('content-type'),
+                'content_length': response['body_length'],
+                'latency_ms': round((response['time'] - request['time']) * 1000, 3)
+            })
+        transactions.append(transaction)
+    return transactions
+
+def _parse_messages(state, direction, request_methods=None):
+    """
+    Parse consecutive HTTP messages from one direction of a flow
+
+    Args:
+        state (dict): Reassembled flow
+        direction (int): 0 for requests, 1 for responses
+        request_methods (list, optional): Methods of the requests, used to
+                                          tell which responses have no body
+
+    Returns:
+        list: Messages with start line fields, lower-cased headers, body
+              length and the packet number and time of their first byte
+    """
+    buffer = state['buffers'][direction]
+    messages = []
+    position = 0
+
+    while position < buffer.stored:
+        head = buffer.read(position, MAX_HEADER_BYTES)
+        header_end = head.find(b'\r\n\r\n')
+        if header_end < 0:
+            break
+        lines = head[:header_end].decode('iso-8859-1').split('\r\n')
+        start_line = lines[0].split(' ', 2)
+        headers = {}
+        for line in lines[1:]:
+            name, _, value = line.partition(':')
+            headers[name.strip().lower()] = value.strip()
+
+        message = {'headers': headers}
+        if direction == 0:
+            if len(start_line) != 3 or start_line[0].encode() not in HTTP_METHODS:
+                break
+            message.update({'method': start_line[0], 'target': start_line[1], 'version': start_line[2]})
+        else:
+            if len(start_line) < 2 or not start_line[0].startswith('HTTP/') or not start_line[1].isdigit():
+                break
+            message.update({'version': start_line[0], 'status': int(start_line[1]),
+                            'reason': start_line[2] if len(start_line) > 2 else ''})
+            if message['status'] < 200:
+                # Interim responses do not answer the request
+                position += header_end + 4
+                continue
+
+        body_start = position + header_end + 4
+        body_length, body_end = _body_extent(buffer, body_start, message, direction,
+                                             request_methods[len(messages)] if request_methods and
+                                             len(messages) < len(request_methods) else None)
+
+        offsets = state['offsets'][direction]
+        delivery = max(bisect.bisect_right(offsets, position) - 1, 0)
+        message['packet'] = state['packets'][direction][delivery]
+        message['time'] = state['times'][direction][delivery]
+        message['body_length'] = body_length
+        messages.append(message)
+
+        if body_end is None or body_end <= position:
+            break
+        position = body_end
+
+    return messages
+
+def _body_extent(buffer, body_start, message, direction, request_method):
+    """Return (body length, offset after the body) of a parsed message header"""
+    headers = message['headers']
+    if direction == 1 and (request_method == 'HEAD' or message['status'] in (204, 304)):
+        return 0, body_start
+
+    if 'chunked' in headers.get('transfer-encoding', '').lower():
+        return _chunked_extent(buffer, body_start)
+
+    length = headers.get('content-length')
+    if length is not None and length.isdigit():
+        return int(length), body_start + int(length)
+
+    if direction == 0:
+        return 0, body_start
+    # Without a length the response lasts until the connection closes
+    return buffer.stored - body_start, None
+
+def _chunked_extent(buffer, position):
+    """Walk a chunked body, returning (decoded length, offset after it)"""
+    total = 0
+    while position < buffer.stored:
+        line = buffer.read(position, 1024)
+        line_end = line.find(b'\r\n')
+        if line_end < 0:
+            break
+        try:
+            size = int(line[:line_end].split(b';')[0], 16)
+        except ValueError:
+            break
+        position += line_end + 2
+        if size == 0:
+            # Skip trailers up to the blank line ending the message
+            trailer = buffer.read(position, MAX_HEADER_BYTES)
+            if trailer.startswith(b'\r\n'):
+                return total, position + 2
+            end = trailer.find(b'\r\n\r\n')
+            if end < 0:
+                # The blank line ending the message never arrived
+                return total, None
+            return total, position + end + 4
+        total += size
+        position += size + 2
+    return total, None
+
+def _read_http_sidecar(path, signature):
+    """Load a stored transaction index, or None if missing or stale"""
+    try:
+        with open(path + HTTP_SUFFIX, 'r', encoding='utf-8') as f:
+            stored = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if stored.get('version') != HTTP_INDEX_VERSION or \
+            (stored.get('mtime_ns'), stored.get('size')) != signature:
+        return None
+    return stored['transactions']
+
+def _write_http_sidecar(path, signature, transactions):
+    """Store a transaction index next to its capture"""
+    sidecar = path + HTTP_SUFFIX
+    # A temporary file of our own, so concurrent writers cannot clobber it
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(sidecar), prefix=os.path.basename(sidecar) + '.',
+                                    suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump({'version': HTTP_INDEX_VERSION, 'mtime_ns': signature[0], 'size': signature[1],
+                       'transactions': transactions}, f)
+        os.replace(tmp_path, sidecar)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
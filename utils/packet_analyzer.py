@@ -1,10 +1,45 @@
-from scapy.all import rdpcap, Ether, IP, TCP, UDP, DNS, ICMP, ARP, Raw
+from scapy.all import Ether, IP, TCP, UDP, DNS, ICMP, ARP, Raw, conf
 import json
 import datetime
 import socket
 import os
+import ipaddress
+import collections
+import itertools
+import time
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 
-def analyze_pcap(pcap_file, protocol_filter=None, ip_filter=None, port_filter=None):
+import numpy as np
+
+from .pcap_index import (get_record_index, select_record_index, open_capture,
+                         read_record, read_record_at, iter_records)
+from .packet_decoder import summarize_record
+from .summary_index import load_summary_index, write_summary_index, summary_rows
+from .packet_filter import filter_mask, parse_network, _parse_number
+from .packet_sampling import parse_sample, sample_records, sample_indices
+
+# Worker processes that dissect the frames the fast path leaves to scapy
+PARALLEL_WORKERS = int(os.getenv('PACKET_PARALLEL_WORKERS', os.cpu_count() or 1))
+
+# Frames needing scapy per worker task. A window with fewer of them is
+# dissected in the calling process, as the round trip would cost more.
+PARALLEL_MIN_CHUNK = int(os.getenv('PACKET_PARALLEL_MIN_CHUNK', 256))
+
+# Records summarized by the fast path before their scapy frames are handed out
+PARALLEL_WINDOW = 16384
+
+# Shared by all summary builds, so no request starts a pool of its own
+_dissect_pool = None
+_dissect_pool_lock = threading.Lock()
+
+# One lock per capture so its summary index is only built once at a time
+_summary_build_locks = {}
+_summary_build_locks_lock = threading.Lock()
+
+def analyze_pcap(pcap_file, protocol_filter=None, ip_filter=None, port_filter=None, offset=0, limit=None,
+                 display_filter=None, sample=None, sample_seed=0):
     """
     Analyze a PCAP file and return a list of packet summaries
     
@@ -13,111 +48,501 @@ def analyze_pcap(pcap_file, protocol_filter=None, ip_filter=None, port_filter=No
         protocol_filter (str, optional): Filter by protocol
         ip_filter (str, optional): Filter by IP address
         port_filter (str, optional): Filter by port number
+        offset (int, optional): Number of matching packets to skip
+        limit (int, optional): Maximum number of packets to return
+        display_filter (str, optional): Filter expression, e.g.
+            "ip.src in 10.0.0.0/8 and tcp.port in 80..443 and not arp"
+        sample (str, optional): Only summarize a sample of the matching
+            packets: 'every:N', 'reservoir:K' or 'time:1s'
+        sample_seed (int, optional): Random seed for reservoir samples
         
     Returns:
         list: List of packet summaries
     """
     try:
-        # Read the PCAP file
-        packets = rdpcap(pcap_file)
-        
-        # Process packets
-        packet_list = []
-        
-        for i, packet in enumerate(packets):
-            # Basic packet info
-            packet_info = {
-                'index': i,
-                'time': str(datetime.datetime.fromtimestamp(float(packet.time))),
-                'length': len(packet),
-                'protocol': 'Unknown',
-                'src': '',
-                'dst': '',
-                'info': ''
-            }
-            
-            # Ethernet layer
-            if Ether in packet:
-                packet_info['src_mac'] = packet[Ether].src
-                packet_info['dst_mac'] = packet[Ether].dst
-            
-            # IP layer
-            if IP in packet:
-                packet_info['src'] = packet[IP].src
-                packet_info['dst'] = packet[IP].dst
-                packet_info['protocol'] = 'IP'
-            
-            # TCP layer
-            if TCP in packet:
-                packet_info['src_port'] = packet[TCP].sport
-                packet_info['dst_port'] = packet[TCP].dport
-                packet_info['protocol'] = 'TCP'
-                
-                # HTTP detection (simple heuristic)
-                if packet[TCP].dport == 80 or packet[TCP].sport == 80:
-                    if Raw in packet and (b'HTTP/' in packet[Raw].load or b'GET ' in packet[Raw].load or b'POST ' in packet[Raw].load):
-                        packet_info['protocol'] = 'HTTP'
-                        packet_info['info'] = f"HTTP {packet[TCP].sport} → {packet[TCP].dport}"
-                    else:
-                        packet_info['info'] = f"TCP {packet[TCP].sport} → {packet[TCP].dport}"
-                # HTTPS detection
-                elif packet[TCP].dport == 443 or packet[TCP].sport == 443:
-                    packet_info['protocol'] = 'HTTPS'
-                    packet_info['info'] = f"HTTPS {packet[TCP].sport} → {packet[TCP].dport}"
-                else:
-                    packet_info['info'] = f"TCP {packet[TCP].sport} → {packet[TCP].dport}"
-            
-            # UDP layer
-            elif UDP in packet:
-                packet_info['src_port'] = packet[UDP].sport
-                packet_info['dst_port'] = packet[UDP].dport
-                packet_info['protocol'] = 'UDP'
-                packet_info['info'] = f"UDP {packet[UDP].sport} → {packet[UDP].dport}"
-            
-            # DNS layer
-            if DNS in packet:
-                packet_info['protocol'] = 'DNS'
-                if packet.haslayer(DNS) and packet[DNS].qr == 0:  # DNS query
-                    query_name = packet[DNS].qd.qname.decode('utf-8', errors='ignore') if packet[DNS].qd else "unknown"
-                    packet_info['info'] = f"DNS Query: {query_name}"
-                elif packet.haslayer(DNS) and packet[DNS].qr == 1:  # DNS response
-                    query_name = packet[DNS].qd.qname.decode('utf-8', errors='ignore') if packet[DNS].qd else "unknown"
-                    packet_info['info'] = f"DNS Response: {query_name}"
-            
-            # ICMP layer
-            elif ICMP in packet:
-                packet_info['protocol'] = 'ICMP'
-                packet_info['info'] = f"ICMP {packet[ICMP].type}/{packet[ICMP].code}"
-            
-            # ARP layer
-            elif ARP in packet:
-                packet_info['protocol'] = 'ARP'
-                if packet[ARP].op == 1:  # who-has (request)
-                    packet_info['info'] = f"ARP Request: Who has {packet[ARP].pdst}? Tell {packet[ARP].psrc}"
-                elif packet[ARP].op == 2:  # is-at (response)
-                    packet_info['info'] = f"ARP Response: {packet[ARP].psrc} is at {packet[ARP].hwsrc}"
-            
-            # Apply filters
-            if protocol_filter and packet_info['protocol'].lower() != protocol_filter.lower():
-                continue
-                
-            if ip_filter and ip_filter not in packet_info.get('src', '') and ip_filter not in packet_info.get('dst', ''):
-                continue
-                
-            if port_filter:
-                port = int(port_filter)
-                if ('src_port' not in packet_info or packet_info['src_port'] != port) and \
-                   ('dst_port' not in packet_info or packet_info['dst_port'] != port):
-                    continue
-            
-            packet_list.append(packet_info)
+        if sample:
+            return list(sampled_packet_summaries(pcap_file, sample, protocol_filter, ip_filter, port_filter,
+                                                 offset, limit, display_filter, sample_seed))
         
-        return packet_list
+        summary = get_summary_index(pcap_file)
+        indices = matching_packet_indices(pcap_file, protocol_filter, ip_filter, port_filter, display_filter)
+        stop = offset + limit if limit is not None else None
+        
+        # Only the requested page is turned back into summaries
+        return summary_rows(summary, indices[offset:stop])
     
     except Exception as e:
         print(f"Error analyzing PCAP file: {e}")
         return []
 
+def matching_packet_indices(pcap_file, protocol_filter=None, ip_filter=None, port_filter=None,
+                            display_filter=None):
+    """
+    Return the indices of the packets that pass the packet list filters
+    
+    Args:
+        pcap_file (str): Path to the PCAP file
+        protocol_filter (str, optional): Filter by protocol
+        ip_filter (str, optional): Filter by IP address
+        port_filter (str, optional): Filter by port number
+        display_filter (str, optional): Filter expression
+        
+    Returns:
+        numpy.ndarray: Matching packet indices in capture order
+        
+    Raises:
+        FilterError: If any filter is not valid
+    """
+    summary = get_summary_index(pcap_file)
+    mask = filter_mask(summary, protocol_filter, ip_filter, port_filter, display_filter)
+    return np.flatnonzero(mask)
+
+def stream_packet_summaries(pcap_file, protocol_filter=None, ip_filter=None, port_filter=None, offset=0,
+                            limit=None, display_filter=None, batch_size=1000, sample=None, sample_seed=0):
+    """
+    Yield matching packet summaries one at a time
+    
+    Captures that already have a summary sidecar (or that need one to
+    evaluate a filter expression) are answered from it in batches.
+    Otherwise packets are summarized as they are read, so closing the
+    generator stops the dissection.
+    
+    Args:
+        pcap_file (str): Path to the PCAP file
+        protocol_filter (str, optional): Filter by protocol
+        ip_filter (str, optional): Filter by IP address
+        port_filter (str, optional): Filter by port number
+        offset (int, optional): Number of matching packets to skip
+        limit (int, optional): Maximum number of packets to yield
+        display_filter (str, optional): Filter expression
+        batch_size (int, optional): Rows rebuilt from the sidecar at a time
+        sample (str, optional): Only yield a sample of the matching packets
+        sample_seed (int, optional): Random seed for reservoir samples
+        
+    Yields:
+        dict: Packet summary
+    """
+    if sample:
+        yield from sampled_packet_summaries(pcap_file, sample, protocol_filter, ip_filter, port_filter, offset,
+                                            limit, display_filter, sample_seed)
+        return
+    
+    stop = offset + limit if limit is not None else None
+    summary = load_summary_index(pcap_file)
+    
+    if summary is None and not display_filter:
+        summaries = iter_packet_summaries(pcap_file, protocol_filter, ip_filter, port_filter)
+        try:
+            yield from itertools.islice(summaries, offset, stop)
+        finally:
+            summaries.close()
+        return
+    
+    if summary is None:
+        summary = get_summary_index(pcap_file)
+    
+    indices = matching_packet_indices(pcap_file, protocol_filter, ip_filter, port_filter, display_filter)[offset:stop]
+    for start in range(0, len(indices), batch_size):
+        yield from summary_rows(summary, indices[start:start + batch_size])
+
+def sampled_packet_summaries(pcap_file, sample, protocol_filter=None, ip_filter=None, port_filter=None,
+                             offset=0, limit=None, display_filter=None, seed=0):
+    """
+    Yield summaries of a sample of the matching packets
+    
+    Without filters the sample is chosen from the record-offset index
+    alone and only the selected records are read and summarized, so a
+    first look at a large capture does not wait for its summary index.
+    With filters, the sample is drawn from the matching packets of the
+    summary index. offset and limit page through the sample.
+    
+    Args:
+        pcap_file (str): Path to the PCAP file
+        sample (str): Sampling specification (see
+            utils.packet_sampling.parse_sample)
+        protocol_filter (str, optional): Filter by protocol
+        ip_filter (str, optional): Filter by IP address
+        port_filter (str, optional): Filter by port number
+        offset (int, optional): Number of sampled packets to skip
+        limit (int, optional): Maximum number of packets to yield
+        display_filter (str, optional): Filter expression
+        seed (int, optional): Random seed for reservoir samples
+        
+    Yields:
+        dict: Packet summary
+    """
+    mode, value = parse_sample(sample)
+    stop = offset + limit if limit is not None else None
+    
+    if protocol_filter or ip_filter or port_filter or display_filter:
+        summary = get_summary_index(pcap_file)
+        indices = matching_packet_indices(pcap_file, protocol_filter, ip_filter, port_filter, display_filter)
+        selected = sample_indices(indices, summary['time'][indices], mode, value, seed)
+        yield from summary_rows(summary, selected[offset:stop])
+        return
+    
+    indices = sample_records(pcap_file, mode, value, seed)[offset:stop]
+    summary = load_summary_index(pcap_file)
+    if summary is not None:
+        yield from summary_rows(summary, indices)
+        return
+    
+    index = get_record_index(pcap_file)
+    with open_capture(pcap_file) as mm:
+        for i in indices:
+            yield summarize_raw_record(read_record_at(mm, index, i), i)
+
+def get_summary_index(pcap_file, content_hash=None):
+    """
+    Return the columnar summary index of a capture
+    
+    The capture is dissected once into a sidecar file next to it; later
+    calls answer from the memory-mapped sidecar without scapy.
+    
+    Args:
+        pcap_file (str): Path to the PCAP file
+        content_hash (str, optional): SHA-256 of the capture, if already known
+        
+    Returns:
+        dict: Loaded summary index
+    """
+    summary = load_summary_index(pcap_file)
+    if summary is not None:
+        return summary
+
+    with _summary_build_locks_lock:
+        lock = _summary_build_locks.setdefault(os.path.abspath(pcap_file), threading.Lock())
+
+    # A request arriving while the background indexer builds the sidecar
+    # waits for it instead of dissecting the capture a second time
+    with lock:
+        summary = load_summary_index(pcap_file)
+        if summary is None:
+            write_summary_index(pcap_file, iter_timed_summaries(pcap_file), content_hash)
+            summary = load_summary_index(pcap_file)
+    return summary
+
+def iter_packet_summaries(pcap_file, protocol_filter=None, ip_filter=None, port_filter=None):
+    """
+    Lazily yield packet summaries from a PCAP file
+    
+    Records are read one at a time, so memory use stays flat regardless of
+    the size of the capture.
+    
+    Args:
+        pcap_file (str): Path to the PCAP file
+        protocol_filter (str, optional): Filter by protocol
+        ip_filter (str, optional): Filter by IP address
+        port_filter (str, optional): Filter by port number
+        
+    Yields:
+        dict: Packet summary
+    """
+    for _, packet_info in iter_timed_summaries(pcap_file):
+        if matches_filters(packet_info, protocol_filter, ip_filter, port_filter):
+            yield packet_info
+
+def follow_packet_summaries(pcap_file, start=None, protocol_filter=None, ip_filter=None, port_filter=None,
+                            poll_interval=1.0, max_batch=1000):
+    """
+    Yield batches of packets appended to a capture that is still being written
+    
+    The record index remembers the byte offset after the last complete
+    record, so each poll only scans and summarizes the new records.
+    
+    Args:
+        pcap_file (str): Path to the PCAP file
+        start (int, optional): First packet to send; defaults to the end of
+                               the capture at the time of the first poll
+        protocol_filter (str, optional): Filter by protocol
+        ip_filter (str, optional): Filter by IP address
+        port_filter (str, optional): Filter by port number
+        poll_interval (float, optional): Seconds between checks for new data
+        max_batch (int, optional): Largest number of packets read per batch
+        
+    Yields:
+        list: Matching packet summaries, empty when nothing new arrived
+    """
+    position = start
+    while True:
+        count = len(get_record_index(pcap_file)['offsets'])
+        if position is None or position > count:
+            position = count
+        
+        batch = []
+        stop = min(count, position + max_batch)
+        for i, record in iter_records(pcap_file, position, stop):
+            packet_info = summarize_raw_record(record, i)
+            if matches_filters(packet_info, protocol_filter, ip_filter, port_filter):
+                batch.append(packet_info)
+        position = stop
+        yield batch
+        
+        if position >= count:
+            time.sleep(poll_interval)
+
+def iter_timed_summaries(pcap_file, workers=None, min_chunk=None):
+    """
+    Lazily yield (timestamp, summary) pairs for every packet in a PCAP file
+    
+    Frames are summarized straight from their raw bytes by the fast-path
+    decoder; only frames it does not recognise are dissected with scapy.
+    The capture is read in windows of PARALLEL_WINDOW records. When a
+    window holds at least min_chunk frames that need scapy, they are
+    dissected by the shared worker processes while the next window is
+    decoded; packets are yielded back in capture order.
+    
+    Args:
+        pcap_file (str): Path to the PCAP file
+        workers (int, optional): Number of worker processes
+        min_chunk (int, optional): Minimum number of scapy frames per
+                                   worker task
+        
+    Yields:
+        tuple: Capture timestamp as a float and the packet summary
+    """
+    workers = workers or PARALLEL_WORKERS
+    min_chunk = min_chunk or PARALLEL_MIN_CHUNK
+    
+    if workers <= 1:
+        for i, record in iter_records(pcap_file):
+            yield record['time'], summarize_raw_record(record, i)
+        return
+    
+    index = get_record_index(pcap_file)
+    count = len(index['offsets'])
+    pending = collections.deque()
+    
+    with open_capture(pcap_file) as mm:
+        for start in range(0, count, PARALLEL_WINDOW):
+            window = []
+            fallbacks = []
+            for i in range(start, min(start + PARALLEL_WINDOW, count)):
+                record = read_record_at(mm, index, i)
+                window.append((record['time'], summarize_record(record['data'], record['linktype'], i,
+                                                                record['time'])))
+                if window[-1][1] is None:
+                    fallbacks.append(i)
+            
+            futures = []
+            if len(fallbacks) < min_chunk:
+                for i in fallbacks:
+                    window[i - start] = (window[i - start][0],
+                                         summarize_packet(dissect_record(read_record_at(mm, index, i)), i))
+            else:
+                pool = _get_dissect_pool(workers)
+                # One task per worker, unless that leaves tasks too small
+                chunk_size = max(min_chunk, -(-len(fallbacks) // workers))
+                try:
+                    for j in range(0, len(fallbacks), chunk_size):
+                        numbers = fallbacks[j:j + chunk_size]
+                        futures.append(pool.submit(_summarize_chunk, pcap_file,
+                                                   select_record_index(index, numbers), numbers))
+                except BrokenProcessPool:
+                    _discard_dissect_pool()
+                    raise
+            pending.append((start, window, futures))
+            
+            # Bound the number of windows held in memory
+            while len(pending) > 2 or (pending and all(future.done() for future in pending[0][2])):
+                yield from _finish_window(*pending.popleft())
+    
+    while pending:
+        yield from _finish_window(*pending.popleft())
+
+def _get_dissect_pool(workers):
+    """Return the shared worker pool, starting it on first use"""
+    global _dissect_pool
+    with _dissect_pool_lock:
+        if _dissect_pool is None:
+            _dissect_pool = ProcessPoolExecutor(max_workers=workers)
+        return _dissect_pool
+
+def _discard_dissect_pool():
+    """Forget a pool whose workers died, so the next build starts a new one"""
+    global _dissect_pool
+    with _dissect_pool_lock:
+        pool, _dissect_pool = _dissect_pool, None
+    if pool is not None:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+def _finish_window(start, window, futures):
+    """Fill in the summaries dissected by the workers and yield a window"""
+    for future in futures:
+        try:
+            summaries = future.result()
+        except BrokenProcessPool:
+            _discard_dissect_pool()
+            raise
+        for packet_info in summaries:
+            i = packet_info['index'] - start
+            window[i] = (window[i][0], packet_info)
+    yield from window
+
+def _summarize_chunk(pcap_file, index, numbers):
+    """Dissect the given records of a capture with scapy in a worker process"""
+    with open_capture(pcap_file) as mm:
+        return [summarize_packet(dissect_record(read_record_at(mm, index, i)), number)
+                for i, number in enumerate(numbers)]
+
+def summarize_raw_record(record, index):
+    """
+    Summarize a raw capture record, falling back to scapy when needed
+    
+    Args:
+        record (dict): Record returned by utils.pcap_index.read_record
+        index (int): Index of the packet in the capture
+        
+    Returns:
+        dict: Packet summary
+    """
+    packet_info = summarize_record(record['data'], record['linktype'], index, record['time'])
+    if packet_info is None:
+        packet_info = summarize_packet(dissect_record(record), index)
+    return packet_info
+
+def summarize_packet(packet, index):
+    """
+    Build the summary shown in the packet list for a single packet
+    
+    Args:
+        packet: Scapy packet
+        index (int): Index of the packet in the capture
+        
+    Returns:
+        dict: Packet summary
+    """
+    # Basic packet info
+    packet_info = {
+        'index': index,
+        'time': str(datetime.datetime.fromtimestamp(float(packet.time))),
+        'length': len(packet),
+        'protocol': 'Unknown',
+        'src': '',
+        'dst': '',
+        'info': ''
+    }
+    
+    # Ethernet layer
+    if Ether in packet:
+        packet_info['src_mac'] = packet[Ether].src
+        packet_info['dst_mac'] = packet[Ether].dst
+    
+    # IP layer
+    if IP in packet:
+        packet_info['src'] = packet[IP].src
+        packet_info['dst'] = packet[IP].dst
+        packet_info['protocol'] = 'IP'
+    
+    # TCP layer
+    if TCP in packet:
+        packet_info['src_port'] = packet[TCP].sport
+        packet_info['dst_port'] = packet[TCP].dport
+        packet_info['transport'] = 'TCP'
+        packet_info['protocol'] = 'TCP'
+        
+        # HTTP detection (simple heuristic)
+        if packet[TCP].dport == 80 or packet[TCP].sport == 80:
+            if Raw in packet and (b'HTTP/' in packet[Raw].load or b'GET ' in packet[Raw].load or b'POST ' in packet[Raw].load):
+                packet_info['protocol'] = 'HTTP'
+                packet_info['info'] = f"HTTP {packet[TCP].sport} → {packet[TCP].dport}"
+            else:
+                packet_info['info'] = f"TCP {packet[TCP].sport} → {packet[TCP].dport}"
+        # HTTPS detection
+        elif packet[TCP].dport == 443 or packet[TCP].sport == 443:
+            packet_info['protocol'] = 'HTTPS'
+            packet_info['info'] = f"HTTPS {packet[TCP].sport} → {packet[TCP].dport}"
+        else:
+            packet_info['info'] = f"TCP {packet[TCP].sport} → {packet[TCP].dport}"
+    
+    # UDP layer
+    elif UDP in packet:
+        packet_info['src_port'] = packet[UDP].sport
+        packet_info['dst_port'] = packet[UDP].dport
+        packet_info['transport'] = 'UDP'
+        packet_info['protocol'] = 'UDP'
+        packet_info['info'] = f"UDP {packet[UDP].sport} → {packet[UDP].dport}"
+    
+    # DNS layer
+    if DNS in packet:
+        packet_info['protocol'] = 'DNS'
+        if packet.haslayer(DNS) and packet[DNS].qr == 0:  # DNS query
+            query_name = packet[DNS].qd.qname.decode('utf-8', errors='ignore') if packet[DNS].qd else "unknown"
+            packet_info['info'] = f"DNS Query: {query_name}"
+        elif packet.haslayer(DNS) and packet[DNS].qr == 1:  # DNS response
+            query_name = packet[DNS].qd.qname.decode('utf-8', errors='ignore') if packet[DNS].qd else "unknown"
+            packet_info['info'] = f"DNS Response: {query_name}"
+    
+    # ICMP layer
+    elif ICMP in packet:
+        packet_info['protocol'] = 'ICMP'
+        packet_info['info'] = f"ICMP {packet[ICMP].type}/{packet[ICMP].code}"
+    
+    # ARP layer
+    elif ARP in packet:
+        packet_info['protocol'] = 'ARP'
+        if packet[ARP].op == 1:  # who-has (request)
+            packet_info['info'] = f"ARP Request: Who has {packet[ARP].pdst}? Tell {packet[ARP].psrc}"
+        elif packet[ARP].op == 2:  # is-at (response)
+            packet_info['info'] = f"ARP Response: {packet[ARP].psrc} is at {packet[ARP].hwsrc}"
+    
+    return packet_info
+
+def matches_filters(packet_info, protocol_filter=None, ip_filter=None, port_filter=None):
+    """
+    Check a packet summary against the protocol, IP and port filters
+    
+    Args:
+        packet_info (dict): Packet summary
+        protocol_filter (str, optional): Filter by protocol
+        ip_filter (str, optional): Filter by IP address or CIDR block
+        port_filter (str, optional): Filter by port number
+        
+    Returns:
+        bool: True if the packet passes all filters
+        
+    Raises:
+        FilterError: If the IP or port filter is not valid
+    """
+    if protocol_filter and packet_info['protocol'].lower() != protocol_filter.lower():
+        return False
+        
+    if ip_filter:
+        network = parse_network(ip_filter.strip())
+        addresses = [packet_info.get('src'), packet_info.get('dst')]
+        if not any(address and ipaddress.ip_address(address) in network for address in addresses):
+            return False
+        
+    if port_filter:
+        port = _parse_number(port_filter.strip())
+        if ('src_port' not in packet_info or packet_info['src_port'] != port) and \
+           ('dst_port' not in packet_info or packet_info['dst_port'] != port):
+            return False
+    
+    return True
+
+def dissect_record(record):
+    """
+    Dissect a raw capture record into a scapy packet
+    
+    Args:
+        record (dict): Record returned by utils.pcap_index.read_record
+        
+    Returns:
+        Packet: Scapy packet with its capture timestamp set
+    """
+    layer = conf.l2types.num2layer.get(record['linktype'], conf.raw_layer)
+    try:
+        packet = layer(record['data'])
+    except Exception:
+        # Frames scapy cannot dissect are kept as raw bytes, as rdpcap does
+        if conf.debug_dissector:
+            raise
+        packet = conf.raw_layer(record['data'])
+    packet.time = record['time']
+    packet.wirelen = record['wirelen']
+    return packet
+
 def get_packet_details(pcap_file, packet_index):
     """
     Get detailed information for a specific packet
@@ -130,184 +555,230 @@ def get_packet_details(pcap_file, packet_index):
         dict: Detailed packet information
     """
     try:
-        # Read the PCAP file
-        packets = rdpcap(pcap_file)
+        # Seek straight to the record instead of reading the whole file
+        record = read_record(pcap_file, packet_index)
         
-        if packet_index < 0 or packet_index >= len(packets):
+        if record is None:
             return {'error': 'Packet index out of range'}
         
-        packet = packets[packet_index]
+        packet = dissect_record(record)
         
-        # Create a detailed packet representation
-        details = {
-            'index': packet_index,
-            'time': str(datetime.datetime.fromtimestamp(float(packet.time))),
-            'length': len(packet),
-            'layers': []
-        }
+        return build_packet_details(packet, packet_index)
+    
+    except Exception as e:
+        print(f"Error getting packet details: {e}")
+        return {'error': str(e)}
+
+def get_packets_details(pcap_file, indices):
+    """
+    Get detailed information for several packets in one pass
+    
+    The capture is mapped once and the requested records are read in
+    ascending file order, instead of mapping the file again per packet.
+    
+    Args:
+        pcap_file (str): Path to the PCAP file
+        indices (iterable): Packet indices, in any order, possibly repeated
         
-        # Ethernet layer
-        if Ether in packet:
-            details['layers'].append({
-                'name': 'Ethernet',
-                'fields': {
-                    'Source MAC': packet[Ether].src,
-                    'Destination MAC': packet[Ether].dst,
-                    'Type': hex(packet[Ether].type)
-                }
-            })
-        
-        # IP layer
-        if IP in packet:
-            details['layers'].append({
-                'name': 'Internet Protocol',
-                'fields': {
-                    'Version': packet[IP].version,
-                    'IHL': packet[IP].ihl,
-                    'Total Length': packet[IP].len,
-                    'TTL': packet[IP].ttl,
-                    'Protocol': packet[IP].proto,
-                    'Source IP': packet[IP].src,
-                    'Destination IP': packet[IP].dst
-                }
-            })
-        
-        # TCP layer
-        if TCP in packet:
-            details['layers'].append({
-                'name': 'Transmission Control Protocol',
-                'fields': {
-                    'Source Port': packet[TCP].sport,
-                    'Destination Port': packet[TCP].dport,
-                    'Sequence Number': packet[TCP].seq,
-                    'Acknowledgment Number': packet[TCP].ack,
-                    'Data Offset': packet[TCP].dataofs,
-                    'Flags': {
-                        'FIN': packet[TCP].flags.F,
-                        'SYN': packet[TCP].flags.S,
-                        'RST': packet[TCP].flags.R,
-                        'PSH': packet[TCP].flags.P,
-                        'ACK': packet[TCP].flags.A,
-                        'URG': packet[TCP].flags.U
-                    },
-                    'Window Size': packet[TCP].window
-                }
-            })
-        
-        # UDP layer
-        elif UDP in packet:
-            details['layers'].append({
-                'name': 'User Datagram Protocol',
-                'fields': {
-                    'Source Port': packet[UDP].sport,
-                    'Destination Port': packet[UDP].dport,
-                    'Length': packet[UDP].len
-                }
-            })
-        
-        # DNS layer
-        if DNS in packet:
-            dns_info = {
-                'name': 'Domain Name System',
-                'fields': {
-                    'Transaction ID': packet[DNS].id,
-                    'Type': 'Query' if packet[DNS].qr == 0 else 'Response',
-                    'Opcode': packet[DNS].opcode,
-                    'Flags': {
-                        'QR': packet[DNS].qr,
-                        'AA': packet[DNS].aa,
-                        'TC': packet[DNS].tc,
-                        'RD': packet[DNS].rd,
-                        'RA': packet[DNS].ra
-                    }
+    Returns:
+        dict: Packet index -> detailed packet information (see
+              get_packet_details)
+    """
+    try:
+        index = get_record_index(pcap_file)
+        results = {}
+        
+        with open_capture(pcap_file) as mm:
+            for packet_index in sorted(set(indices)):
+                record = read_record_at(mm, index, packet_index) if packet_index >= 0 else None
+                if record is None:
+                    results[packet_index] = {'error': 'Packet index out of range'}
+                    continue
+                results[packet_index] = build_packet_details(dissect_record(record), packet_index)
+        
+        return results
+    
+    except Exception as e:
+        print(f"Error getting packet details: {e}")
+        return {'error': str(e)}
+
+def build_packet_details(packet, packet_index):
+    """
+    Describe the layers of a dissected packet
+    
+    Args:
+        packet (Packet): Scapy packet (see dissect_record)
+        packet_index (int): Index of the packet in the capture
+        
+    Returns:
+        dict: Detailed packet information
+    """
+    # Create a detailed packet representation
+    details = {
+        'index': packet_index,
+        'time': str(datetime.datetime.fromtimestamp(float(packet.time))),
+        'length': len(packet),
+        'layers': []
+    }
+    
+    # Ethernet layer
+    if Ether in packet:
+        details['layers'].append({
+            'name': 'Ethernet',
+            'fields': {
+                'Source MAC': packet[Ether].src,
+                'Destination MAC': packet[Ether].dst,
+                'Type': hex(packet[Ether].type)
+            }
+        })
+    
+    # IP layer
+    if IP in packet:
+        details['layers'].append({
+            'name': 'Internet Protocol',
+            'fields': {
+                'Version': packet[IP].version,
+                'IHL': packet[IP].ihl,
+                'Total Length': packet[IP].len,
+                'TTL': packet[IP].ttl,
+                'Protocol': packet[IP].proto,
+                'Source IP': packet[IP].src,
+                'Destination IP': packet[IP].dst
+            }
+        })
+    
+    # TCP layer
+    if TCP in packet:
+        details['layers'].append({
+            'name': 'Transmission Control Protocol',
+            'fields': {
+                'Source Port': packet[TCP].sport,
+                'Destination Port': packet[TCP].dport,
+                'Sequence Number': packet[TCP].seq,
+                'Acknowledgment Number': packet[TCP].ack,
+                'Data Offset': packet[TCP].dataofs,
+                'Flags': {
+                    'FIN': packet[TCP].flags.F,
+                    'SYN': packet[TCP].flags.S,
+                    'RST': packet[TCP].flags.R,
+                    'PSH': packet[TCP].flags.P,
+                    'ACK': packet[TCP].flags.A,
+                    'URG': packet[TCP].flags.U
                 },
-                'queries': [],
-                'answers': []
+                'Window Size': packet[TCP].window
             }
-            
-            # Extract queries
-            if packet[DNS].qd:
-                for i in range(packet[DNS].qdcount):
-                    try:
-                        qd = packet[DNS].qd
-                        query = {
-                            'name': qd.qname.decode('utf-8', errors='ignore'),
-                            'type': qd.qtype,
-                            'class': qd.qclass
-                        }
-                        dns_info['queries'].append(query)
-                    except:
-                        pass
-            
-            # Extract answers
-            if packet[DNS].an:
-                for i in range(packet[DNS].ancount):
-                    try:
-                        an = packet[DNS].an[i]
-                        answer = {
-                            'name': an.rrname.decode('utf-8', errors='ignore'),
-                            'type': an.type,
-                            'class': an.rclass,
-                            'ttl': an.ttl,
-                            'data': str(an.rdata)
-                        }
-                        dns_info['answers'].append(answer)
-                    except:
-                        pass
-            
-            details['layers'].append(dns_info)
-        
-        # ICMP layer
-        elif ICMP in packet:
-            details['layers'].append({
-                'name': 'Internet Control Message Protocol',
-                'fields': {
-                    'Type': packet[ICMP].type,
-                    'Code': packet[ICMP].code,
-                    'Checksum': packet[ICMP].chksum
-                }
-            })
-        
-        # ARP layer
-        elif ARP in packet:
-            details['layers'].append({
-                'name': 'Address Resolution Protocol',
-                'fields': {
-                    'Hardware Type': packet[ARP].hwtype,
-                    'Protocol Type': packet[ARP].ptype,
-                    'Hardware Size': packet[ARP].hwlen,
-                    'Protocol Size': packet[ARP].plen,
-                    'Operation': 'Request' if packet[ARP].op == 1 else 'Reply',
-                    'Sender MAC': packet[ARP].hwsrc,
-                    'Sender IP': packet[ARP].psrc,
-                    'Target MAC': packet[ARP].hwdst,
-                    'Target IP': packet[ARP].pdst
+        })
+    
+    # UDP layer
+    elif UDP in packet:
+        details['layers'].append({
+            'name': 'User Datagram Protocol',
+            'fields': {
+                'Source Port': packet[UDP].sport,
+                'Destination Port': packet[UDP].dport,
+                'Length': packet[UDP].len
+            }
+        })
+    
+    # DNS layer
+    if DNS in packet:
+        dns_info = {
+            'name': 'Domain Name System',
+            'fields': {
+                'Transaction ID': packet[DNS].id,
+                'Type': 'Query' if packet[DNS].qr == 0 else 'Response',
+                'Opcode': packet[DNS].opcode,
+                'Flags': {
+                    'QR': packet[DNS].qr,
+                    'AA': packet[DNS].aa,
+                    'TC': packet[DNS].tc,
+                    'RD': packet[DNS].rd,
+                    'RA': packet[DNS].ra
                 }
-            })
+            },
+            'queries': [],
+            'answers': []
+        }
         
-        # Raw payload
-        if Raw in packet:
-            try:
-                raw_data = packet[Raw].load
-                # Try to decode as text
+        # Extract queries
+        if packet[DNS].qd:
+            for i in range(packet[DNS].qdcount):
                 try:
-                    text_data = raw_data.decode('utf-8', errors='replace')
-                    details['layers'].append({
-                        'name': 'Payload (Text)',
-                        'data': text_data
-                    })
+                    qd = packet[DNS].qd
+                    query = {
+                        'name': qd.qname.decode('utf-8', errors='ignore'),
+                        'type': qd.qtype,
+                        'class': qd.qclass
+                    }
+                    dns_info['queries'].append(query)
                 except:
-                    # If decoding fails, show as hex
-                    hex_data = raw_data.hex()
-                    details['layers'].append({
-                        'name': 'Payload (Hex)',
-                        'data': hex_data
-                    })
-            except:
-                pass
+                    pass
         
-        return details
+        # Extract answers
+        if packet[DNS].an:
+            for i in range(packet[DNS].ancount):
+                try:
+                    an = packet[DNS].an[i]
+                    answer = {
+                        'name': an.rrname.decode('utf-8', errors='ignore'),
+                        'type': an.type,
+                        'class': an.rclass,
+                        'ttl': an.ttl,
+                        'data': str(an.rdata)
+                    }
+                    dns_info['answers'].append(answer)
+                except:
+                    pass
+        
+        details['layers'].append(dns_info)
     
-    except Exception as e:
-        print(f"Error getting packet details: {e}")
-        return {'error': str(e)}
+    # ICMP layer
+    elif ICMP in packet:
+        details['layers'].append({
+            'name': 'Internet Control Message Protocol',
+            'fields': {
+                'Type': packet[ICMP].type,
+                'Code': packet[ICMP].code,
+                'Checksum': packet[ICMP].chksum
+            }
+        })
+    
+    # ARP layer
+    elif ARP in packet:
+        details['layers'].append({
+            'name': 'Address Resolution Protocol',
+            'fields': {
+                'Hardware Type': packet[ARP].hwtype,
+                'Protocol Type': packet[ARP].ptype,
+                'Hardware Size': packet[ARP].hwlen,
+                'Protocol Size': packet[ARP].plen,
+                'Operation': 'Request' if packet[ARP].op == 1 else 'Reply',
+                'Sender MAC': packet[ARP].hwsrc,
+                'Sender IP': packet[ARP].psrc,
+                'Target MAC': packet[ARP].hwdst,
+                'Target IP': packet[ARP].pdst
+            }
+        })
+    
+    # Raw payload
+    if Raw in packet:
+        try:
+            raw_data = packet[Raw].load
+            # Try to decode as text
+            try:
+                text_data = raw_data.decode('utf-8', errors='replace')
+                details['layers'].append({
+                    'name': 'Payload (Text)',
+                    'data': text_data
+                })
+            except:
+                # If decoding fails, show as hex
+                hex_data = raw_data.hex()
+                details['layers'].append({
+                    'name': 'Payload (Hex)',
+                    'data': hex_data
+                })
+        except:
+            pass
+    
+    return details
@@ -0,0 +1,440 @@
+import socket
+import struct
+import datetime
+
+# Link types handled by the fast path
+LINKTYPE_ETHERNET = 1
+LINKTYPE_PPP = 9
+LINKTYPE_RAW = 101
+LINKTYPE_RAW_OPENBSD = 12
+LINKTYPE_IPV4 = 228
+LINKTYPE_IPV6 = 229
+
+ETHERTYPE_IPV4 = 0x0800
+ETHERTYPE_ARP = 0x0806
+ETHERTYPE_IPV6 = 0x86DD
+ETHERTYPE_VLAN = 0x8100
+
+PPP_IPV4 = 0x0021
+PPP_IPV6 = 0x0057
+
+IPPROTO_ICMP = 1
+IPPROTO_TCP = 6
+IPPROTO_UDP = 17
+IPPROTO_ICMPV6 = 58
+IPPROTO_NONE = 59
+
+# ICMP types whose payload is the header of the offending packet; scapy
+# dissects that header too, so these are left to the scapy path
+ICMP_ERROR_TYPES = {3, 4, 5, 11, 12}
+
+DNS_UDP_PORTS = {53, 5353}
+
+# Ports scapy binds to its own application layers. Packets where these
+# could change scapy's view of the payload are left to the scapy path.
+SCAPY_TCP_PORTS = {53, 88, 135, 139, 389, 445, 464, 1723, 2000, 3268}
+SCAPY_UDP_PORTS = {
+    53, 67, 68, 69, 88, 123, 137, 138, 161, 162, 389, 434, 464, 500, 520, 546, 547,
+    1701, 1812, 1813, 1985, 2029, 2055, 2056, 2727, 3799, 4500, 4754, 4789, 4790,
+    5353, 5355, 6343, 6633, 8472, 9995, 9996, 17754, 48879
+}
+# UDP ports that carry tunnelled IP traffic
+TUNNEL_UDP_PORTS = {1701, 4754, 4789, 4790, 6633, 8472, 48879}
+
+_ipv4_header = struct.Struct('!BBHHHBBH4s4s')
+_ipv6_header = struct.Struct('!IHBB16s16s')
+_tcp_header = struct.Struct('!HHIIBBH')
+_udp_header = struct.Struct('!HHH')
+_arp_header = struct.Struct('!HHBBH6s4s6s4s')
+_dns_header = struct.Struct('!HHHHHH')
+
+class Unsupported(Exception):
+    """Raised when a frame needs the full scapy dissector"""
+
+def decode_frame(data, linktype):
+    """
+    Decode the headers of a raw frame without scapy
+
+    Args:
+        data (bytes): Captured frame bytes
+        linktype (int): Link-layer type of the capture
+
+    Returns:
+        dict: Decoded header fields, or None if the frame uses something the
+              fast path does not handle and must go through scapy
+    """
+    frame = {'transport': None}
+    try:
+        _decode_link(data, linktype, frame)
+    except (Unsupported, struct.error, IndexError):
+        return None
+    return frame
+
+def payload_bounds(data, linktype):
+    """
+    Locate the transport payload of a raw frame
+
+    Unlike decode_frame this also works for frames that are otherwise left
+    to scapy, such as DNS or ICMP errors, since only the header lengths are
+    needed to find where the payload starts.
+
+    Args:
+        data (bytes): Captured frame bytes
+        linktype (int): Link-layer type of the capture
+
+    Returns:
+        tuple: Start and end offsets of the payload within data, or None if
+               the frame has no payload the decoder can locate
+    """
+    frame = {'transport': None}
+    try:
+        _decode_link(data, linktype, frame)
+    except (Unsupported, struct.error, IndexError):
+        pass
+    if 'payload_offset' not in frame:
+        return None
+    return frame['payload_offset'], frame['payload_end']
+
+def _decode_link(data, linktype, frame):
+    """Decode the link layer and dispatch to the network layer"""
+    if linktype == LINKTYPE_ETHERNET:
+        if len(data) < 14:
+            raise Unsupported()
+        frame['dst_mac'] = data[0:6].hex(':')
+        frame['src_mac'] = data[6:12].hex(':')
+        ethertype = (data[12] << 8) | data[13]
+        offset = 14
+        # 802.1Q tags are skipped, but counted for the protocol hierarchy
+        frame['vlan_tags'] = 0
+        while ethertype == ETHERTYPE_VLAN:
+            ethertype = (data[offset + 2] << 8) | data[offset + 3]
+            offset += 4
+            frame['vlan_tags'] += 1
+        if ethertype == ETHERTYPE_IPV4:
+            _decode_ipv4(data, offset, frame)
+        elif ethertype == ETHERTYPE_IPV6:
+            _decode_ipv6(data, offset, frame)
+        elif ethertype == ETHERTYPE_ARP:
+            _decode_arp(data, offset, frame)
+        else:
+            raise Unsupported()
+
+    elif linktype == LINKTYPE_PPP:
+        # 0xff starts an HDLC address field; otherwise the protocol field is
+        # one byte when its first byte is odd (protocol field compression)
+        if not data or data[0] == 0xFF:
+            raise Unsupported()
+        if data[0] & 1:
+            protocol, offset = data[0], 1
+        else:
+            protocol, offset = (data[0] << 8) | data[1], 2
+        if protocol == PPP_IPV4:
+            _decode_ipv4(data, offset, frame)
+        elif protocol == PPP_IPV6:
+            _decode_ipv6(data, offset, frame)
+        else:
+            raise Unsupported()
+
+    elif linktype in (LINKTYPE_RAW, LINKTYPE_RAW_OPENBSD):
+        version = data[0] >> 4
+        if version == 4:
+            _decode_ipv4(data, 0, frame)
+        elif version == 6:
+            _decode_ipv6(data, 0, frame)
+        else:
+            raise Unsupported()
+
+    elif linktype == LINKTYPE_IPV4:
+        _decode_ipv4(data, 0, frame)
+
+    elif linktype == LINKTYPE_IPV6:
+        _decode_ipv6(data, 0, frame)
+
+    else:
+        raise Unsupported()
+
+def _decode_ipv4(data, offset, frame):
+    """Decode an IPv4 header and its transport layer"""
+    (version_ihl, _, total_length, _, flags_frag, ttl, protocol, _,
+     src, dst) = _ipv4_header.unpack_from(data, offset)
+    header_length = (version_ihl & 0x0F) * 4
+    if version_ihl >> 4 != 4 or header_length < 20 or len(data) < offset + header_length:
+        raise Unsupported()
+
+    frame['ip_version'] = 4
+    frame['src'] = socket.inet_ntoa(src)
+    frame['dst'] = socket.inet_ntoa(dst)
+    frame['ttl'] = ttl
+    frame['ip_proto'] = protocol
+
+    # Bytes past the IP total length are link-layer padding
+    end = offset + total_length
+    if total_length < header_length or end > len(data):
+        end = len(data)
+    frame['ip_end'] = end
+
+    if flags_frag & 0x1FFF:
+        # Non-first fragments carry no transport header
+        frame['payload_offset'] = offset + header_length
+        frame['payload_end'] = end
+        raise Unsupported()
+
+    _decode_transport(data, offset + header_length, end, protocol, frame)
+
+def _decode_ipv6(data, offset, frame):
+    """Decode an IPv6 header and its transport layer"""
+    first_word, payload_length, next_header, hop_limit, src, dst = _ipv6_header.unpack_from(data, offset)
+    if first_word >> 28 != 6:
+        raise Unsupported()
+
+    frame['ip_version'] = 6
+    frame['src'] = socket.inet_ntop(socket.AF_INET6, src)
+    frame['dst'] = socket.inet_ntop(socket.AF_INET6, dst)
+    frame['ttl'] = hop_limit
+    frame['ip_proto'] = next_header
+
+    start = offset + 40
+    end = start + payload_length
+    if payload_length == 0 and next_header != IPPROTO_NONE:
+        raise Unsupported()
+    if end > len(data):
+        end = len(data)
+    frame['ip_end'] = end
+
+    if next_header == IPPROTO_ICMPV6:
+        frame['payload_offset'] = min(start + 8, end)
+        frame['payload_end'] = end
+        if data[start] < 128:
+            raise Unsupported()
+        frame['transport'] = 'icmpv6'
+        frame['icmp_type'] = data[start]
+        frame['icmp_code'] = data[start + 1]
+    elif next_header == IPPROTO_NONE:
+        pass
+    elif next_header in (IPPROTO_TCP, IPPROTO_UDP):
+        _decode_transport(data, start, end, next_header, frame)
+    else:
+        # Extension headers and other protocols
+        raise Unsupported()
+
+def _decode_transport(data, offset, end, protocol, frame):
+    """Decode a TCP, UDP or ICMP header found between offset and end"""
+    if protocol == IPPROTO_TCP:
+        if end - offset < 20:
+            raise Unsupported()
+        sport, dport, seq, ack, data_offset, flags, window = _tcp_header.unpack_from(data, offset)
+        header_length = (data_offset >> 4) * 4
+        if header_length < 20 or offset + header_length > end:
+            raise Unsupported()
+        frame['payload_offset'] = offset + header_length
+        frame['payload_end'] = end
+        if 53 in (sport, dport):
+            raise Unsupported()
+        if 80 in (sport, dport) and (sport in SCAPY_TCP_PORTS or dport in SCAPY_TCP_PORTS):
+            raise Unsupported()
+        frame['transport'] = 'tcp'
+        frame['sport'] = sport
+        frame['dport'] = dport
+        frame['seq'] = seq
+        frame['ack'] = ack
+        frame['tcp_flags'] = ((data_offset & 0x01) << 8) | flags
+        frame['window'] = window
+
+    elif protocol == IPPROTO_UDP:
+        if end - offset < 8:
+            raise Unsupported()
+        sport, dport, length = _udp_header.unpack_from(data, offset)
+        if length < 8:
+            raise Unsupported()
+        frame['payload_offset'] = offset + 8
+        frame['payload_end'] = min(offset + length, end)
+        if sport in TUNNEL_UDP_PORTS or dport in TUNNEL_UDP_PORTS:
+            raise Unsupported()
+        frame['transport'] = 'udp'
+        frame['sport'] = sport
+        frame['dport'] = dport
+
+        if sport in DNS_UDP_PORTS or dport in DNS_UDP_PORTS:
+            other_ports = {sport, dport} - DNS_UDP_PORTS
+            if other_ports & SCAPY_UDP_PORTS:
+                raise Unsupported()
+            _decode_dns(data, frame['payload_offset'], frame['payload_end'], frame)
+
+    elif protocol == IPPROTO_ICMP:
+        if end - offset < 8:
+            raise Unsupported()
+        frame['payload_offset'] = offset + 8
+        frame['payload_end'] = end
+        if data[offset] in ICMP_ERROR_TYPES:
+            raise Unsupported()
+        frame['transport'] = 'icmp'
+        frame['icmp_type'] = data[offset]
+        frame['icmp_code'] = data[offset + 1]
+
+    else:
+        raise Unsupported()
+
+def _decode_arp(data, offset, frame):
+    """Decode an Ethernet/IPv4 ARP packet"""
+    (hwtype, ptype, hwlen, plen, op, hwsrc, psrc,
+     hwdst, pdst) = _arp_header.unpack_from(data, offset)
+    if hwtype != 1 or ptype != ETHERTYPE_IPV4 or hwlen != 6 or plen != 4:
+        raise Unsupported()
+    frame['transport'] = 'arp'
+    frame['arp_op'] = op
+    frame['arp_hwsrc'] = hwsrc.hex(':')
+    frame['arp_psrc'] = socket.inet_ntoa(psrc)
+    frame['arp_hwdst'] = hwdst.hex(':')
+    frame['arp_pdst'] = socket.inet_ntoa(pdst)
+
+def _decode_dns(data, offset, end, frame):
+    """
+    Decode the DNS header and first question name
+
+    The whole message structure is walked so that anything scapy would fail
+    to parse is handed to the scapy path instead of being labelled DNS.
+    """
+    if end - offset < 12:
+        raise Unsupported()
+    dns_id, flags, qdcount, ancount, nscount, arcount = _dns_header.unpack_from(data, offset)
+
+    position = offset + 12
+    qname = None
+    for i in range(qdcount):
+        name, position = _read_dns_name(data, position, end, offset)
+        if i == 0:
+            qname = name
+        position += 4
+    for _ in range(ancount + nscount + arcount):
+        _, position = _read_dns_name(data, position, end, offset)
+        if position + 10 > end:
+            raise Unsupported()
+        rdlength = (data[position + 8] << 8) | data[position + 9]
+        position += 10 + rdlength
+    if position > end:
+        raise Unsupported()
+
+    frame['dns_id'] = dns_id
+    frame['dns_qr'] = flags >> 15
+    frame['dns_rcode'] = flags & 0x0F
+    frame['dns_qdcount'] = qdcount
+    frame['dns_ancount'] = ancount
+    frame['dns_qname'] = qname
+
+def _read_dns_name(data, position, end, message_offset):
+    """Read a (possibly compressed) DNS name, returning it and the next position"""
+    labels = []
+    next_position = None
+    jumps = 0
+    while True:
+        if position >= end:
+            raise Unsupported()
+        length = data[position]
+        if length == 0:
+            position += 1
+            break
+        if length & 0xC0 == 0xC0:
+            if position + 1 >= end or jumps > 32:
+                raise Unsupported()
+            if next_position is None:
+                next_position = position + 2
+            position = message_offset + (((length & 0x3F) << 8) | data[position + 1])
+            jumps += 1
+            continue
+        if length & 0xC0:
+            raise Unsupported()
+        labels.append(data[position + 1:position + 1 + length])
+        position += 1 + length
+
+    name = b'.'.join(labels) + b'.'
+    return name, next_position if next_position is not None else position
+
+def summarize_record(data, linktype, index, timestamp):
+    """
+    Build a packet list summary straight from raw frame bytes
+
+    Produces the same dictionary as packet_analyzer.summarize_packet.
+
+    Args:
+        data (bytes): Captured frame bytes
+        linktype (int): Link-layer type of the capture
+        index (int): Index of the packet in the capture
+        timestamp (float): Capture timestamp
+
+    Returns:
+        dict: Packet summary, or None if the frame must be dissected by scapy
+    """
+    frame = decode_frame(data, linktype)
+    if frame is None:
+        return None
+
+    packet_info = {
+        'index': index,
+        'time': str(datetime.datetime.fromtimestamp(timestamp)),
+        'length': len(data),
+        'protocol': 'Unknown',
+        'src': '',
+        'dst': '',
+        'info': ''
+    }
+
+    if 'src_mac' in frame:
+        packet_info['src_mac'] = frame['src_mac']
+        packet_info['dst_mac'] = frame['dst_mac']
+
+    if frame.get('ip_version') == 4:
+        packet_info['src'] = frame['src']
+        packet_info['dst'] = frame['dst']
+        packet_info['protocol'] = 'IP'
+
+    transport = frame['transport']
+    if transport == 'tcp':
+        sport, dport = frame['sport'], frame['dport']
+        packet_info['src_port'] = sport
+        packet_info['dst_port'] = dport
+        packet_info['transport'] = 'TCP'
+        packet_info['protocol'] = 'TCP'
+
+        if dport == 80 or sport == 80:
+            # scapy's Raw layer is the TCP payload, or the link padding when
+            # the segment carries no data
+            load = data[frame['payload_offset']:frame['payload_end']] or data[frame['ip_end']:]
+            if b'HTTP/' in load or b'GET ' in load or b'POST ' in load:
+                packet_info['protocol'] = 'HTTP'
+                packet_info['info'] = f"HTTP {sport} → {dport}"
+            else:
+                packet_info['info'] = f"TCP {sport} → {dport}"
+        elif dport == 443 or sport == 443:
+            packet_info['protocol'] = 'HTTPS'
+            packet_info['info'] = f"HTTPS {sport} → {dport}"
+        else:
+            packet_info['info'] = f"TCP {sport} → {dport}"
+
+    elif transport == 'udp':
+        packet_info['src_port'] = frame['sport']
+        packet_info['dst_port'] = frame['dport']
+        packet_info['transport'] = 'UDP'
+        packet_info['protocol'] = 'UDP'
+        packet_info['info'] = f"UDP {frame['sport']} → {frame['dport']}"
+
+    if 'dns_id' in frame:
+        packet_info['protocol'] = 'DNS'
+        qname = frame['dns_qname']
+        query_name = qname.decode('utf-8', errors='ignore') if qname is not None else "unknown"
+        if frame['dns_qr'] == 0:
+            packet_info['info'] = f"DNS Query: {query_name}"
+        else:
+            packet_info['info'] = f"DNS Response: {query_name}"
+
+    elif transport == 'icmp':
+        packet_info['protocol'] = 'ICMP'
+        packet_info['info'] = f"ICMP {frame['icmp_type']}/{frame['icmp_code']}"
+
+    elif transport == 'arp':
+        packet_info['protocol'] = 'ARP'
+        if frame['arp_op'] == 1:
+            packet_info['info'] = f"ARP Request: Who has {frame['arp_pdst']}? Tell {frame['arp_psrc']}"
+        elif frame['arp_op'] == 2:
+            packet_info['info'] = f"ARP Response: {frame['arp_psrc']} is at {frame['arp_hwsrc']}"
+
+    return packet_info
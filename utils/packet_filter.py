@@ -0,0 +1,330 @@
+import re
+import ipaddress
+
+import numpy as np
+
+from .summary_index import PROTOCOLS, HAS_IP, HAS_PORTS, IS_TCP, IS_UDP
+
+# Protocol keywords and the packet list protocols they cover
+PROTOCOL_WORDS = {
+    'http': {'HTTP'},
+    'https': {'HTTPS'},
+    'dns': {'DNS'},
+    'icmp': {'ICMP'},
+    'arp': {'ARP'}
+}
+
+# Transport keywords and the summary flag they test. Application protocols
+# count as their transport, e.g. 'tcp' also matches HTTP and DNS over TCP.
+TRANSPORT_WORDS = {
+    'tcp': IS_TCP,
+    'udp': IS_UDP
+}
+
+# Keywords are matched regardless of case
+OR_WORDS = ('or', '||')
+AND_WORDS = ('and', '&&')
+NOT_WORDS = ('not', '!')
+
+# Address fields and the columns they are compared against
+IP_FIELDS = {
+    'ip.src': ('src_ip',),
+    'ip.dst': ('dst_ip',),
+    'ip.addr': ('src_ip', 'dst_ip')
+}
+
+# Port fields: (summary flag the packet must have, columns)
+PORT_FIELDS = {
+    'port': (HAS_PORTS, ('src_port', 'dst_port')),
+    'tcp.port': (IS_TCP, ('src_port', 'dst_port')),
+    'tcp.srcport': (IS_TCP, ('src_port',)),
+    'tcp.dstport': (IS_TCP, ('dst_port',)),
+    'udp.port': (IS_UDP, ('src_port', 'dst_port')),
+    'udp.srcport': (IS_UDP, ('src_port',)),
+    'udp.dstport': (IS_UDP, ('dst_port',))
+}
+
+NUMBER_FIELDS = {
+    'frame.len': 'length'
+}
+
+COMPARISONS = {'==', '!=', '<', '<=', '>', '>=', 'in'}
+
+TOKEN_RE = re.compile(r'''
+    \s*(?:
+        (?P<op>==|!=|<=|>=|<|>|&&|\|\||!|\(|\))
+      | (?P<range>\d+\.\.\d+)
+      | (?P<word>[A-Za-z0-9_.:/-]+)
+    )''', re.VERBOSE)
+
+class FilterError(ValueError):
+    """Raised for filter expressions that cannot be parsed"""
+
+def compile_filter(expression):
+    """
+    Compile a display filter expression into a mask function
+
+    Supported syntax:
+        ip.src / ip.dst / ip.addr  ==, != or 'in' an address or CIDR block
+        port, tcp.port, tcp.srcport, tcp.dstport, udp.port, udp.srcport,
+        udp.dstport, frame.len  ==, !=, <, <=, >, >= a number, or 'in' a
+        range such as 80..443
+        tcp, udp, http, https, dns, icmp, arp, ip  protocol keywords
+        and / or / not (also && || !) and parentheses
+
+    Field names and keywords are case-insensitive.
+
+    Example: ip.src in 10.0.0.0/8 and tcp.port in 80..443 and not arp
+
+    Args:
+        expression (str): Filter expression
+
+    Returns:
+        callable: Function taking a loaded summary index and returning a
+                  boolean NumPy mask of matching packets
+    """
+    tokens = _tokenize(expression)
+    if not tokens:
+        return lambda summary: np.ones(summary['count'], dtype=bool)
+
+    parser = _Parser(tokens)
+    node = parser.parse_or()
+    if parser.position != len(tokens):
+        raise FilterError(f"Unexpected '{tokens[parser.position]}'")
+    return node
+
+def filter_mask(summary, protocol_filter=None, ip_filter=None, port_filter=None, display_filter=None):
+    """
+    Evaluate the packet list filters over the summary columns
+
+    Args:
+        summary (dict): Loaded summary index
+        protocol_filter (str, optional): Protocol as shown in the packet list
+        ip_filter (str, optional): Source or destination address or CIDR block
+        port_filter (str, optional): Source or destination port number
+        display_filter (str, optional): Filter expression (see compile_filter)
+
+    Returns:
+        numpy.ndarray: Boolean mask of matching packets
+    """
+    mask = np.ones(summary['count'], dtype=bool)
+
+    if protocol_filter:
+        mask &= _protocol_mask({name for name in PROTOCOLS if name.lower() == protocol_filter.lower()})(summary)
+
+    if ip_filter:
+        mask &= _ip_compare(IP_FIELDS['ip.addr'], '==', ip_filter.strip())(summary)
+
+    if port_filter:
+        mask &= _number_compare(*PORT_FIELDS['port'], '==', port_filter.strip())(summary)
+
+    if display_filter:
+        mask &= compile_filter(display_filter)(summary)
+
+    return mask
+
+def validate_filters(ip_filter=None, port_filter=None, display_filter=None):
+    """
+    Check the packet list filters before any packet is read
+
+    Args:
+        ip_filter (str, optional): Source or destination address or CIDR block
+        port_filter (str, optional): Source or destination port number
+        display_filter (str, optional): Filter expression (see compile_filter)
+
+    Raises:
+        FilterError: If any filter cannot be used
+    """
+    if ip_filter:
+        parse_network(ip_filter.strip())
+    if port_filter:
+        _parse_number(port_filter.strip())
+    if display_filter:
+        compile_filter(display_filter)
+
+def parse_network(value):
+    """
+    Parse an IPv4 address or CIDR block filter value
+
+    Args:
+        value (str): Address or CIDR block
+
+    Returns:
+        ipaddress.IPv4Network: The block, a single address being a /32
+
+    Raises:
+        FilterError: If the value is not an IPv4 address or block
+    """
+    try:
+        network = ipaddress.ip_network(value, strict=False)
+    except ValueError:
+        raise FilterError(f"Invalid address '{value}'")
+    if network.version != 4:
+        raise FilterError('Only IPv4 addresses can be filtered')
+    return network
+
+def _tokenize(expression):
+    """Split a filter expression into tokens"""
+    tokens = []
+    position = 0
+    expression = expression.strip()
+    while position < len(expression):
+        match = TOKEN_RE.match(expression, position)
+        if not match or match.end() == position:
+            raise FilterError(f"Unexpected character '{expression[position]}'")
+        tokens.append(match.group(match.lastgroup))
+        position = match.end()
+    return tokens
+
+class _Parser:
+    """Recursive-descent parser producing nested mask functions"""
+
+    def __init__(self, tokens):
+        self.tokens = tokens
+        self.position = 0
+
+    def peek(self):
+        if self.position < len(self.tokens):
+            return self.tokens[self.position]
+        return None
+
+    def peek_keyword(self):
+        token = self.peek()
+        return token.lower() if token is not None else None
+
+    def take(self):
+        token = self.peek()
+        if token is None:
+            raise FilterError('Unexpected end of filter')
+        self.position += 1
+        return token
+
+    def parse_or(self):
+        left = self.parse_and()
+        while self.peek_keyword() in OR_WORDS:
+            self.take()
+            right = self.parse_and()
+            left = _combine(np.logical_or, left, right)
+        return left
+
+    def parse_and(self):
+        left = self.parse_not()
+        while self.peek_keyword() in AND_WORDS:
+            self.take()
+            right = self.parse_not()
+            left = _combine(np.logical_and, left, right)
+        return left
+
+    def parse_not(self):
+        if self.peek_keyword() in NOT_WORDS:
+            self.take()
+            operand = self.parse_not()
+            return lambda summary: ~operand(summary)
+        return self.parse_atom()
+
+    def parse_atom(self):
+        token = self.take()
+        if token == '(':
+            node = self.parse_or()
+            if self.take() != ')':
+                raise FilterError("Missing ')'")
+            return node
+
+        field = token.lower()
+        if self.peek_keyword() in COMPARISONS:
+            operator = self.take().lower()
+            value = self.take()
+            return _comparison(field, operator, value)
+
+        if field == 'ip':
+            return _flag_mask(HAS_IP)
+        if field in TRANSPORT_WORDS:
+            return _flag_mask(TRANSPORT_WORDS[field])
+        if field in PROTOCOL_WORDS:
+            return _protocol_mask(PROTOCOL_WORDS[field])
+        raise FilterError(f"Unknown protocol or field '{token}'")
+
+def _combine(operation, left, right):
+    """Combine two mask functions with a NumPy logical operation"""
+    return lambda summary: operation(left(summary), right(summary))
+
+def _protocol_mask(names):
+    """Mask function matching packets whose protocol is one of names"""
+    codes = [code for code, name in enumerate(PROTOCOLS) if name in names]
+    return lambda summary: np.isin(summary['protocol'], codes)
+
+def _flag_mask(flag):
+    """Mask function matching packets whose summary has a flag set"""
+    return lambda summary: (summary['flags'] & flag) != 0
+
+def _comparison(field, operator, value):
+    """Build the mask function of a 'field operator value' comparison"""
+    if field in IP_FIELDS:
+        return _ip_compare(IP_FIELDS[field], operator, value)
+    if field in PORT_FIELDS:
+        flag, columns = PORT_FIELDS[field]
+        return _number_compare(flag, columns, operator, value)
+    if field in NUMBER_FIELDS:
+        return _number_compare(None, (NUMBER_FIELDS[field],), operator, value)
+    raise FilterError(f"Unknown field '{field}'")
+
+def _ip_compare(columns, operator, value):
+    """Mask function comparing address columns against an address or CIDR block"""
+    if operator not in ('==', '!=', 'in'):
+        raise FilterError(f"Operator '{operator}' cannot be used with addresses")
+    network = parse_network(value)
+
+    netmask = int(network.netmask)
+    address = int(network.network_address)
+
+    def mask(summary):
+        present = (summary['flags'] & HAS_IP) != 0
+        matches = np.zeros(summary['count'], dtype=bool)
+        for column in columns:
+            matches |= (summary[column] & netmask) == address
+        if operator == '!=':
+            return present & ~matches
+        return present & matches
+    return mask
+
+def _number_compare(flag, columns, operator, value):
+    """Mask function comparing numeric columns against a number or range"""
+    if operator == 'in':
+        bounds = value.split('..')
+        if len(bounds) != 2:
+            raise FilterError(f"Expected a range like 80..443, got '{value}'")
+        low, high = _parse_number(bounds[0]), _parse_number(bounds[1])
+    else:
+        number = _parse_number(value)
+
+    def compare(column):
+        if operator == 'in':
+            return (column >= low) & (column <= high)
+        if operator in ('==', '!='):
+            return column == number
+        if operator == '<':
+            return column < number
+        if operator == '<=':
+            return column <= number
+        if operator == '>':
+            return column > number
+        return column >= number
+
+    def mask(summary):
+        present = np.ones(summary['count'], dtype=bool)
+        if flag is not None:
+            present &= (summary['flags'] & flag) != 0
+
+        matches = np.zeros(summary['count'], dtype=bool)
+        for column in columns:
+            matches |= compare(summary[column])
+        if operator == '!=':
+            return present & ~matches
+        return present & matches
+    return mask
+
+def _parse_number(value):
+    """Parse a non-negative integer filter value"""
+    if not value.isdigit():
+        raise FilterError(f"Expected a number, got '{value}'")
+    return int(value)
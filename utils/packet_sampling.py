@@ -0,0 +1,137 @@
+import os
+import re
+import bisect
+
+import numpy as np
+
+from .pcap_index import get_record_index, open_capture, read_record_at
+
+# Largest number of packets a single sample may select
+MAX_SAMPLE_SIZE = int(os.getenv('PACKET_MAX_SAMPLE_SIZE', 100000))
+
+SAMPLE_MODES = {'every', 'reservoir', 'time'}
+
+# Units accepted by time sampling, in seconds
+TIME_UNITS = {'ms': 0.001, 's': 1.0, 'm': 60.0, 'h': 3600.0}
+
+_INTERVAL_RE = re.compile(r'^(\d+(?:\.\d*)?|\.\d+)(ms|s|m|h)?$')
+
+def parse_sample(spec):
+    """
+    Parse a sampling specification
+
+    Accepted forms are 'every:N' (every Nth packet), 'reservoir:K' (K
+    packets chosen uniformly at random) and 'time:INTERVAL' (the first
+    packet of each INTERVAL, e.g. '1s', '250ms', '5m').
+
+    Args:
+        spec (str): Sampling specification
+
+    Returns:
+        tuple: (mode, value), value being an int for every/reservoir and
+               the interval in seconds for time
+
+    Raises:
+        ValueError: If the specification is not valid
+    """
+    mode, _, value = spec.strip().partition(':')
+    mode = mode.lower()
+    if mode not in SAMPLE_MODES or not value:
+        raise ValueError("Sample must be 'every:N', 'reservoir:K' or 'time:INTERVAL'")
+
+    if mode == 'time':
+        match = _INTERVAL_RE.match(value.strip().lower())
+        if match is None or float(match.group(1)) <= 0:
+            raise ValueError(f"Invalid sampling interval '{value}'")
+        return mode, float(match.group(1)) * TIME_UNITS[match.group(2) or 's']
+
+    try:
+        number = int(value)
+    except ValueError:
+        number = 0
+    if number < 1:
+        raise ValueError(f"Invalid sample size '{value}'")
+    return mode, number
+
+def sample_records(pcap_file, mode, value, seed=0):
+    """
+    Choose the packets of a whole capture to sample, using the record index
+
+    Only the record-offset index is needed: every/reservoir samples are
+    computed from the packet count alone, and time samples binary-search
+    the timestamps of the records at each bucket boundary, so the
+    skipped packets are never read. Time sampling assumes timestamps
+    that do not go backwards, as written by capture tools.
+
+    Args:
+        pcap_file (str): Path to the PCAP/PCAPNG file
+        mode (str): Sampling mode (see parse_sample)
+        value: Sample parameter (see parse_sample)
+        seed (int, optional): Random seed for reservoir samples, so pages
+            of the same sample can be fetched separately
+
+    Returns:
+        Sequence of selected packet indices in capture order
+    """
+    index = get_record_index(pcap_file)
+    count = len(index['offsets'])
+
+    if mode == 'every':
+        return range(0, min(count, value * MAX_SAMPLE_SIZE), value)
+    if mode == 'reservoir':
+        return _reservoir(count, value, seed).tolist()
+
+    selected = []
+    with open_capture(pcap_file) as mm:
+        def record_time(i):
+            return read_record_at(mm, index, i)['time']
+
+        position = 0
+        while position < count and len(selected) < MAX_SAMPLE_SIZE:
+            selected.append(position)
+            boundary = _next_boundary(record_time(position), value)
+            position = bisect.bisect_left(range(count), boundary, lo=position + 1, key=record_time)
+    return selected
+
+def sample_indices(indices, times, mode, value, seed=0):
+    """
+    Choose a sample of already filtered packets
+
+    Args:
+        indices (numpy.ndarray): Packet indices in capture order
+        times (numpy.ndarray): Timestamps of those packets
+        mode (str): Sampling mode (see parse_sample)
+        value: Sample parameter (see parse_sample)
+        seed (int, optional): Random seed for reservoir samples
+
+    Returns:
+        numpy.ndarray: Selected packet indices in capture order
+    """
+    if mode == 'every':
+        return indices[::value][:MAX_SAMPLE_SIZE]
+    if mode == 'reservoir':
+        return indices[_reservoir(len(indices), value, seed)]
+
+    # First packet of each interval
+    if len(indices) == 0:
+        return indices
+    buckets = np.floor(times / value)
+    first = np.flatnonzero(np.concatenate(([True], buckets[1:] != buckets[:-1])))
+    return indices[first[:MAX_SAMPLE_SIZE]]
+
+def _reservoir(count, size, seed):
+    """
+    Choose positions uniformly at random without replacement
+
+    Filtered and unfiltered samples both draw through here, so the same
+    seed picks the same positions whichever path is taken.
+
+    Returns:
+        numpy.ndarray: Sorted positions in range(count)
+    """
+    size = min(size, count, MAX_SAMPLE_SIZE)
+    return np.sort(np.random.default_rng(seed).choice(count, size, replace=False))
+
+def _next_boundary(timestamp, interval):
+    """Return the start of the interval after the one containing timestamp"""
+    return (timestamp // interval + 1) * interval
@@ -0,0 +1,87 @@
+import gzip
+
+import msgpack
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+MSGPACK_MIMETYPE = 'application/msgpack'
+
+# Columns copied as they are; missing optional fields become None
+PLAIN_COLUMNS = ['index', 'time', 'length', 'src_port', 'dst_port', 'info']
+
+# Columns stored as positions in a shared string dictionary
+DICTIONARY_COLUMNS = {
+    'protocol': 'protocols',
+    'src': 'addresses',
+    'dst': 'addresses',
+    'src_mac': 'addresses',
+    'dst_mac': 'addresses'
+}
+
+# Responses smaller than this are not worth compressing
+COMPRESS_MIN_SIZE = 1024
+
+def encode_packet_columns(packets):
+    """
+    Convert packet summaries into a columnar, dictionary-encoded layout
+
+    Protocol names and addresses repeat across packets, so each distinct
+    string is sent once and the columns hold its position in the list.
+    A missing optional field is encoded as None.
+
+    Args:
+        packets (list): Packet summaries as returned by analyze_pcap
+
+    Returns:
+        dict: 'count', the string dictionaries and one list per column
+    """
+    dictionaries = {name: [] for name in set(DICTIONARY_COLUMNS.values())}
+    positions = {name: {} for name in dictionaries}
+    columns = {name: [] for name in PLAIN_COLUMNS + list(DICTIONARY_COLUMNS)}
+
+    for packet_info in packets:
+        for name in PLAIN_COLUMNS:
+            columns[name].append(packet_info.get(name))
+
+        for name, dictionary in DICTIONARY_COLUMNS.items():
+            value = packet_info.get(name)
+            if value is None:
+                columns[name].append(None)
+                continue
+            lookup = positions[dictionary]
+            code = lookup.get(value)
+            if code is None:
+                code = lookup[value] = len(dictionaries[dictionary])
+                dictionaries[dictionary].append(value)
+            columns[name].append(code)
+
+    encoded = {'count': len(packets)}
+    encoded.update(dictionaries)
+    encoded['columns'] = columns
+    return encoded
+
+def pack_packet_columns(packets):
+    """Encode packet summaries as columnar MessagePack (see encode_packet_columns)"""
+    return msgpack.packb(encode_packet_columns(packets), use_bin_type=True)
+
+def compress_body(body, accept_encoding):
+    """
+    Compress a response body with the best encoding the client accepts
+
+    Args:
+        body (bytes): Response body
+        accept_encoding: Parsed Accept-Encoding header of the request
+
+    Returns:
+        tuple: (body, Content-Encoding value or None)
+    """
+    if len(body) < COMPRESS_MIN_SIZE:
+        return body, None
+    if brotli is not None and 'br' in accept_encoding:
+        return brotli.compress(body, quality=5), 'br'
+    if 'gzip' in accept_encoding:
+        return gzip.compress(body, compresslevel=6), 'gzip'
+    return body, None
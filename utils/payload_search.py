@@ -0,0 +1,111 @@
+import re
+import datetime
+
+from .packet_decoder import payload_bounds
+from .pcap_index import get_record_index, open_capture, read_record_header
+
+# Bytes of context returned around each match
+CONTEXT_BYTES = 16
+
+# Longest match returned in full
+MAX_MATCH_BYTES = 256
+
+def compile_search(text=None, hex_bytes=None, regex=None, ignore_case=False):
+    """
+    Compile a payload search into a bytes regular expression
+
+    Exactly one of text, hex_bytes or regex must be given.
+
+    Args:
+        text (str, optional): Literal text, matched as UTF-8 bytes
+        hex_bytes (str, optional): Literal bytes as hex, e.g. 'deadbeef'
+        regex (str, optional): Regular expression over the raw bytes
+        ignore_case (bool, optional): Match ASCII letters case-insensitively
+
+    Returns:
+        re.Pattern: Compiled pattern
+
+    Raises:
+        ValueError: If the search is missing, ambiguous or invalid
+    """
+    given = [value for value in (text, hex_bytes, regex) if value]
+    if len(given) != 1:
+        raise ValueError('Give exactly one of text, hex or regex')
+
+    if text:
+        pattern = re.escape(text.encode('utf-8'))
+    elif hex_bytes:
+        try:
+            pattern = re.escape(bytes.fromhex(hex_bytes.replace(':', '').replace(' ', '')))
+        except ValueError:
+            raise ValueError(f"Invalid hex bytes '{hex_bytes}'")
+    else:
+        pattern = regex.encode('utf-8')
+
+    try:
+        compiled = re.compile(pattern, re.IGNORECASE if ignore_case else 0)
+    except re.error as e:
+        raise ValueError(f'Invalid regular expression: {e}')
+    if compiled.match(b''):
+        raise ValueError('The search must not match empty data')
+    return compiled
+
+def search_payloads(pcap_file, pattern, start=0, max_hits=None):
+    """
+    Yield the packets whose payload matches a pattern
+
+    Only the transport payload of each packet is searched, as located by
+    the header decoder, so a match can include neither protocol headers
+    nor link-layer padding, and anchors such as ^ and $ apply to the
+    payload. The payload is searched in place in the mapped capture.
+    Packets without a payload the decoder can locate (e.g. ARP) are
+    skipped. Each packet is reported at most once, at its first match.
+
+    Args:
+        pcap_file (str): Path to the PCAP/PCAPNG file
+        pattern (re.Pattern): Compiled bytes pattern (see compile_search)
+        start (int, optional): First packet to search
+        max_hits (int, optional): Stop after this many matching packets
+
+    Yields:
+        dict: Packet index and time, match offset within the packet data,
+              matched bytes and surrounding context as hex
+    """
+    index = get_record_index(pcap_file)
+    count = len(index['offsets'])
+    if start >= count or max_hits == 0:
+        return
+
+    hits = 0
+    with open_capture(pcap_file) as mm, memoryview(mm) as view:
+        for record_number in range(start, count):
+            record = read_record_header(mm, index, record_number)
+            data_offset = record['data_offset']
+            data_end = data_offset + record['caplen']
+
+            with view[data_offset:data_end] as data:
+                bounds = payload_bounds(data, record['linktype'])
+            if bounds is None or bounds[1] <= bounds[0]:
+                continue
+            payload_start = data_offset + bounds[0]
+
+            with view[payload_start:data_offset + bounds[1]] as payload:
+                match = pattern.search(payload)
+            if match is None or match.end() == match.start():
+                continue
+
+            match_start = payload_start + match.start()
+            match_end = payload_start + match.end()
+            yield {
+                'index': record_number,
+                'offset': match_start - data_offset,
+                'length': match_end - match_start,
+                'match': mm[match_start:min(match_end, match_start + MAX_MATCH_BYTES)].hex(),
+                'context': mm[max(match_start - CONTEXT_BYTES, data_offset):min(match_end + CONTEXT_BYTES,
+                                                                                    data_end)].hex(),
+                'time': str(datetime.datetime.fromtimestamp(record['time']))
+            }
+
+            hits += 1
+            if max_hits is not None and hits >= max_hits:
+                break
@@ -0,0 +1,99 @@
+import os
+import struct
+
+from .pcap_index import get_record_index, open_capture, PCAP_GLOBAL_HEADER_LEN, PCAP_RECORD_HEADER_LEN
+
+# Largest number of bytes handed to one os.sendfile call
+SENDFILE_CHUNK = 64 * 1024 * 1024
+
+def export_packets(pcap_file, indices, target):
+    """
+    Write the selected packets of a capture to a new capture file
+
+    Record bytes are copied unchanged from the source file, so the export
+    has the source's format, link types and timestamps, and re-exporting
+    every packet reproduces the source exactly. Runs of consecutive
+    records are copied as one byte range with os.sendfile where available,
+    or through memoryview slices of the mapped file otherwise.
+
+    For PCAPNG files, all non-packet blocks (section headers, interface
+    descriptions, statistics) are kept so the selected packets still refer
+    to valid interfaces.
+
+    Args:
+        pcap_file (str): Path to the source PCAP/PCAPNG file
+        indices: Packet indices to export, in ascending order
+        target: Binary file object to write the capture to
+
+    Returns:
+        int: Number of packets written
+    """
+    index = get_record_index(pcap_file)
+    ranges = _export_ranges(pcap_file, index, indices)
+
+    target_start = target.tell()
+    with open(pcap_file, 'rb') as source:
+        try:
+            for start, end in ranges:
+                _sendfile_range(source, target, start, end)
+        except (OSError, ValueError):
+            # sendfile to a regular file is not supported everywhere, and
+            # in-memory targets have no file descriptor
+            target.seek(target_start)
+            target.truncate()
+            with open_capture(pcap_file) as mm:
+                view = memoryview(mm)
+                try:
+                    for start, end in ranges:
+                        target.write(view[start:end])
+                finally:
+                    view.release()
+
+    return len(indices)
+
+def _sendfile_range(source, target, start, end):
+    """Copy source bytes start..end-1 to the end of target with os.sendfile"""
+    if not hasattr(os, 'sendfile'):
+        raise OSError('os.sendfile is not available')
+    target.flush()
+    while start < end:
+        sent = os.sendfile(target.fileno(), source.fileno(), start, min(end - start, SENDFILE_CHUNK))
+        if sent == 0:
+            raise OSError('os.sendfile copied no data')
+        start += sent
+    # sendfile moved the descriptor's position; keep the file object in step
+    target.seek(0, os.SEEK_END)
+
+def _export_ranges(pcap_file, index, indices):
+    """Return the coalesced (start, end) byte ranges making up the export"""
+    offsets = index['offsets']
+    ranges = []
+
+    def add(start, end):
+        if ranges and ranges[-1][1] == start:
+            ranges[-1][1] = end
+        elif end > start:
+            ranges.append([start, end])
+
+    with open_capture(pcap_file) as mm:
+        if index['format'] == 'pcap':
+            add(0, PCAP_GLOBAL_HEADER_LEN)
+            header = struct.Struct(index['endian'] + 'I')
+            for i in indices:
+                offset = offsets[i]
+                add(offset, offset + PCAP_RECORD_HEADER_LEN + header.unpack_from(mm, offset + 8)[0])
+            return ranges
+
+        # Everything between packet blocks is kept; packet blocks only if selected
+        selected = iter(indices)
+        wanted = next(selected, None)
+        position = 0
+        for i, offset in enumerate(offsets):
+            add(position, offset)
+            endian = index['interfaces'][index['record_interfaces'][i]][2]
+            position = offset + struct.unpack_from(endian + 'I', mm, offset + 4)[0]
+            if i == wanted:
+                add(offset, position)
+                wanted = next(selected, None)
+        add(position, index['end_offset'])
+    return ranges
@@ -0,0 +1,364 @@
+import os
+import mmap
+import struct
+import threading
+from array import array
+from contextlib import contextmanager
+
+# Magic numbers of the classic PCAP format: (byte order, timestamp resolution)
+PCAP_MAGICS = {
+    b'\xd4\xc3\xb2\xa1': ('<', 1000000),
+    b'\xa1\xb2\xc3\xd4': ('>', 1000000),
+    b'\x4d\x3c\xb2\xa1': ('<', 1000000000),
+    b'\xa1\xb2\x3c\x4d': ('>', 1000000000)
+}
+
+# PCAPNG block types
+PCAPNG_SHB = 0x0A0D0D0A
+PCAPNG_IDB = 0x00000001
+PCAPNG_OPB = 0x00000002
+PCAPNG_SPB = 0x00000003
+PCAPNG_EPB = 0x00000006
+PCAPNG_BYTE_ORDER_MAGIC = 0x1A2B3C4D
+
+PCAP_GLOBAL_HEADER_LEN = 24
+PCAP_RECORD_HEADER_LEN = 16
+
+# Leading bytes compared to tell an appended-to capture from a replaced one
+FILE_HEADER_CHECK_LEN = 64
+
+# Record indexes of recently used files, keyed by absolute path
+_index_cache = {}
+_index_lock = threading.Lock()
+
+def file_signature(pcap_file):
+    """Return a (mtime, size) tuple used to detect that a file has changed"""
+    stat = os.stat(pcap_file)
+    return (stat.st_mtime_ns, stat.st_size)
+
+def get_record_index(pcap_file):
+    """
+    Return the record-offset index of a capture, building it if needed
+
+    The index is built once per file and cached until the file's
+    modification time or size changes. When records have only been
+    appended, as with a capture that is still being written, just the new
+    records are scanned.
+
+    Args:
+        pcap_file (str): Path to the PCAP/PCAPNG file
+
+    Returns:
+        dict: Record index (see build_record_index)
+    """
+    path = os.path.abspath(pcap_file)
+    signature = file_signature(path)
+
+    with _index_lock:
+        index = _index_cache.get(path)
+        if index is not None and index['signature'] == signature:
+            return index
+        if index is not None and extend_record_index(path, index):
+            return index
+
+    index = build_record_index(path)
+
+    with _index_lock:
+        _index_cache[path] = index
+    return index
+
+def build_record_index(pcap_file):
+    """
+    Scan a capture once and record the file offset of every packet record
+
+    Only record headers are read; packet data is skipped over.
+
+    Args:
+        pcap_file (str): Path to the PCAP/PCAPNG file
+
+    Returns:
+        dict: Index with the capture format, link type information, an
+              array of record offsets and the offset after the last
+              complete record
+    """
+    index = {
+        'signature': file_signature(pcap_file),
+        'format': None,
+        'endian': '<',
+        'linktype': None,
+        'tsresol': 1000000,
+        'interfaces': [],
+        'record_interfaces': array('H'),
+        'offsets': array('Q'),
+        'end_offset': 0,
+        'section_base': 0,
+        'file_header': b''
+    }
+
+    with open(pcap_file, 'rb') as f:
+        magic = f.read(4)
+        if len(magic) < 4:
+            raise ValueError('File is too short to be a capture')
+
+        if magic in PCAP_MAGICS:
+            index['format'] = 'pcap'
+        elif struct.unpack('<I', magic)[0] == PCAPNG_SHB:
+            index['format'] = 'pcapng'
+        else:
+            raise ValueError('Not a PCAP or PCAPNG file')
+
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            index['file_header'] = mm[:FILE_HEADER_CHECK_LEN]
+            if index['format'] == 'pcap':
+                _scan_pcap(mm, index)
+            else:
+                _scan_pcapng(mm, index)
+
+    return index
+
+def extend_record_index(pcap_file, index):
+    """
+    Add the records appended to a capture since its index was built
+
+    Scanning resumes at the end of the last complete record, so the cost
+    is proportional to the new data. The index is updated in place.
+
+    Args:
+        pcap_file (str): Path to the PCAP/PCAPNG file
+        index (dict): Record index previously built for the file
+
+    Returns:
+        bool: True if the index was extended, False if the file was not
+              just appended to and must be indexed again
+    """
+    signature = file_signature(pcap_file)
+    if signature[1] < index['signature'][1] or signature[1] < index['end_offset']:
+        return False
+
+    with open(pcap_file, 'rb') as f:
+        if f.read(len(index['file_header'])) != index['file_header']:
+            return False
+        if signature[1] == 0:
+            return False
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            if index['format'] == 'pcap':
+                _scan_pcap(mm, index, index['end_offset'])
+            else:
+                _scan_pcapng(mm, index, index['end_offset'])
+
+    index['signature'] = signature
+    return True
+
+def select_record_index(index, numbers):
+    """
+    Return a copy of an index restricted to the given records
+
+    Record numbers in the selection start again at zero, in the order
+    given. Selections are small enough to hand to worker processes.
+    """
+    selected = dict(index)
+    selected['offsets'] = array(index['offsets'].typecode, (index['offsets'][n] for n in numbers))
+    if index['record_interfaces']:
+        selected['record_interfaces'] = array(index['record_interfaces'].typecode,
+                                              (index['record_interfaces'][n] for n in numbers))
+    return selected
+
+def _scan_pcap(mm, index, start=None):
+    """Collect record offsets of a classic PCAP file, from start if given"""
+    if start is None:
+        endian, tsresol = PCAP_MAGICS[mm[:4]]
+        if len(mm) < PCAP_GLOBAL_HEADER_LEN:
+            raise ValueError('Truncated PCAP global header')
+
+        index['endian'] = endian
+        index['tsresol'] = tsresol
+        index['linktype'] = struct.unpack_from(endian + 'I', mm, 20)[0] & 0x0FFFFFFF
+        start = PCAP_GLOBAL_HEADER_LEN
+
+    header = struct.Struct(index['endian'] + 'IIII')
+    offsets = index['offsets']
+    size = len(mm)
+    pos = start
+
+    while pos + PCAP_RECORD_HEADER_LEN <= size:
+        incl_len = header.unpack_from(mm, pos)[2]
+        end = pos + PCAP_RECORD_HEADER_LEN + incl_len
+        if end > size:
+            # Incomplete record at the end of the file
+            break
+        offsets.append(pos)
+        pos = end
+
+    index['end_offset'] = pos
+
+def _scan_pcapng(mm, index, start=0):
+    """Collect packet block offsets and interface descriptions of a PCAPNG file"""
+    offsets = index['offsets']
+    record_interfaces = index['record_interfaces']
+    interfaces = index['interfaces']
+    size = len(mm)
+    pos = start
+    endian = index['endian']
+    section_base = index['section_base']
+
+    while pos + 12 <= size:
+        block_type = struct.unpack_from(endian + 'I', mm, pos)[0]
+
+        if block_type == PCAPNG_SHB:
+            # Each section may use its own byte order and interface numbering
+            bom = mm[pos + 8:pos + 12]
+            endian = '<' if struct.unpack('<I', bom)[0] == PCAPNG_BYTE_ORDER_MAGIC else '>'
+            section_base = len(interfaces)
+
+        block_len = struct.unpack_from(endian + 'I', mm, pos + 4)[0]
+        if block_len < 12 or pos + block_len > size:
+            break
+
+        if block_type == PCAPNG_IDB:
+            linktype = struct.unpack_from(endian + 'H', mm, pos + 8)[0]
+            tsresol = _pcapng_tsresol(mm, pos + 16, pos + block_len - 4, endian)
+            interfaces.append((linktype, tsresol, endian))
+        elif block_type in (PCAPNG_EPB, PCAPNG_OPB):
+            if block_type == PCAPNG_EPB:
+                interface_id = struct.unpack_from(endian + 'I', mm, pos + 8)[0]
+            else:
+                interface_id = struct.unpack_from(endian + 'H', mm, pos + 8)[0]
+            offsets.append(pos)
+            record_interfaces.append(section_base + interface_id)
+        elif block_type == PCAPNG_SPB:
+            offsets.append(pos)
+            record_interfaces.append(section_base)
+
+        pos += block_len
+
+    index['endian'] = endian
+    index['section_base'] = section_base
+    index['end_offset'] = pos
+
+def _pcapng_tsresol(mm, pos, end, endian):
+    """Read the if_tsresol option of an interface description block"""
+    while pos + 4 <= end:
+        code, length = struct.unpack_from(endian + 'HH', mm, pos)
+        if code == 0:
+            break
+        if code == 9 and length >= 1:
+            value = mm[pos + 4]
+            if value & 0x80:
+                return 2 ** (value & 0x7F)
+            return 10 ** value
+        pos += 4 + ((length + 3) & ~3)
+    return 1000000
+
+def read_record_header(buf, index, record_number):
+    """
+    Read the header of one packet record without copying its data
+
+    Args:
+        buf: Memory-mapped capture file (see open_capture)
+        index (dict): Record index of the file
+        record_number (int): Index of the packet in the capture
+
+    Returns:
+        dict: Timestamp, lengths, link type and the offset of the packet
+              data in buf, or None if the record number is out of range
+    """
+    if record_number < 0 or record_number >= len(index['offsets']):
+        return None
+
+    offset = index['offsets'][record_number]
+
+    if index['format'] == 'pcap':
+        ts_sec, ts_frac, incl_len, orig_len = struct.unpack_from(index['endian'] + 'IIII', buf, offset)
+        return {
+            'time': (ts_sec * index['tsresol'] + ts_frac) / index['tsresol'],
+            'caplen': incl_len,
+            'wirelen': orig_len,
+            'linktype': index['linktype'],
+            'data_offset': offset + PCAP_RECORD_HEADER_LEN
+        }
+
+    linktype, tsresol, endian = index['interfaces'][index['record_interfaces'][record_number]]
+    block_type, block_len = struct.unpack_from(endian + 'II', buf, offset)
+
+    if block_type == PCAPNG_SPB:
+        orig_len = struct.unpack_from(endian + 'I', buf, offset + 8)[0]
+        caplen = min(orig_len, block_len - 16)
+        data_offset = offset + 12
+        timestamp = 0.0
+    elif block_type == PCAPNG_EPB:
+        _, ts_high, ts_low, caplen, orig_len = struct.unpack_from(endian + 'IIIII', buf, offset + 8)
+        data_offset = offset + 28
+        timestamp = ((ts_high << 32) | ts_low) / tsresol
+    else:
+        _, _, ts_high, ts_low, caplen, orig_len = struct.unpack_from(endian + 'HHIIII', buf, offset + 8)
+        data_offset = offset + 28
+        timestamp = ((ts_high << 32) | ts_low) / tsresol
+
+    return {
+        'time': timestamp,
+        'caplen': caplen,
+        'wirelen': orig_len,
+        'linktype': linktype,
+        'data_offset': data_offset
+    }
+
+def read_record_at(buf, index, record_number):
+    """
+    Read one packet record from a mapped capture using its index
+
+    Args:
+        buf: Memory-mapped capture file (see open_capture)
+        index (dict): Record index of the file
+        record_number (int): Index of the packet in the capture
+
+    Returns:
+        dict: Record data, timestamp, lengths and link type, or None if the
+              record number is out of range
+    """
+    record = read_record_header(buf, index, record_number)
+    if record is not None:
+        data_offset = record['data_offset']
+        record['data'] = buf[data_offset:data_offset + record['caplen']]
+    return record
+
+@contextmanager
+def open_capture(pcap_file):
+    """Memory-map a capture file for reading records"""
+    with open(pcap_file, 'rb') as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            yield mm
+
+def read_record(pcap_file, record_number):
+    """
+    Read a single packet record by seeking straight to its offset
+
+    Args:
+        pcap_file (str): Path to the PCAP/PCAPNG file
+        record_number (int): Index of the packet in the capture
+
+    Returns:
+        dict: Record (see read_record_at), or None if out of range
+    """
+    index = get_record_index(pcap_file)
+    with open_capture(pcap_file) as mm:
+        return read_record_at(mm, index, record_number)
+
+def iter_records(pcap_file, start=0, stop=None):
+    """
+    Yield (record number, record) pairs for a range of packets in a capture
+
+    Args:
+        pcap_file (str): Path to the PCAP/PCAPNG file
+        start (int, optional): First record number
+        stop (int, optional): Record number to stop before
+
+    Yields:
+        tuple: Record number and record (see read_record_at)
+    """
+    index = get_record_index(pcap_file)
+    count = len(index['offsets'])
+    stop = count if stop is None else min(stop, count)
+
+    with open_capture(pcap_file) as mm:
+        for record_number in range(start, stop):
+            yield record_number, read_record_at(mm, index, record_number)
@@ -0,0 +1,283 @@
+import os
+import json
+import socket
+import hashlib
+import datetime
+import tempfile
+import threading
+from array import array
+
+import numpy as np
+
+from .pcap_index import file_signature
+
+SUMMARY_SUFFIX = '.summary'
+SUMMARY_MAGIC = b'PKTSUM01'
+SUMMARY_VERSION = 2
+
+# Bytes reserved at the start of the sidecar for the magic and JSON header,
+# so the header can be rewritten in place without moving the columns
+HEADER_SIZE = 4096
+
+# Protocol names are stored as small integer codes
+PROTOCOLS = ['Unknown', 'IP', 'TCP', 'UDP', 'HTTP', 'HTTPS', 'DNS', 'ICMP', 'ARP']
+PROTOCOL_CODES = {name: code for code, name in enumerate(PROTOCOLS)}
+
+# Bits of the 'flags' column saying which optional summary fields are present
+HAS_IP = 0x01
+HAS_PORTS = 0x02
+HAS_MAC = 0x04
+
+# Bits of the 'flags' column naming the transport that carried the ports
+IS_TCP = 0x08
+IS_UDP = 0x10
+TRANSPORT_FLAGS = {'TCP': IS_TCP, 'UDP': IS_UDP}
+
+# Column name, array typecode used while building, NumPy dtype on disk
+SUMMARY_COLUMNS = [
+    ('time', 'd', '<f8'),
+    ('length', 'L', '<u4'),
+    ('protocol', 'B', 'u1'),
+    ('flags', 'B', 'u1'),
+    ('src_ip', 'L', '<u4'),
+    ('dst_ip', 'L', '<u4'),
+    ('src_port', 'H', '<u2'),
+    ('dst_port', 'H', '<u2'),
+    ('src_mac', 'Q', '<u8'),
+    ('dst_mac', 'Q', '<u8'),
+    ('info_offset', 'Q', '<u8')
+]
+
+# Loaded sidecars, keyed by absolute capture path
+_summary_cache = {}
+_summary_lock = threading.Lock()
+
+def sidecar_path(pcap_file):
+    """Return the path of the summary sidecar stored next to a capture"""
+    return pcap_file + SUMMARY_SUFFIX
+
+def hash_file(pcap_file, chunk_size=1024 * 1024):
+    """Return the SHA-256 hex digest of a file's content"""
+    digest = hashlib.sha256()
+    with open(pcap_file, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def write_summary_index(pcap_file, summaries, content_hash=None):
+    """
+    Write the columnar summary sidecar for a capture
+
+    Args:
+        pcap_file (str): Path to the PCAP file
+        summaries: Iterable of (timestamp, packet summary) pairs in capture order
+        content_hash (str, optional): SHA-256 of the capture, if already known
+
+    Returns:
+        str: Path of the sidecar file
+    """
+    signature = file_signature(pcap_file)
+    if content_hash is None:
+        content_hash = hash_file(pcap_file)
+
+    columns = {name: array(typecode) for name, typecode, _ in SUMMARY_COLUMNS}
+    info_blob = bytearray()
+    columns['info_offset'].append(0)
+
+    for timestamp, packet_info in summaries:
+        flags = 0
+        src_ip = dst_ip = src_port = dst_port = src_mac = dst_mac = 0
+
+        if packet_info.get('src'):
+            flags |= HAS_IP
+            src_ip = int.from_bytes(socket.inet_aton(packet_info['src']), 'big')
+            dst_ip = int.from_bytes(socket.inet_aton(packet_info['dst']), 'big')
+        if 'src_port' in packet_info:
+            flags |= HAS_PORTS | TRANSPORT_FLAGS.get(packet_info.get('transport'), 0)
+            src_port = packet_info['src_port']
+            dst_port = packet_info['dst_port']
+        if 'src_mac' in packet_info:
+            flags |= HAS_MAC
+            src_mac = _parse_mac(packet_info['src_mac'])
+            dst_mac = _parse_mac(packet_info.get('dst_mac'))
+
+        columns['time'].append(timestamp)
+        columns['length'].append(packet_info['length'])
+        columns['protocol'].append(PROTOCOL_CODES.get(packet_info['protocol'], 0))
+        columns['flags'].append(flags)
+        columns['src_ip'].append(src_ip)
+        columns['dst_ip'].append(dst_ip)
+        columns['src_port'].append(src_port)
+        columns['dst_port'].append(dst_port)
+        columns['src_mac'].append(src_mac)
+        columns['dst_mac'].append(dst_mac)
+
+        info_blob += packet_info['info'].encode('utf-8')
+        columns['info_offset'].append(len(info_blob))
+
+    header = {
+        'version': SUMMARY_VERSION,
+        'sha256': content_hash,
+        'mtime_ns': signature[0],
+        'size': signature[1],
+        'count': len(columns['time']),
+        'columns': {}
+    }
+
+    # Lay out the columns after the reserved header, 8-byte aligned
+    position = HEADER_SIZE
+    payloads = []
+    for name, _, dtype in SUMMARY_COLUMNS:
+        data = np.asarray(columns[name], dtype=dtype).tobytes()
+        header['columns'][name] = {'dtype': dtype, 'offset': position, 'length': len(columns[name])}
+        payloads.append(data)
+        position += (len(data) + 7) & ~7
+    header['columns']['info'] = {'dtype': 'u1', 'offset': position, 'length': len(info_blob)}
+    payloads.append(bytes(info_blob))
+
+    path = sidecar_path(pcap_file)
+    # A temporary file of our own, so concurrent writers cannot clobber it
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or '.', prefix=os.path.basename(path) + '.',
+                                    suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(_encode_header(header))
+            for data in payloads:
+                f.write(data)
+                f.write(b'\0' * (-len(data) % 8))
+
+        # Readers either see the old sidecar or the complete new one
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return path
+
+def _encode_header(header):
+    """Encode the sidecar header into its fixed-size slot"""
+    encoded = SUMMARY_MAGIC + json.dumps(header).encode('utf-8')
+    if len(encoded) > HEADER_SIZE:
+        raise ValueError('Summary header does not fit in the reserved space')
+    return encoded.ljust(HEADER_SIZE, b' ')
+
+def _read_header(path):
+    """Read the header of a sidecar file, or None if it is not usable"""
+    try:
+        with open(path, 'rb') as f:
+            raw = f.read(HEADER_SIZE)
+    except OSError:
+        return None
+
+    if not raw.startswith(SUMMARY_MAGIC):
+        return None
+    try:
+        header = json.loads(raw[len(SUMMARY_MAGIC):].decode('utf-8'))
+    except ValueError:
+        return None
+    if header.get('version') != SUMMARY_VERSION:
+        return None
+    return header
+
+def load_summary_index(pcap_file):
+    """
+    Open the summary sidecar of a capture as memory-mapped columns
+
+    A sidecar whose recorded mtime/size no longer matches the capture is
+    still accepted when the content hash is unchanged (for example after
+    the file was copied or touched); its header is then refreshed.
+
+    Args:
+        pcap_file (str): Path to the PCAP file
+
+    Returns:
+        dict: Column arrays keyed by name plus 'count', or None if there is
+              no valid sidecar for the current content of the capture
+    """
+    pcap_file = os.path.abspath(pcap_file)
+    path = sidecar_path(pcap_file)
+    signature = file_signature(pcap_file)
+
+    with _summary_lock:
+        summary = _summary_cache.get(pcap_file)
+        if summary is not None and summary['signature'] == signature:
+            return summary
+
+    header = _read_header(path)
+    if header is None:
+        return None
+
+    if (header['mtime_ns'], header['size']) != signature:
+        if header['size'] != signature[1] or hash_file(pcap_file) != header['sha256']:
+            return None
+        header['mtime_ns'], header['size'] = signature
+        with open(path, 'r+b') as f:
+            f.write(_encode_header(header))
+
+    summary = {'signature': signature, 'sha256': header['sha256'], 'count': header['count']}
+    for name, column in header['columns'].items():
+        if column['length'] == 0:
+            summary[name] = np.zeros(0, dtype=column['dtype'])
+        else:
+            summary[name] = np.memmap(path, dtype=column['dtype'], mode='r',
+                                      offset=column['offset'], shape=(column['length'],))
+
+    with _summary_lock:
+        _summary_cache[pcap_file] = summary
+    return summary
+
+def summary_rows(summary, indices):
+    """
+    Rebuild packet summaries for the given packet indices
+
+    Args:
+        summary (dict): Loaded summary index
+        indices: Iterable of packet indices
+
+    Returns:
+        list: List of packet summaries in the analyze_pcap format
+    """
+    rows = []
+    info_offset = summary['info_offset']
+    info = summary['info']
+
+    for i in indices:
+        i = int(i)
+        flags = int(summary['flags'][i])
+        packet_info = {
+            'index': i,
+            'time': str(datetime.datetime.fromtimestamp(float(summary['time'][i]))),
+            'length': int(summary['length'][i]),
+            'protocol': PROTOCOLS[summary['protocol'][i]],
+            'src': '',
+            'dst': '',
+            'info': bytes(info[info_offset[i]:info_offset[i + 1]]).decode('utf-8')
+        }
+        if flags & HAS_MAC:
+            packet_info['src_mac'] = _format_mac(summary['src_mac'][i])
+            packet_info['dst_mac'] = _format_mac(summary['dst_mac'][i])
+        if flags & HAS_IP:
+            packet_info['src'] = _format_ip(summary['src_ip'][i])
+            packet_info['dst'] = _format_ip(summary['dst_ip'][i])
+        if flags & HAS_PORTS:
+            packet_info['src_port'] = int(summary['src_port'][i])
+            packet_info['dst_port'] = int(summary['dst_port'][i])
+        if flags & IS_TCP:
+            packet_info['transport'] = 'TCP'
+        elif flags & IS_UDP:
+            packet_info['transport'] = 'UDP'
+        rows.append(packet_info)
+
+    return rows
+
+def _format_ip(value):
+    """Format an IPv4 address stored as an integer"""
+    return socket.inet_ntoa(int(value).to_bytes(4, 'big'))
+
+def _parse_mac(value):
+    """Store a MAC address as an integer; frames too short to carry one store zero"""
+    return int(value.replace(':', ''), 16) if value else 0
+
+def _format_mac(value):
+    """Format a MAC address stored as an integer"""
+    return ':'.join(f'{b:02x}' for b in int(value).to_bytes(6, 'big'))
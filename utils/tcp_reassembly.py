@@ -0,0 +1,535 @@
+import os
+import heapq
+import base64
+import bisect
+import datetime
+import tempfile
+import threading
+import collections
+from array import array
+
+from scapy.all import IP, TCP, Padding
+from scapy.layers.inet6 import IPv6
+
+from .pcap_index import file_signature, get_record_index, open_capture, read_record_at
+from .packet_decoder import decode_frame
+from .packet_analyzer import dissect_record
+from .flow_analyzer import get_flow_table, flow_key, TCP_SYN
+
+SEQ_MASK = 0xFFFFFFFF
+
+# Reassembled bytes kept per direction of a stream; later data is counted
+# but dropped
+STREAM_MAX_BYTES = int(os.getenv('PACKET_STREAM_MAX_BYTES', 64 * 1024 * 1024))
+
+# Bytes all streams being reassembled may hold in memory together. Past
+# this, stream data is spilled to temporary files.
+REASSEMBLY_MEMORY = int(os.getenv('PACKET_REASSEMBLY_MEMORY', 64 * 1024 * 1024))
+
+# Bytes one direction keeps in memory before spilling to disk
+STREAM_MEMORY_BYTES = 1024 * 1024
+
+# Out-of-order bytes one direction may hold while waiting for a missing
+# segment; past this the missing bytes are given up on
+STREAM_PENDING_BYTES = 2 * 1024 * 1024
+
+# Number of reassembled streams kept for paging through them
+MAX_CACHED_STREAMS = 4
+
+DIRECTIONS = ('client', 'server')
+
+# Reassembled streams, keyed by (absolute path, flow id), least recently used first
+_stream_cache = collections.OrderedDict()
+_stream_lock = threading.Lock()
+
+# Bytes currently held in memory by all reassembly buffers
+_memory_in_use = 0
+_memory_lock = threading.Lock()
+
+def _charge_memory(size):
+    """Account for size bytes held in memory, returning False when over budget"""
+    global _memory_in_use
+    with _memory_lock:
+        _memory_in_use += size
+        return _memory_in_use <= REASSEMBLY_MEMORY
+
+def _release_memory(size):
+    """Return size bytes to the reassembly memory budget"""
+    global _memory_in_use
+    with _memory_lock:
+        _memory_in_use -= size
+
+class StreamBuffer:
+    """
+    Reassemble one direction of a TCP connection
+
+    Segments may arrive out of order, be retransmitted or overlap. Bytes
+    already delivered win over later copies. In-order data is written to a
+    spooled temporary file that moves to disk once it outgrows its share of
+    the memory budget; out-of-order segments waiting for a missing one move
+    to a temporary file of their own when the budget runs out. Bytes that
+    never arrive are skipped and recorded in gaps.
+    """
+
+    def __init__(self, on_deliver=None, max_bytes=STREAM_MAX_BYTES):
+        self.sink = tempfile.SpooledTemporaryFile(max_size=STREAM_MEMORY_BYTES)
+        self.on_deliver = on_deliver
+        self.max_bytes = max_bytes
+        self.next_seq = None
+        self.delivered = 0
+        self.stored = 0
+        self.in_memory = 0
+        self.spilled = False
+        # Pending segments by position: (payload, packet, length, spool
+        # offset), with payload None once it has been spilled
+        self.pending = {}
+        self.pending_heap = []
+        self.pending_bytes = 0
+        self.pending_in_memory = 0
+        self.pending_spool = None
+        self.pending_spool_end = 0
+        self.gaps = []
+        self.segments = 0
+        self.retransmitted_bytes = 0
+        self.overlap_bytes = 0
+        self.out_of_order = 0
+        self.missing_bytes = 0
+        self.truncated = False
+
+    def add(self, seq, flags, payload, packet=None):
+        """
+        Add one segment of this direction
+
+        Args:
+            seq (int): TCP sequence number of the segment
+            flags (int): TCP flags of the segment
+            payload (bytes): Segment payload
+            packet (int, optional): Packet number, passed to on_deliver
+        """
+        if flags & TCP_SYN:
+            # The SYN occupies one sequence number before the data
+            seq = (seq + 1) & SEQ_MASK
+            if self.next_seq is None or self.delivered == 0:
+                self.next_seq = seq
+        if self.next_seq is None:
+            self.next_seq = seq
+        if not payload:
+            return
+        self.segments += 1
+
+        # Position relative to the next expected byte, allowing for
+        # sequence number wrap-around
+        difference = (seq - self.next_seq) & SEQ_MASK
+        if difference >= 0x80000000:
+            difference -= 0x100000000
+        position = self.delivered + difference
+        end = position + len(payload)
+
+        if end <= self.delivered:
+            self.retransmitted_bytes += len(payload)
+            return
+        if position < self.delivered:
+            self.overlap_bytes += self.delivered - position
+            payload = payload[self.delivered - position:]
+            position = self.delivered
+
+        if position == self.delivered:
+            self._deliver(payload, packet)
+            self._drain()
+            return
+
+        existing = self.pending.get(position)
+        if existing is not None:
+            if existing[2] >= len(payload):
+                self.retransmitted_bytes += len(payload)
+                return
+            self._drop_pending(position)
+        self.out_of_order += 1
+        self.pending[position] = (payload, packet, len(payload), None)
+        heapq.heappush(self.pending_heap, position)
+        self.pending_bytes += len(payload)
+        self.pending_in_memory += len(payload)
+        within_budget = _charge_memory(len(payload))
+
+        if self.pending_bytes > STREAM_PENDING_BYTES:
+            self._skip_gap()
+        elif not within_budget:
+            self._spill_pending()
+
+    def finish(self):
+        """Deliver everything still waiting behind missing segments"""
+        while self.pending:
+            self._skip_gap()
+
+    def read(self, offset, size):
+        """Read reassembled bytes of this direction"""
+        self.sink.seek(offset)
+        return self.sink.read(size)
+
+    def close(self):
+        """Discard the buffered data and return its memory to the budget"""
+        _release_memory(self.in_memory + self.pending_in_memory)
+        self.in_memory = self.pending_bytes = self.pending_in_memory = 0
+        self.pending.clear()
+        if self.pending_spool is not None:
+            self.pending_spool.close()
+        self.sink.close()
+
+    def stats(self):
+        """Counters describing how the stream was reassembled"""
+        return {
+            'bytes': self.delivered,
+            'stored_bytes': self.stored,
+            'segments': self.segments,
+            'retransmitted_bytes': self.retransmitted_bytes,
+            'overlap_bytes': self.overlap_bytes,
+            'out_of_order_segments': self.out_of_order,
+            'missing_bytes': self.missing_bytes,
+            'gaps': [{'offset': offset, 'length': length} for offset, length in self.gaps],
+            'truncated': self.truncated,
+            'spilled_to_disk': self.spilled
+        }
+
+    def _deliver(self, payload, packet):
+        """Append in-order bytes to the stream"""
+        offset = self.stored
+        self.delivered += len(payload)
+        self.next_seq = (self.next_seq + len(payload)) & SEQ_MASK
+
+        room = self.max_bytes - self.stored
+        if room < len(payload):
+            self.truncated = True
+            payload = payload[:max(room, 0)]
+        if not payload:
+            return
+
+        if not self.spilled:
+            within_budget = _charge_memory(len(payload))
+            self.in_memory += len(payload)
+            if not within_budget or self.in_memory > STREAM_MEMORY_BYTES:
+                self.sink.rollover()
+                _release_memory(self.in_memory)
+                self.in_memory = 0
+                self.spilled = True
+
+        # Reads move the file position, so always append at the end
+        self.sink.seek(self.stored)
+        self.sink.write(payload)
+        self.stored += len(payload)
+        if self.on_deliver is not None:
+            self.on_deliver(offset, len(payload), packet)
+
+    def _drain(self):
+        """Deliver pending segments that have become contiguous"""
+        while self.pending_heap and self.pending_heap[0] <= self.delivered:
+            position = heapq.heappop(self.pending_heap)
+            if position not in self.pending:
+                continue
+            payload, packet = self._drop_pending(position)
+            end = position + len(payload)
+            if end <= self.delivered:
+                self.retransmitted_bytes += len(payload)
+                continue
+            if position < self.delivered:
+                self.overlap_bytes += self.delivered - position
+                payload = payload[self.delivered - position:]
+            self._deliver(payload, packet)
+
+    def _drop_pending(self, position):
+        """Remove a pending segment, returning it"""
+        payload, packet, length, spool_offset = self.pending.pop(position)
+        self.pending_bytes -= length
+        if payload is None:
+            self.pending_spool.seek(spool_offset)
+            payload = self.pending_spool.read(length)
+        else:
+            self.pending_in_memory -= length
+            _release_memory(length)
+        if not self.pending:
+            # Nothing refers to the spilled segments any more
+            self.pending_spool_end = 0
+        return payload, packet
+
+    def _spill_pending(self):
+        """Move the pending segments held in memory to a temporary file"""
+        if self.pending_spool is None:
+            self.pending_spool = tempfile.TemporaryFile()
+        for position, (payload, packet, length, _) in self.pending.items():
+            if payload is None:
+                continue
+            self.pending_spool.seek(self.pending_spool_end)
+            self.pending_spool.write(payload)
+            self.pending[position] = (None, packet, length, self.pending_spool_end)
+            self.pending_spool_end += length
+        _release_memory(self.pending_in_memory)
+        self.pending_in_memory = 0
+        self.spilled = True
+
+    def _skip_gap(self):
+        """Give up on the bytes missing before the first pending segment"""
+        while self.pending_heap and self.pending_heap[0] not in self.pending:
+            heapq.heappop(self.pending_heap)
+        if not self.pending_heap:
+            return
+        position = self.pending_heap[0]
+        self.missing_bytes += position - self.delivered
+        # Offset in the reassembled data where the missing bytes belong
+        self.gaps.append((self.stored, position - self.delivered))
+        self.next_seq = (self.next_seq + position - self.delivered) & SEQ_MASK
+        self.delivered = position
+        self._drain()
+
+def tcp_segment(record):
+    """
+    Extract the TCP header fields and payload of a capture record
+
+    Args:
+        record (dict): Record returned by utils.pcap_index.read_record
+
+    Returns:
+        tuple: (src, sport, dst, dport, seq, flags, payload), or None for
+               packets that are not TCP
+    """
+    frame = decode_frame(record['data'], record['linktype'])
+    if frame is not None:
+        if frame['transport'] != 'tcp':
+            return None
+        payload = bytes(record['data'][frame['payload_offset']:frame['payload_end']])
+        return (frame['src'], frame['sport'], frame['dst'], frame['dport'], frame['seq'],
+                frame['tcp_flags'], payload)
+
+    packet = dissect_record(record)
+    if TCP not in packet:
+        return None
+    if IP in packet:
+        ip_layer = packet[IP]
+    elif IPv6 in packet:
+        ip_layer = packet[IPv6]
+    else:
+        return None
+    tcp = packet[TCP]
+    payload = bytes(tcp.payload)
+    if Padding in tcp:
+        payload = payload[:len(payload) - len(bytes(tcp[Padding]))]
+    return (ip_layer.src, tcp.sport, ip_layer.dst, tcp.dport, tcp.seq, int(tcp.flags), payload)
+
+def get_reassembled_stream(pcap_file, flow_id):
+    """
+    Return the reassembled TCP stream of a flow, reassembling it if needed
+
+    The most recently used streams are kept so that paging through them
+    does not read the capture again. The caller holds a reference to the
+    returned stream and must hand it back with release_stream once done
+    reading; a stream evicted meanwhile is only closed after that.
+
+    Args:
+        pcap_file (str): Path to the PCAP file
+        flow_id (int): Flow id as listed by /packet/api/flows
+
+    Returns:
+        dict: Stream (see reassemble_flow), or None if the flow does not
+              exist or is not TCP
+    """
+    path = os.path.abspath(pcap_file)
+    signature = file_signature(path)
+    cache_key = (path, flow_id)
+
+    with _stream_lock:
+        stream = _stream_cache.get(cache_key)
+        if stream is not None and stream['signature'] == signature:
+            _stream_cache.move_to_end(cache_key)
+            stream['readers'] += 1
+            return stream
+
+    flows = get_flow_table(path)
+    if flow_id < 0 or flow_id >= len(flows) or flows[flow_id]['protocol'] != 'TCP':
+        return None
+    stream = reassemble_flow(path, flows[flow_id])
+    stream['signature'] = signature
+
+    stream['readers'] = 1
+
+    unused = []
+    with _stream_lock:
+        evicted = [_stream_cache.pop(cache_key, None)]
+        _stream_cache[cache_key] = stream
+        while len(_stream_cache) > MAX_CACHED_STREAMS:
+            evicted.append(_stream_cache.popitem(last=False)[1])
+        for old in evicted:
+            if old is not None:
+                old['evicted'] = True
+                if old['readers'] == 0:
+                    unused.append(old)
+    for old in unused:
+        _close_stream(old)
+    return stream
+
+def release_stream(stream):
+    """Drop a reference taken by get_reassembled_stream, closing the stream if it was evicted"""
+    with _stream_lock:
+        stream['readers'] -= 1
+        close = stream['evicted'] and stream['readers'] == 0
+    if close:
+        _close_stream(stream)
+
+def _close_stream(stream):
+    """Close both buffers of a stream no request is reading"""
+    with stream['lock']:
+        for buffer in stream['buffers']:
+            buffer.close()
+
+def reassemble_flow(pcap_file, flow):
+    """
+    Reassemble both directions of a TCP flow
+
+    Only the packets between the flow's first and last packet are read.
+
+    Args:
+        pcap_file (str): Path to the PCAP file
+        flow (dict): Flow table entry (see flow_analyzer.build_flow_table)
+
+    Returns:
+        dict: Stream with one StreamBuffer per direction and the order in
+              which their bytes appeared in the conversation
+    """
+    chunks = {
+        'start': array('Q'),
+        'direction': array('B'),
+        'offset': array('Q'),
+        'length': array('Q'),
+        'packet': array('Q')
+    }
+    total = [0]
+
+    def on_deliver(direction):
+        def record_chunk(offset, length, packet):
+            # Contiguous data in the same direction extends the last chunk
+            if chunks['direction'] and chunks['direction'][-1] == direction and \
+                    chunks['offset'][-1] + chunks['length'][-1] == offset:
+                chunks['length'][-1] += length
+            else:
+                chunks['start'].append(total[0])
+                chunks['direction'].append(direction)
+                chunks['offset'].append(offset)
+                chunks['length'].append(length)
+                chunks['packet'].append(packet)
+            total[0] += length
+        return record_chunk
+
+    buffers = (StreamBuffer(on_deliver(0)), StreamBuffer(on_deliver(1)))
+    client = (flow['src'], flow['src_port'])
+
+    index = get_record_index(pcap_file)
+    with open_capture(pcap_file) as mm:
+        for record_number in range(flow['first_packet'], flow['last_packet'] + 1):
+            segment = tcp_segment(read_record_at(mm, index, record_number))
+            if segment is None:
+                continue
+            src, sport, dst, dport, seq, flags, payload = segment
+            if flow_key('TCP', src, sport, dst, dport) != flow['key']:
+                continue
+            direction = 0 if (src, sport) == client else 1
+            buffers[direction].add(seq, flags, payload, record_number)
+
+    for buffer in buffers:
+        buffer.finish()
+
+    return {
+        'flow': flow,
+        'buffers': buffers,
+        'chunks': chunks,
+        'total': total[0],
+        'lock': threading.Lock(),
+        'readers': 0,
+        'evicted': False
+    }
+
+def read_stream_page(stream, offset=0, limit=65536):
+    """
+    Read a page of a reassembled conversation
+
+    The conversation is the bytes of both directions in the order they
+    were sent, split into segments wherever the direction changes.
+
+    Args:
+        stream (dict): Stream returned by get_reassembled_stream, not yet
+            released
+        offset (int, optional): Byte offset into the conversation
+        limit (int, optional): Maximum number of bytes to return
+
+    Returns:
+        tuple: (list of (direction, conversation offset, packet, bytes),
+               offset of the next page or None)
+    """
+    chunks = stream['chunks']
+    segments = []
+    end = min(offset + limit, stream['total'])
+
+    with stream['lock']:
+        position = max(bisect.bisect_right(chunks['start'], offset) - 1, 0)
+        while position < len(chunks['start']) and offset < end:
+            start = chunks['start'][position]
+            skip = offset - start
+            size = min(chunks['length'][position] - skip, end - offset)
+            if size > 0:
+                direction = chunks['direction'][position]
+                data = stream['buffers'][direction].read(chunks['offset'][position] + skip, size)
+                segments.append((direction, offset, chunks['packet'][position], data))
+                offset += size
+            position += 1
+
+    return segments, (offset if offset < stream['total'] else None)
+
+def get_stream(pcap_file, flow_id, offset=0, limit=65536, encoding='text'):
+    """
+    Follow a TCP stream: get a page of its reassembled bytes
+
+    Args:
+        pcap_file (str): Path to the PCAP file
+        flow_id (int): Flow id as listed by /packet/api/flows
+        offset (int, optional): Byte offset into the conversation
+        limit (int, optional): Maximum number of bytes to return
+        encoding (str, optional): 'text', 'hex' or 'base64'
+
+    Returns:
+        dict: Flow endpoints, reassembly counters and the page's segments
+    """
+    try:
+        stream = get_reassembled_stream(pcap_file, flow_id)
+        if stream is None:
+            return {'error': 'No TCP flow with this id'}
+
+        try:
+            segments, next_offset = read_stream_page(stream, offset, limit)
+            flow = stream['flow']
+            return {
+                'flow_id': flow_id,
+                'client': f"{flow['src']}:{flow['src_port']}",
+                'server': f"{flow['dst']}:{flow['dst_port']}",
+                'first_seen': str(datetime.datetime.fromtimestamp(flow['first_seen'])),
+                'total_bytes': stream['total'],
+                'offset': offset,
+                'next_offset': next_offset,
+                'client_stream': stream['buffers'][0].stats(),
+                'server_stream': stream['buffers'][1].stats(),
+                'segments': [{
+                    'direction': DIRECTIONS[direction],
+                    'offset': segment_offset,
+                    'packet': packet,
+                    'length': len(data),
+                    'data': _encode_bytes(data, encoding)
+                } for direction, segment_offset, packet, data in segments]
+            }
+        finally:
+            release_stream(stream)
+    except Exception as e:
+        print(f"Error reassembling TCP stream: {e}")
+        return {'error': str(e)}
+
+def _encode_bytes(data, encoding):
+    """Encode stream bytes for JSON"""
+    if encoding == 'hex':
+        return data.hex()
+    if encoding == 'base64':
+        return base64.b64encode(data).decode('ascii')
+    return data.decode('utf-8', 'replace')